@@ -1,103 +1,76 @@
 import logging
 import json
-import pickle
 import numpy as np
 import os
 from datetime import datetime
 import azure.functions as func
+from shared_code import crop_model
+from shared_code.crop_suitability import get_crop_suitability
 
-# Load model once at cold start
-MODEL_PATH = os.getenv("AI_MODEL_PATH", "models/random_forest_v1.pkl")
-SCALER_PATH = os.getenv("AI_SCALER_PATH", "models/scaler.pkl")
+# Load model once at cold start (paths: AI_MODEL_PATH / AI_SCALER_PATH, see shared_code/crop_model.py)
 MODEL_VERSION = "v1.0"
+ADT_URL = os.environ.get("ADT_INSTANCE_URL")
 
 # Global model cache
 _model = None
 _scaler = None
+_predictor = None
+_dt_client = None
 
 def load_model():
     """Load the trained Random Forest model"""
     global _model
     if _model is None:
-        try:
-            model_full_path = os.path.join(os.path.dirname(__file__), '..', MODEL_PATH)
-            with open(model_full_path, 'rb') as f:
-                _model = pickle.load(f)
-            logging.info("Model loaded successfully")
-        except FileNotFoundError:
-            logging.warning(f"Model file not found at {model_full_path}")
-            _model = None
+        _model = crop_model.load_model()
     return _model
 
 def load_scaler():
     """Load the feature scaler"""
     global _scaler
     if _scaler is None:
-        try:
-            scaler_full_path = os.path.join(os.path.dirname(__file__), '..', SCALER_PATH)
-            with open(scaler_full_path, 'rb') as f:
-                _scaler = pickle.load(f)
-            logging.info("Scaler loaded successfully")
-        except FileNotFoundError:
-            logging.warning("Scaler file not found, proceeding without scaling")
-            _scaler = None
+        _scaler = crop_model.load_scaler()
     return _scaler
 
+def get_predictor():
+    """Single-reading predictor over the loaded model and scaler (None without a usable model)"""
+    global _predictor
+    if _predictor is None and load_model() is not None:
+        try:
+            _predictor = crop_model.RowPredictor(_model, load_scaler())
+        except ValueError as e:
+            logging.error(f"Model rejected, using crop suitability instead: {e}")
+            _predictor = False
+    return _predictor or None
+
+def get_dt_client():
+    """Lazy Digital Twins client for the crop catalog (None when ADT is not configured)"""
+    global _dt_client
+    if _dt_client is None and ADT_URL:
+        try:
+            from azure.identity import DefaultAzureCredential
+            from azure.digitaltwins.core import DigitalTwinsClient
+            _dt_client = DigitalTwinsClient(ADT_URL, DefaultAzureCredential())
+        except Exception as e:
+            logging.warning(f"Digital Twins client unavailable, using the default crop catalog: {e}")
+    return _dt_client
+
 def simulate_prediction(temperature, humidity, soil_moisture):
-    """Simulation-based prediction (fallback when model is unavailable)"""
-    if temperature > 30 and soil_moisture > 60 and humidity > 70:
-        prediction = "Rice"
-        confidence = 0.96
-        alternatives = [
-            {"crop": "Sugarcane", "confidence": 0.82},
-            {"crop": "Jute", "confidence": 0.68}
-        ]
-    elif temperature > 25 and temperature <= 30 and soil_moisture > 50:
-        prediction = "Maize"
-        confidence = 0.88
-        alternatives = [
-            {"crop": "Rice", "confidence": 0.75},
-            {"crop": "Cotton", "confidence": 0.62}
-        ]
-    elif temperature < 20 and soil_moisture < 40:
-        prediction = "Wheat"
-        confidence = 0.92
-        alternatives = [
-            {"crop": "Barley", "confidence": 0.79},
-            {"crop": "Chickpea", "confidence": 0.71}
-        ]
-    elif soil_moisture < 30:
-        prediction = "Millet"
-        confidence = 0.85
-        alternatives = [
-            {"crop": "Sorghum", "confidence": 0.77},
-            {"crop": "Groundnut", "confidence": 0.64}
-        ]
-    else:
-        prediction = "Vegetables"
-        confidence = 0.78
-        alternatives = [
-            {"crop": "Maize", "confidence": 0.72},
-            {"crop": "Pulses", "confidence": 0.65}
-        ]
-    
-    return prediction, confidence, alternatives
+    """Rank crops by how well the reading fits their optimal ranges (fallback when model is unavailable)"""
+    engine = get_crop_suitability(get_dt_client())
+    ranked = engine.rank([[temperature, humidity, soil_moisture]], k=3)[0]
+    return ranked[0]["crop"], ranked[0]["confidence"], ranked[1:]
 
-def predict_with_model(model, scaler, temperature, humidity, soil_moisture):
-    """Real model inference"""
-    features = np.array([[temperature, humidity, soil_moisture]])
-    
-    if scaler is not None:
-        features = scaler.transform(features)
+def predict_with_model(predictor, temperature, humidity, soil_moisture):
+    """Real model inference (one predict_proba on the predictor's preallocated buffers)"""
+    probabilities = predictor.predict_proba((temperature, humidity, soil_moisture))
     
-    prediction = model.predict(features)[0]
-    probabilities = model.predict_proba(features)[0]
+    prediction = predictor.classes_[np.argmax(probabilities)]
     confidence = float(np.max(probabilities))
     
     top_indices = np.argsort(probabilities)[-3:][::-1]
     alternatives = [
         {
-            "crop": model.classes_[i],
+            "crop": predictor.classes_[i],
             "confidence": float(probabilities[i])
         }
         for i in top_indices[1:]
@@ -151,20 +124,19 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         # Load model
-        model = load_model()
-        scaler = load_scaler()
+        predictor = get_predictor()
         
         # Perform inference
-        if model is not None:
+        if predictor is not None:
             prediction, confidence, alternatives = predict_with_model(
-                model, scaler, temperature, humidity, soil_moisture
+                predictor, temperature, humidity, soil_moisture
             )
             inference_method = "model"
         else:
             prediction, confidence, alternatives = simulate_prediction(
                 temperature, humidity, soil_moisture
             )
-            inference_method = "simulation"
+            inference_method = "suitability"
         
         # Calculate inference time
         end_time = datetime.now()
@@ -0,0 +1,31 @@
+"""
+Azure Function: Timer Trigger (hourly)
+Compacts closed partitions of the telemetry archive, downsamples raw partitions past
+ARCHIVE_RAW_RETENTION_DAYS into hourly rollups and deletes rollups past
+ARCHIVE_ROLLUP_RETENTION_DAYS (0 or unset: keep). See shared_code/archive_maintenance.py.
+"""
+
+import azure.functions as func
+import json
+import logging
+import os
+
+
+def main(timer: func.TimerRequest) -> None:
+    root = os.environ.get("TELEMETRY_ARCHIVE_DIR")
+    if not root:
+        logging.info("Telemetry archive disabled (TELEMETRY_ARCHIVE_DIR not set)")
+        return
+
+    # pyarrow is only imported when there is an archive to maintain
+    from shared_code.archive_maintenance import DEFAULT_RAW_RETENTION_DAYS, run_maintenance
+
+    if timer.past_due:
+        logging.warning("Archive maintenance is running late")
+
+    summary = run_maintenance(
+        root,
+        raw_retention_days=int(os.environ.get("ARCHIVE_RAW_RETENTION_DAYS", DEFAULT_RAW_RETENTION_DAYS)),
+        rollup_retention_days=int(os.environ.get("ARCHIVE_ROLLUP_RETENTION_DAYS", 0))
+    )
+    logging.info(f"Archive maintenance complete: {json.dumps(summary)}")
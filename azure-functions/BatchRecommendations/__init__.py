@@ -0,0 +1,43 @@
+"""
+Azure Function: Timer Trigger (every 15 minutes)
+Recommends a crop for every zone from its latest reading in one batch and writes
+recommendedCrop / recommendationConfidence back to the zones whose recommendation changed.
+See shared_code/batch_recommendations.py.
+"""
+
+import azure.functions as func
+import json
+import logging
+import os
+from azure.identity import DefaultAzureCredential
+from azure.digitaltwins.core import DigitalTwinsClient
+from shared_code import crop_model
+from shared_code.batch_recommendations import (DEFAULT_CONCURRENCY, DEFAULT_MIN_CONFIDENCE_CHANGE,
+                                               DEFAULT_PATCHES_PER_SECOND, run_batch)
+
+ADT_URL = os.environ.get("ADT_INSTANCE_URL")
+dt_client = DigitalTwinsClient(ADT_URL, DefaultAzureCredential()) if ADT_URL else None
+
+# Model and scaler are loaded once per worker
+_model = None
+_scaler = None
+
+
+def main(timer: func.TimerRequest) -> None:
+    global _model, _scaler
+    if not dt_client:
+        logging.error("Digital Twins client not initialized")
+        return
+
+    if _model is None:
+        _model = crop_model.load_model()
+        _scaler = crop_model.load_scaler()
+
+    summary = run_batch(
+        dt_client, _model, _scaler,
+        concurrency=int(os.environ.get("RECOMMENDATION_CONCURRENCY", DEFAULT_CONCURRENCY)),
+        patches_per_second=float(os.environ.get("RECOMMENDATION_PATCHES_PER_SECOND", DEFAULT_PATCHES_PER_SECOND)),
+        min_confidence_change=float(os.environ.get("RECOMMENDATION_MIN_CONFIDENCE_CHANGE",
+                                                   DEFAULT_MIN_CONFIDENCE_CHANGE))
+    )
+    logging.info(f"Batch recommendations complete: {json.dumps(summary)}")
@@ -0,0 +1,84 @@
+"""
+Azure Function: telemetry history for dashboard trend charts
+GET /api/history                       -> devices with recorded history
+GET /api/history/{deviceId}?hours=24   -> readings from the last N hours
+GET /api/history/{deviceId}?start=...&end=...  (epoch seconds or ISO 8601)
+GET /api/history/{id}?resolution=minute|hour|day[&scope=zone]  -> rollups instead of raw readings
+"""
+
+import azure.functions as func
+import json
+import logging
+import time
+import numpy as np
+from shared_code.rollups import RESOLUTIONS, SCOPES, get_rollup_store
+from shared_code.telemetry_store import COLUMNS, get_telemetry_store, parse_timestamp
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Cache-Control": "no-cache"
+}
+
+MAX_HOURS = 24 * 31
+
+
+def to_json_list(values, decimals=2):
+    """Rounded floats with NaN (missing reading) as null"""
+    rounded = np.round(values.astype(np.float64), decimals)
+    return [None if v != v else v for v in rounded.tolist()]
+
+
+def json_response(payload, status_code=200):
+    return func.HttpResponse(json.dumps(payload), status_code=status_code, mimetype="application/json",
+                             headers=CORS_HEADERS)
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    if req.method == "OPTIONS":
+        return func.HttpResponse("", status_code=200, headers=CORS_HEADERS)
+
+    store = get_telemetry_store()
+    if store is None:
+        return json_response({"error": "Telemetry history is not enabled (set TELEMETRY_HISTORY_DIR)"}, 503)
+
+    # Device id, or a zone id with scope=zone
+    device_id = req.route_params.get('deviceId')
+    if not device_id:
+        return json_response({"devices": store.devices()})
+
+    try:
+        if req.params.get('start'):
+            start = parse_timestamp(req.params['start'])
+            end = parse_timestamp(req.params['end']) if req.params.get('end') else time.time() + 1
+        else:
+            hours = min(float(req.params.get('hours', 24)), MAX_HOURS)
+            end = time.time() + 1
+            start = end - 1 - hours * 3600.0
+    except ValueError as e:
+        return json_response({"error": f"Invalid time range: {e}"}, 400)
+
+    resolution = req.params.get('resolution')
+    if resolution:
+        scope = req.params.get('scope', 'device')
+        if resolution not in RESOLUTIONS or scope not in SCOPES:
+            return json_response({"error": f"resolution must be one of {list(RESOLUTIONS)}, "
+                                           f"scope one of {list(SCOPES)}"}, 400)
+        rollup = get_rollup_store().query(scope, device_id, resolution, start, end)
+        payload = {"id": device_id, "scope": scope, "resolution": resolution, "count": int(len(rollup['bucket'])),
+                   "bucket": np.round(rollup['bucket'] * 1000).astype(np.int64).tolist()}
+        for name in COLUMNS[1:]:
+            payload[name] = {stat: values.tolist() if stat == 'count' else to_json_list(values)
+                             for stat, values in rollup[name].items()}
+        return json_response(payload)
+
+    history = store.range(device_id, start, end)
+    logging.info(f"History for {device_id}: {len(history['timestamp'])} readings")
+
+    payload = {"deviceId": device_id, "count": int(len(history['timestamp'])),
+               # Epoch milliseconds
+               "timestamp": np.round(history['timestamp'] * 1000).astype(np.int64).tolist()}
+    for name in COLUMNS[1:]:
+        payload[name] = to_json_list(history[name])
+    return json_response(payload)
@@ -8,6 +8,8 @@ import json
 import os
 from azure.identity import DefaultAzureCredential
 from azure.digitaltwins.core import DigitalTwinsClient
+from shared_code.rollups import get_rollup_store
+from shared_code.telemetry_store import get_telemetry_store
 
 # Initialize Digital Twins client (singleton)
 ADT_URL = os.environ.get("ADT_INSTANCE_URL")
@@ -18,6 +20,12 @@ if ADT_URL:
     dt_client = DigitalTwinsClient(ADT_URL, credential)
     logging.info(f"Digital Twins client initialized for: {ADT_URL}")
 
+# Raw telemetry archive (opt-in); pyarrow is only imported when it is enabled
+archive_writer = None
+if os.environ.get("TELEMETRY_ARCHIVE_DIR"):
+    from shared_code.telemetry_archive import get_archive_writer
+    archive_writer = get_archive_writer()
+
 
 def main(event: dict) -> None:
     """
@@ -174,6 +182,25 @@ def main(event: dict) -> None:
             dt_client.update_digital_twin(zone_twin_id, zone_updates)
             logging.info(f"✅ Zone twin updated successfully")
         
+        # Keep history and rollups for trend charts (opt-in via TELEMETRY_HISTORY_DIR); twins hold only the latest value
+        history = get_telemetry_store()
+        if history is not None:
+            try:
+                history.append(device_id, timestamp, temperature, humidity, soil_moisture)
+                get_rollup_store().add(device_id, body.get('zoneId') or zone_twin_id, timestamp,
+                                       temperature, humidity, soil_moisture)
+            except Exception as history_err:
+                logging.error(f"Failed to record telemetry history: {history_err}")
+        
+        if archive_writer is not None:
+            try:
+                archive_writer.append(device_id, body.get('farmId') or os.environ.get('FARM_TWIN_ID', 'farm_001'),
+                                      body.get('zoneId') or zone_twin_id, timestamp,
+                                      temperature, humidity, soil_moisture, body.get('messageId'),
+                                      recommended_crop, recommendation_confidence)
+            except Exception as archive_err:
+                logging.error(f"Failed to archive telemetry: {archive_err}")
+        
         logging.info("IoT Hub Event Grid trigger function completed successfully")
         
     except Exception as e:
@@ -0,0 +1,300 @@
+"""
+Compaction and retention for the Parquet telemetry archive (see telemetry_archive.py)
+
+- Compaction: every closed partition (date older than the grace period) with more than one
+  file is rewritten as sorted files of up to max_file_rows rows in ROW_GROUP_ROWS row groups.
+- Downsampling: raw partitions older than the raw retention horizon are folded into hourly
+  per-device rollups (count, sum, min, max, sum of squares per metric) under <root>/_rollups
+  and the raw partition is deleted. Rollups are mergeable, so late data for an already
+  downsampled day is added to the existing rollup file.
+- Retention: rollup partitions older than the rollup retention horizon are deleted.
+
+Every change is recorded in a journal (<root>/_maintenance) before anything visible is
+touched: new files are written under hidden temporary names, renamed into place, then the
+inputs are removed. Until a compaction journal is finished, query_archive skips whichever
+side of it is stale (telemetry_archive.superseded_files), so a crash between the renames
+and the removals never shows rows twice. recover() replays unfinished journals and removes
+work files orphaned by a crash. Directories starting with '_' or '.' are ignored by pyarrow
+dataset discovery, so queries see neither rollups nor work files.
+
+Usage (from azure-functions/):
+  python -m shared_code.archive_maintenance --archive /home/data/archive --raw-retention-days 90
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from shared_code.telemetry_archive import (JOURNAL_DIR, PARTITIONING, ROW_GROUP_ROWS, SCHEMA, archive_filter,
+                                           file_name, partition_dir, write_sorted)
+
+METRICS = ('temperature', 'humidity', 'soilMoisture')
+ROLLUP_DIR = "_rollups"
+ROLLUP_FILE = "rollup.parquet"
+
+# Suffix of maintenance work files inside partitions (the writer's own use ".tmp")
+WORK_SUFFIX = ".maintenance.tmp"
+
+DEFAULT_GRACE_DAYS = 1
+DEFAULT_RAW_RETENTION_DAYS = 90
+DEFAULT_MAX_FILE_ROWS = 1_000_000
+
+
+def iter_partitions(root):
+    """(date, farm, zone, directory) for every date=/farm=/zone= directory under root"""
+    if not os.path.isdir(root):
+        return
+    for date_dir in sorted(os.listdir(root)):
+        if not date_dir.startswith('date='):
+            continue
+        for farm_dir in sorted(os.listdir(os.path.join(root, date_dir))):
+            if not farm_dir.startswith('farm='):
+                continue
+            for zone_dir in sorted(os.listdir(os.path.join(root, date_dir, farm_dir))):
+                if zone_dir.startswith('zone='):
+                    yield (date_dir[5:], farm_dir[5:], zone_dir[5:],
+                           os.path.join(root, date_dir, farm_dir, zone_dir))
+
+
+def data_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith('.parquet') and not name.startswith(('.', '_')))
+
+
+def _read_files(paths, schema=SCHEMA):
+    return ds.dataset(paths, format='parquet', schema=schema).to_table()
+
+
+def _remove_empty_parents(directory, stop):
+    while os.path.abspath(directory) != os.path.abspath(stop) and os.path.isdir(directory) \
+            and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
+
+
+# ---------------------------------------------------------------------------
+# Journal
+# ---------------------------------------------------------------------------
+
+def _journal_dir(root):
+    path = os.path.join(root, JOURNAL_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _begin(root, entry):
+    """Persist a journal entry (paths relative to root) before any visible change"""
+    path = os.path.join(_journal_dir(root), f"{uuid.uuid4().hex}.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(entry, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _finish(root, journal_path, entry):
+    """Apply the remaining steps of a journal entry; every step is idempotent"""
+    def absolute(rel):
+        return os.path.join(root, rel)
+
+    for tmp, final in entry.get('outputs', []):
+        if os.path.exists(absolute(tmp)):
+            os.replace(absolute(tmp), absolute(final))
+    for rel in entry.get('inputs', []):
+        if os.path.exists(absolute(rel)):
+            os.remove(absolute(rel))
+    if entry.get('raw_dir') and os.path.isdir(absolute(entry['raw_dir'])):
+        os.rename(absolute(entry['raw_dir']), absolute(entry['trash']))
+    if entry.get('trash'):
+        shutil.rmtree(absolute(entry['trash']), ignore_errors=True)
+    for rel in entry.get('prune', []):
+        _remove_empty_parents(absolute(rel), root)
+    os.remove(journal_path)
+
+
+def _remove_work_files(root):
+    """Delete maintenance work files a crash left in partitions before their journal was written"""
+    for base in (root, os.path.join(root, ROLLUP_DIR)):
+        for _, _, _, directory in iter_partitions(base):
+            for name in os.listdir(directory):
+                if name.startswith('.') and name.endswith(WORK_SUFFIX):
+                    os.remove(os.path.join(directory, name))
+
+
+def recover(root):
+    """Finish journals left by an interrupted run and drop orphaned work files; returns the count"""
+    journal_dir = os.path.join(root, JOURNAL_DIR)
+    recovered = 0
+    for name in sorted(os.listdir(journal_dir)) if os.path.isdir(journal_dir) else []:
+        path = os.path.join(journal_dir, name)
+        if name.endswith('.json'):
+            with open(path) as f:
+                _finish(root, path, json.load(f))
+            recovered += 1
+        elif name.endswith('.tmp'):
+            os.remove(path)
+        elif name.startswith('trash-'):
+            shutil.rmtree(path, ignore_errors=True)
+    # Journals are finished first: their outputs are renamed out of the work names
+    _remove_work_files(root)
+    if recovered:
+        logging.warning(f"Recovered {recovered} interrupted archive maintenance step(s)")
+    return recovered
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+
+def compact_partition(root, directory, max_file_rows=DEFAULT_MAX_FILE_ROWS, row_group_rows=ROW_GROUP_ROWS):
+    """Merge a partition's files into sorted files of <= max_file_rows rows; returns (files in, files out)"""
+    inputs = data_files(directory)
+    if len(inputs) < 2:
+        return len(inputs), len(inputs)
+    table = _read_files(inputs).sort_by([('deviceId', 'ascending'), ('timestamp', 'ascending')])
+    outputs = []
+    for offset in range(0, max(table.num_rows, 1), max_file_rows):
+        name = file_name("compact")
+        tmp = os.path.join(directory, f".{name}{WORK_SUFFIX}")
+        write_sorted(table.slice(offset, max_file_rows), tmp, row_group_rows)
+        outputs.append((os.path.relpath(tmp, root), os.path.relpath(os.path.join(directory, name), root)))
+    entry = {'kind': 'compact', 'outputs': outputs, 'inputs': [os.path.relpath(p, root) for p in inputs]}
+    _finish(root, _begin(root, entry), entry)
+    return len(inputs), len(outputs)
+
+
+# ---------------------------------------------------------------------------
+# Downsampling
+# ---------------------------------------------------------------------------
+
+def rollup_table(table):
+    """Hourly per-device count/sum/min/max/sumsq of every metric"""
+    columns = {'timestamp': pc.floor_temporal(table['timestamp'], unit='hour'), 'deviceId': table['deviceId']}
+    aggregations = []
+    for metric in METRICS:
+        values = table[metric].cast(pa.float64())
+        columns[metric] = values
+        columns[f"{metric}_sq"] = pc.multiply(values, values)
+        aggregations += [(metric, 'count'), (metric, 'sum'), (metric, 'min'), (metric, 'max'),
+                         (f"{metric}_sq", 'sum')]
+    grouped = pa.table(columns).group_by(['timestamp', 'deviceId']).aggregate(aggregations)
+    return grouped.rename_columns([name.replace('_sq_sum', '_sumsq') for name in grouped.column_names])
+
+
+def merge_rollups(tables):
+    """Combine rollup tables covering the same hours (counts/sums add, min/max combine)"""
+    table = pa.concat_tables(tables)
+    aggregations = []
+    for metric in METRICS:
+        aggregations += [(f"{metric}_count", 'sum'), (f"{metric}_sum", 'sum'), (f"{metric}_min", 'min'),
+                         (f"{metric}_max", 'max'), (f"{metric}_sumsq", 'sum')]
+    grouped = table.group_by(['timestamp', 'deviceId']).aggregate(aggregations)
+    # temperature_count_sum -> temperature_count, ...
+    return grouped.rename_columns([name.rsplit('_', 1)[0] if name not in ('timestamp', 'deviceId') else name
+                                   for name in grouped.column_names])
+
+
+def downsample_partition(root, date, farm, zone, directory):
+    """Fold a raw partition into its hourly rollup file and delete it; returns raw rows folded"""
+    inputs = data_files(directory)
+    rollup_dir = partition_dir(os.path.join(root, ROLLUP_DIR), date, farm, zone)
+    final = os.path.join(rollup_dir, ROLLUP_FILE)
+    raw = _read_files(inputs) if inputs else None
+    tables = [rollup_table(raw)] if raw is not None else []
+    if os.path.exists(final):
+        tables.append(_read_files([final], schema=None))
+    outputs = []
+    if tables:
+        os.makedirs(rollup_dir, exist_ok=True)
+        tmp = os.path.join(rollup_dir, f".{ROLLUP_FILE}.{uuid.uuid4().hex[:8]}{WORK_SUFFIX}")
+        write_sorted(merge_rollups(tables), tmp)
+        outputs.append((os.path.relpath(tmp, root), os.path.relpath(final, root)))
+    entry = {'kind': 'downsample', 'outputs': outputs, 'raw_dir': os.path.relpath(directory, root),
+             'trash': os.path.join(JOURNAL_DIR, f"trash-{uuid.uuid4().hex}"),
+             'prune': [os.path.relpath(os.path.dirname(directory), root)]}
+    _finish(root, _begin(root, entry), entry)
+    return raw.num_rows if raw is not None else 0
+
+
+def delete_partition(root, directory):
+    """Hide a partition with an atomic rename, then delete it"""
+    trash = os.path.join(_journal_dir(root), f"trash-{uuid.uuid4().hex}")
+    os.rename(directory, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+    _remove_empty_parents(os.path.dirname(directory), root)
+
+
+# ---------------------------------------------------------------------------
+# Maintenance run
+# ---------------------------------------------------------------------------
+
+def run_maintenance(root, now=None, grace_days=DEFAULT_GRACE_DAYS, raw_retention_days=DEFAULT_RAW_RETENTION_DAYS,
+                    rollup_retention_days=None, max_file_rows=DEFAULT_MAX_FILE_ROWS):
+    """One pass of recovery, compaction, downsampling and retention; returns a summary dict"""
+    start = time.perf_counter()
+    today = (now or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+    closed_before = (today - timedelta(days=grace_days)).isoformat()
+    raw_before = (today - timedelta(days=raw_retention_days)).isoformat() if raw_retention_days else None
+    rollup_before = (today - timedelta(days=rollup_retention_days)).isoformat() if rollup_retention_days else None
+
+    summary = {'recovered': recover(root), 'compacted_partitions': 0, 'files_before': 0, 'files_after': 0,
+               'downsampled_partitions': 0, 'downsampled_rows': 0, 'expired_rollup_partitions': 0}
+    for date, farm, zone, directory in list(iter_partitions(root)):
+        if raw_before and date < raw_before:
+            summary['downsampled_rows'] += downsample_partition(root, date, farm, zone, directory)
+            summary['downsampled_partitions'] += 1
+        elif date < closed_before:
+            files_in, files_out = compact_partition(root, directory, max_file_rows)
+            if files_in != files_out:
+                summary['compacted_partitions'] += 1
+                summary['files_before'] += files_in
+                summary['files_after'] += files_out
+
+    if rollup_before:
+        for date, _, _, directory in list(iter_partitions(os.path.join(root, ROLLUP_DIR))):
+            if date < rollup_before:
+                delete_partition(os.path.join(root, ROLLUP_DIR), directory)
+                summary['expired_rollup_partitions'] += 1
+
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def query_rollups(root, start=None, end=None, devices=None, farms=None, zones=None, columns=None):
+    """Hourly rollups of downsampled data, filtered like query_archive"""
+    rollup_root = os.path.join(root, ROLLUP_DIR)
+    if not os.path.isdir(rollup_root):
+        return None
+    dataset = ds.dataset(rollup_root, format='parquet', partitioning=PARTITIONING)
+    return dataset.to_table(columns=columns, filter=archive_filter(start, end, devices, farms, zones))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact and expire the Parquet telemetry archive")
+    parser.add_argument("--archive", default=os.environ.get("TELEMETRY_ARCHIVE_DIR"), required=False)
+    parser.add_argument("--grace-days", type=int, default=DEFAULT_GRACE_DAYS,
+                        help="Partitions younger than this still receive data and are left alone")
+    parser.add_argument("--raw-retention-days", type=int, default=DEFAULT_RAW_RETENTION_DAYS,
+                        help="Raw partitions older than this are downsampled to hourly rollups (0: keep)")
+    parser.add_argument("--rollup-retention-days", type=int, default=0, help="Delete older rollups (0: keep)")
+    parser.add_argument("--max-file-rows", type=int, default=DEFAULT_MAX_FILE_ROWS)
+    args = parser.parse_args()
+    if not args.archive:
+        parser.error("--archive (or TELEMETRY_ARCHIVE_DIR) is required")
+
+    summary = run_maintenance(args.archive, grace_days=args.grace_days, raw_retention_days=args.raw_retention_days,
+                              rollup_retention_days=args.rollup_retention_days, max_file_rows=args.max_file_rows)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
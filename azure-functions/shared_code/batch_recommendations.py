@@ -0,0 +1,131 @@
+"""
+Batch crop recommendations for every zone
+Reads the latest reading of every Zone twin with one query, scores all zones with a single
+predict_proba call (or the crop suitability ranking when no model is deployed) and patches
+recommendedCrop / recommendationConfidence only on zones whose recommendation changed.
+Patches run on a small thread pool behind a shared rate limit and are retried with backoff
+when ADT throttles (429).
+
+Usage:
+    summary = run_batch(dt_client, model, scaler)
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from shared_code.crop_model import predict_top_k
+from shared_code.crop_suitability import get_crop_suitability, round_confidence
+
+ZONE_MODEL_ID = "dtmi:agriculture:Zone;1"
+FEATURES = ('temperature', 'humidity', 'soilMoisture')
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PATCHES_PER_SECOND = 50.0
+DEFAULT_MIN_CONFIDENCE_CHANGE = 0.05
+MAX_RETRIES = 4
+
+
+class RateLimiter:
+    """Blocking token bucket shared by the patch threads"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def load_zone_readings(dt_client):
+    """(zone twins with all three readings, (zones x 3) feature matrix)"""
+    query = f"SELECT * FROM digitaltwins WHERE IS_OF_MODEL('{ZONE_MODEL_ID}')"
+    zones = [twin for twin in dt_client.query_twins(query)
+             if all(isinstance(twin.get(name), (int, float)) for name in FEATURES)]
+    features = np.array([[twin[name] for name in FEATURES] for twin in zones], dtype=np.float64)
+    return zones, features.reshape(len(zones), len(FEATURES))
+
+
+def recommend(features, model=None, scaler=None, dt_client=None):
+    """Best crop and its confidence per row: model probabilities, else crop suitability"""
+    if model is not None:
+        crops, confidences = predict_top_k(model, scaler, features, k=1)
+    else:
+        crops, confidences = get_crop_suitability(dt_client).top_k(features, k=1)
+    return crops[:, 0], confidences[:, 0].astype(np.float64)
+
+
+def changed_patches(zones, crops, confidences, min_confidence_change=DEFAULT_MIN_CONFIDENCE_CHANGE):
+    """[(zone id, JSON patch)] for zones whose crop changed or whose confidence moved enough"""
+    patches = []
+    for twin, crop, confidence in zip(zones, crops, confidences):
+        crop, confidence = str(crop), round_confidence(confidence)
+        current_crop = twin.get('recommendedCrop')
+        current_confidence = twin.get('recommendationConfidence')
+        if (current_crop == crop and current_confidence is not None
+                and abs(current_confidence - confidence) < min_confidence_change):
+            continue
+        patches.append((twin['$dtId'], [
+            {"op": "replace" if current_crop is not None else "add", "path": "/recommendedCrop", "value": crop},
+            {"op": "replace" if current_confidence is not None else "add", "path": "/recommendationConfidence",
+             "value": confidence},
+        ]))
+    return patches
+
+
+def _patch(dt_client, limiter, twin_id, patch):
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            dt_client.update_digital_twin(twin_id, patch)
+            return True
+        except Exception as e:
+            if getattr(e, 'status_code', None) != 429 or attempt == MAX_RETRIES:
+                logging.error(f"Failed to update recommendation of {twin_id}: {e}")
+                return False
+            time.sleep(0.1 * 2 ** attempt)
+
+
+def apply_patches(dt_client, patches, concurrency=DEFAULT_CONCURRENCY, patches_per_second=DEFAULT_PATCHES_PER_SECOND):
+    """Send patches concurrently under a shared rate limit; returns (patched, failed)"""
+    if not patches:
+        return 0, 0
+    limiter = RateLimiter(patches_per_second)
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(patches))) as pool:
+        results = list(pool.map(lambda item: _patch(dt_client, limiter, *item), patches))
+    patched = sum(results)
+    return patched, len(results) - patched
+
+
+def run_batch(dt_client, model=None, scaler=None, concurrency=DEFAULT_CONCURRENCY,
+              patches_per_second=DEFAULT_PATCHES_PER_SECOND, min_confidence_change=DEFAULT_MIN_CONFIDENCE_CHANGE,
+              dry_run=False):
+    """Score every zone and write changed recommendations; returns a summary dict"""
+    started = time.perf_counter()
+    zones, features = load_zone_readings(dt_client)
+    summary = {'zones': len(zones), 'method': 'model' if model is not None else 'suitability',
+               'changed': 0, 'patched': 0, 'failed': 0}
+    if zones:
+        score_started = time.perf_counter()
+        crops, confidences = recommend(features, model, scaler, dt_client)
+        summary['score_ms'] = round((time.perf_counter() - score_started) * 1000, 2)
+        patches = changed_patches(zones, crops, confidences, min_confidence_change)
+        summary['changed'] = len(patches)
+        if not dry_run:
+            summary['patched'], summary['failed'] = apply_patches(dt_client, patches, concurrency,
+                                                                  patches_per_second)
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
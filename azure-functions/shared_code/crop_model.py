@@ -0,0 +1,168 @@
+"""
+Crop recommendation model
+Loads the pickled classifier and scaler that AI_Inference serves (AI_MODEL_PATH /
+AI_SCALER_PATH, relative to the function app root) and scores batches of
+(temperature, humidity, soilMoisture) readings with one predict_proba call.
+Callers cache what they load.
+
+When onnxruntime is installed and a compiled model (prediction/compiled_backend.py export
+--model ...) sits next to the pickle and is not older than it, load_model returns that
+instead; AI_MODEL_BACKEND=sklearn always loads the pickle. RowPredictor is the
+single-reading hot path.
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+
+import numpy as np
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL_PATH = "models/random_forest_v1.pkl"
+DEFAULT_SCALER_PATH = "models/scaler.pkl"
+# temperature, humidity, soilMoisture
+N_FEATURES = 3
+
+
+def _load_pickle(path):
+    with open(os.path.join(APP_ROOT, path), 'rb') as f:
+        return pickle.load(f)
+
+
+# OnnxModel and _load_compiled mirror prediction/compiled_backend.OnnxForest and
+# prediction/model_store.load_forest. The Function app is published from azure-functions/
+# alone, so it cannot import prediction/; keep the session options, input handling and
+# staleness rule of both copies in sync.
+class OnnxModel:
+    """Compiled classifier with the predict / predict_proba / classes_ surface of the pickle"""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.classes_ = np.array(json.loads(metadata['classes']))
+        self.n_features_in_ = int(metadata['n_features'])
+
+    def predict_proba(self, X):
+        if not (isinstance(X, np.ndarray) and X.dtype == np.float64 and X.ndim == 2 and X.flags.c_contiguous):
+            X = np.ascontiguousarray(np.atleast_2d(np.asarray(X, dtype=np.float64)))
+        return self.session.run(['probabilities'], {'X': X})[0]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _load_compiled(path):
+    """OnnxModel for the up-to-date .onnx next to path, or None"""
+    onnx_path = os.path.splitext(path)[0] + ".onnx"
+    if not (os.path.exists(onnx_path) and os.path.exists(path)
+            and os.path.getmtime(onnx_path) >= os.path.getmtime(path)):
+        return None
+    try:
+        model = OnnxModel(onnx_path)
+    except ImportError:
+        return None
+    logging.info(f"Compiled model loaded from {onnx_path}")
+    return model
+
+
+def load_model(compiled=True):
+    """The classifier at AI_MODEL_PATH (its compiled form when available), or None if it is not deployed"""
+    path = os.getenv("AI_MODEL_PATH", DEFAULT_MODEL_PATH)
+    if compiled and os.getenv("AI_MODEL_BACKEND", "auto") != "sklearn":
+        model = _load_compiled(os.path.join(APP_ROOT, path))
+        if model is not None:
+            return model
+    try:
+        model = _load_pickle(path)
+        logging.info("Model loaded successfully")
+        return model
+    except FileNotFoundError:
+        logging.warning(f"Model file not found at {os.path.join(APP_ROOT, path)}")
+        return None
+
+
+def load_scaler():
+    """The feature scaler at AI_SCALER_PATH, or None to score unscaled features"""
+    try:
+        scaler = _load_pickle(os.getenv("AI_SCALER_PATH", DEFAULT_SCALER_PATH))
+        logging.info("Scaler loaded successfully")
+        return scaler
+    except FileNotFoundError:
+        logging.warning("Scaler file not found, proceeding without scaling")
+        return None
+
+
+# simulation/ai-edge/predict_crop.py carries a single-threaded copy of this class (the
+# edge script is deployed on its own); change both together.
+class RowPredictor:
+    """
+    Scores one reading at a time without sklearn's per-call validation or temporaries.
+    The model and scaler are checked against the 3-feature schema once, here. Each thread
+    reuses its own buffers: the reading is scaled in place in float64 (StandardScaler's
+    arithmetic, so results match scaler.transform) and copied into a float32 row, the dtype
+    trees compare in. Random forests are scored tree by tree with check_input=False, as
+    RandomForestClassifier.predict_proba does with one job; compiled models take the
+    float64 row directly; other classifiers are called normally.
+    """
+
+    def __init__(self, model, scaler=None):
+        for name, part in (("model", model), ("scaler", scaler)):
+            n_features = getattr(part, 'n_features_in_', N_FEATURES)
+            if n_features != N_FEATURES:
+                raise ValueError(f"The {name} expects {n_features} features, readings have {N_FEATURES}")
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+        self.mean = self.scale = None
+        if scaler is not None and hasattr(scaler, 'with_mean') and hasattr(scaler, 'scale_'):
+            self.mean = scaler.mean_ if scaler.with_mean else None
+            self.scale = scaler.scale_ if scaler.with_std else None
+            scaler = None
+        self.scaler = scaler
+        self.trees = None
+        if not isinstance(model, OnnxModel):
+            from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+            if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and model.n_outputs_ == 1:
+                self.trees = list(model.estimators_)
+        self._local = threading.local()
+
+    def _buffers(self):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = (np.zeros((1, N_FEATURES)), np.zeros((1, N_FEATURES), dtype=np.float32),
+                                             np.zeros((1, len(self.classes_))))
+        return buffers
+
+    def predict_proba(self, reading):
+        """Class probabilities for one (temperature, humidity, soilMoisture) reading; valid until this thread's next call"""
+        row, row32, proba = self._buffers()
+        row[0] = reading
+        if self.mean is not None:
+            np.subtract(row, self.mean, out=row)
+        if self.scale is not None:
+            np.divide(row, self.scale, out=row)
+        if self.scaler is not None:
+            row[...] = self.scaler.transform(row)
+        if self.trees is None:
+            return self.model.predict_proba(row)[0]
+        np.copyto(row32, row, casting='same_kind')
+        proba.fill(0.0)
+        for tree in self.trees:
+            proba += tree.predict_proba(row32, check_input=False)
+        proba /= len(self.trees)
+        return proba[0]
+
+
+def predict_top_k(model, scaler, features, k=3):
+    """Classes and probabilities of the k most likely crops per row, best first: two (rows x k) arrays"""
+    features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+    if scaler is not None:
+        features = scaler.transform(features)
+    probabilities = model.predict_proba(features)
+    k = min(k, probabilities.shape[1])
+    top = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+    return np.asarray(model.classes_)[top], np.take_along_axis(probabilities, top, axis=1)
@@ -0,0 +1,185 @@
+"""
+Crop suitability ranking
+Loads every Crop twin (dtmi:agriculture:Crop;1) into a (crops x 6) bound matrix of its
+optimal temperature/humidity/soil-moisture ranges and scores all crops for a batch of
+readings in one broadcast:
+
+  distance  = how far each reading lies outside each crop's range, per metric, divided by
+              TOLERANCE (0 inside the range)
+  score     = exp(-sqrt(sum(distance^2))) * (1 - CENTRE_WEIGHT * offset from the range centre)
+
+so a reading inside a crop's ranges scores between 1 - CENTRE_WEIGHT and 1 and the score
+falls off smoothly outside them. Crops are ranked on the float64 log-score
+(-sqrt(sum(distance^2)) + log(1 - CENTRE_WEIGHT * offset)), which never underflows, so
+the order stays meaningful for readings far from every range; only the returned top-k
+scores are exponentiated. rank() returns the top-k crops per reading with confidences
+rounded to significant digits (round_confidence), so small scores do not print as 0.0.
+
+Usage:
+    engine = CropSuitability.from_twins(twins)          # dicts with the Crop properties
+    names, scores = engine.top_k([[28.0, 75.0, 80.0]], k=3)
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+CROP_MODEL_ID = "dtmi:agriculture:Crop;1"
+BOUND_PROPERTIES = (
+    'optimalTemperatureMin', 'optimalTemperatureMax',
+    'optimalHumidityMin', 'optimalHumidityMax',
+    'optimalSoilMoistureMin', 'optimalSoilMoistureMax',
+)
+METRICS = ('temperature', 'humidity', 'soilMoisture')
+
+TOLERANCE = np.array([5.0, 15.0, 15.0], dtype=np.float32)  # degrees C, %, % outside the range per unit of distance
+CENTRE_WEIGHT = 0.2
+CHUNK_ELEMENTS = 1 << 16   # readings x crops scored per broadcast (keeps temporaries in cache)
+DEFAULT_CATALOG_TTL = 600.0
+CONFIDENCE_DIGITS = 4      # significant digits of reported confidences
+
+# Used when Azure Digital Twins is not configured; rice/wheat/maize match deploy-digital-twins.sh
+DEFAULT_CROPS = {
+    'rice': ('Rice', (20.0, 35.0, 60.0, 80.0, 70.0, 90.0)),
+    'wheat': ('Wheat', (12.0, 25.0, 40.0, 70.0, 50.0, 75.0)),
+    'maize': ('Maize', (18.0, 32.0, 50.0, 75.0, 55.0, 80.0)),
+    'sugarcane': ('Sugarcane', (24.0, 35.0, 65.0, 90.0, 60.0, 85.0)),
+    'jute': ('Jute', (24.0, 37.0, 70.0, 90.0, 65.0, 90.0)),
+    'cotton': ('Cotton', (21.0, 32.0, 50.0, 70.0, 45.0, 70.0)),
+    'barley': ('Barley', (10.0, 22.0, 40.0, 65.0, 35.0, 60.0)),
+    'chickpea': ('Chickpea', (15.0, 28.0, 30.0, 60.0, 30.0, 55.0)),
+    'millet': ('Millet', (25.0, 35.0, 30.0, 60.0, 15.0, 40.0)),
+    'sorghum': ('Sorghum', (25.0, 35.0, 30.0, 65.0, 20.0, 45.0)),
+    'groundnut': ('Groundnut', (22.0, 32.0, 45.0, 70.0, 25.0, 50.0)),
+    'vegetables': ('Vegetables', (15.0, 28.0, 55.0, 80.0, 45.0, 70.0)),
+    'pulses': ('Pulses', (18.0, 30.0, 40.0, 70.0, 30.0, 55.0)),
+}
+
+
+def round_confidence(value):
+    """Confidence rounded to CONFIDENCE_DIGITS significant digits (0.8123, 1.37e-14)"""
+    return float(f"{float(value):.{CONFIDENCE_DIGITS}g}")
+
+
+class CropSuitability:
+    """Vectorized suitability scores of every crop for batches of readings"""
+
+    def __init__(self, crop_ids, names, bounds):
+        bounds = np.asarray(bounds, dtype=np.float32).reshape(len(crop_ids), len(BOUND_PROPERTIES))
+        self.crop_ids = list(crop_ids)
+        self.names = np.array(names, dtype=object)
+        self.low = bounds[:, 0::2]
+        self.high = bounds[:, 1::2]
+        self.centre = (self.low + self.high) / 2
+        self.half_width = np.maximum((self.high - self.low) / 2, TOLERANCE / 2)
+
+    @classmethod
+    def from_twins(cls, twins):
+        """Engine over Crop twins (dicts with $dtId, name and the six optimal* bounds)"""
+        crop_ids, names, bounds = [], [], []
+        for twin in twins:
+            values = [twin.get(prop) for prop in BOUND_PROPERTIES]
+            crop_id = twin.get('$dtId') or twin.get('name')
+            if any(v is None for v in values):
+                logging.warning(f"Crop twin {crop_id} has no complete optimal ranges, skipping it")
+                continue
+            crop_ids.append(crop_id)
+            names.append(twin.get('name') or crop_id)
+            bounds.append(values)
+        if not crop_ids:
+            raise ValueError("No crop twins with optimal ranges")
+        return cls(crop_ids, names, bounds)
+
+    @classmethod
+    def default(cls):
+        return cls(list(DEFAULT_CROPS), [name for name, _ in DEFAULT_CROPS.values()],
+                   [bounds for _, bounds in DEFAULT_CROPS.values()])
+
+    def __len__(self):
+        return len(self.crop_ids)
+
+    def _log_score_chunk(self, readings):
+        penalty = np.zeros((len(readings), len(self)), dtype=np.float64)
+        offset = np.zeros((len(readings), len(self)), dtype=np.float32)
+        for m in range(len(METRICS)):
+            x = readings[:, m:m + 1]
+            distance = np.maximum(self.low[:, m] - x, 0)
+            distance += np.maximum(x - self.high[:, m], 0)
+            distance *= 1 / TOLERANCE[m]
+            penalty += distance * distance
+            centred = (x - self.centre[:, m]) / self.half_width[:, m]
+            offset += centred * centred
+        np.minimum(offset * (1 / len(METRICS)), 1.0, out=offset)
+        np.sqrt(penalty, out=penalty)
+        np.negative(penalty, out=penalty)
+        penalty += np.log1p(-CENTRE_WEIGHT * offset.astype(np.float64))
+        return penalty
+
+    def log_score(self, readings):
+        """(readings x crops) float64 log-scores (<= 0); readings are rows of temperature, humidity, soilMoisture"""
+        readings = np.atleast_2d(np.asarray(readings, dtype=np.float32))
+        rows = max(1, CHUNK_ELEMENTS // len(self))
+        if len(readings) <= rows:
+            return self._log_score_chunk(readings)
+        return np.concatenate([self._log_score_chunk(readings[i:i + rows]) for i in range(0, len(readings), rows)])
+
+    def score(self, readings):
+        """(readings x crops) float64 scores in [0, 1]"""
+        return np.exp(self.log_score(readings))
+
+    def top_k(self, readings, k=3):
+        """Crop names and scores of the k best crops per reading, best first: two (readings x k) arrays"""
+        log_scores = self.log_score(readings)
+        k = min(k, log_scores.shape[1])
+        if k < log_scores.shape[1]:
+            candidates = np.argpartition(-log_scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(k), log_scores.shape)
+        candidate_scores = np.take_along_axis(log_scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+        best = np.take_along_axis(candidates, order, axis=1)
+        return self.names[best], np.exp(np.take_along_axis(candidate_scores, order, axis=1))
+
+    def rank(self, readings, k=3):
+        """Per reading, a list of {"crop", "confidence"} for the k best crops"""
+        names, scores = self.top_k(readings, k)
+        return [[{"crop": name, "confidence": round_confidence(score)} for name, score in zip(row_names, row_scores)]
+                for row_names, row_scores in zip(names, scores)]
+
+
+def load_crop_twins(dt_client):
+    """Every Crop twin in the Azure Digital Twins instance"""
+    query = f"SELECT * FROM digitaltwins WHERE IS_OF_MODEL('{CROP_MODEL_ID}')"
+    return list(dt_client.query_twins(query))
+
+
+_engine = None
+_loaded_at = 0.0
+_engine_lock = threading.Lock()
+
+
+def get_crop_suitability(dt_client=None):
+    """
+    Process-wide engine built from the Crop twins of dt_client, reloaded after
+    CROP_CATALOG_TTL seconds. Falls back to DEFAULT_CROPS without a client, and keeps the
+    previous catalog if a reload fails.
+    """
+    global _engine, _loaded_at
+    ttl = float(os.environ.get("CROP_CATALOG_TTL", DEFAULT_CATALOG_TTL))
+    if _engine is not None and (dt_client is None or time.monotonic() - _loaded_at < ttl):
+        return _engine
+    with _engine_lock:
+        if _engine is not None and (dt_client is None or time.monotonic() - _loaded_at < ttl):
+            return _engine
+        engine = None
+        if dt_client is not None:
+            try:
+                engine = CropSuitability.from_twins(load_crop_twins(dt_client))
+                logging.info(f"Loaded {len(engine)} crops from Azure Digital Twins")
+            except Exception as e:
+                logging.warning(f"Could not load crop twins: {e}")
+        _engine = engine or _engine or CropSuitability.default()
+        _loaded_at = time.monotonic()
+    return _engine
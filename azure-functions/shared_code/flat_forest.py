@@ -0,0 +1,138 @@
+"""
+Flattened tree ensembles
+flatten() packs every tree of a fitted sklearn forest classifier (RandomForest /
+ExtraTrees) into one set of node arrays; save() writes them to a single file that
+FlatForest.open() memory-maps read-only, so any number of worker processes share one copy
+of the model pages instead of each unpickling its own. predict_proba walks all trees
+level by level with NumPy and matches sklearn (features compared as float32, leaf class
+fractions averaged over the trees).
+
+File layout: magic 'FLATFRST', u32 header length, JSON header (classes, max depth and per
+array dtype/shape/offset), then the arrays, each aligned to 64 bytes.
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'FLATFRST'
+PREFIX = struct.Struct('<8sI')
+ALIGN = 64
+ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+
+def flatten(model):
+    """Node arrays of a fitted forest classifier; raises TypeError for anything else"""
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators or not hasattr(estimators[0], 'tree_') or getattr(model, 'n_outputs_', 1) != 1:
+        raise TypeError(f"{type(model).__name__} is not a single-output tree ensemble classifier")
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        leaf = tree.children_left < 0
+        features.append(np.where(leaf, -1, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        links = np.stack([tree.children_left, tree.children_right], axis=1) + offset
+        children.append(np.where(leaf[:, None], -1, links).astype(np.int32))
+        value = tree.value[:, 0, :]
+        values.append((value / value.sum(axis=1, keepdims=True)).astype(np.float32))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'children': np.concatenate(children),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.int32),
+    }
+    return arrays, {'classes': [c.item() if hasattr(c, 'item') else c for c in model.classes_],
+                    'max_depth': int(max_depth), 'n_features': int(model.n_features_in_)}
+
+
+def save(model, path):
+    """Write the flattened model to path (atomically); returns path"""
+    arrays, header = flatten(model)
+    offset, layout = 0, {}
+    for name in ARRAYS:
+        array = np.ascontiguousarray(arrays[name])
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header['arrays'] = layout
+    encoded = json.dumps(header).encode('utf-8')
+    data_start = -(-(PREFIX.size + len(encoded)) // ALIGN) * ALIGN
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, len(encoded)) + encoded)
+        for name in ARRAYS:
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(arrays[name]).tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+class FlatForest:
+    """Read-only forest over flattened node arrays; drop-in for predict / predict_proba / classes_"""
+
+    def __init__(self, arrays, header):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.classes_ = np.array(header['classes'])
+        self.max_depth = header['max_depth']
+        self.n_features_in_ = header['n_features']
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(*flatten(model))
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a file written by save(); pages are shared by every process that opens it"""
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = PREFIX.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a flattened forest")
+        header = json.loads(buffer[PREFIX.size:PREFIX.size + header_len])
+        data_start = -(-(PREFIX.size + header_len) // ALIGN) * ALIGN
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=data_start + spec['offset']).reshape(spec['shape'])
+        return cls(arrays, header)
+
+    def apply(self, X):
+        """(rows x trees) leaf node index reached by every row in every tree"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        n_trees = len(self.roots)
+        nodes = np.tile(self.roots, len(X))
+        # Only (row, tree) paths that have not reached a leaf are advanced at each level
+        active = np.arange(len(nodes))
+        for _ in range(self.max_depth + 1):
+            current = nodes[active]
+            feature = self.feature[current]
+            internal = feature >= 0
+            if not internal.all():
+                active, current, feature = active[internal], current[internal], feature[internal]
+                if not len(active):
+                    break
+            go_right = X[active // n_trees, feature] > self.threshold[current]
+            nodes[active] = self.children[current, go_right.view(np.int8)]
+        return nodes.reshape(len(X), n_trees)
+
+    def predict_proba(self, X):
+        return self.value[self.apply(X)].mean(axis=1, dtype=np.float64)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
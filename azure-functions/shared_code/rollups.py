@@ -0,0 +1,261 @@
+"""
+Incremental telemetry rollups
+Per device and per zone, every reading updates one 1-minute, one 1-hour and one 1-day
+bucket (count, sum, min, max and sum of squares for temperature, humidity and soilMoisture)
+in O(1). Aggregates are mergeable, so updates are kept as in-memory deltas and appended to
+disk as fixed-width records; a late reading simply adds a correction delta to its (older)
+bucket and readers merge all records of a bucket. compact() rewrites a partition with one
+record per bucket.
+
+Layout: <dir>/<scope>/entities.txt (one id per line; record entity = line number) and
+<dir>/<scope>/<resolution>/<partition>.bin, partitioned by day (minute buckets), month
+(hour buckets) or year (day buckets), so a range query reads only the partitions it spans.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from shared_code.telemetry_store import parse_timestamp
+
+METRICS = ('temperature', 'humidity', 'soilMoisture')
+SCOPES = ('device', 'zone')
+
+# resolution -> (bucket seconds, time.strftime pattern of the partition holding the bucket)
+RESOLUTIONS = {
+    'minute': (60, '%Y-%m-%d'),
+    'hour': (3600, '%Y-%m'),
+    'day': (86400, '%Y'),
+}
+
+RECORD = np.dtype([
+    ('entity', '<u4'),
+    ('bucket', '<i8'),
+    ('count', '<u4', (len(METRICS),)),
+    ('sum', '<f8', (len(METRICS),)),
+    ('min', '<f4', (len(METRICS),)),
+    ('max', '<f4', (len(METRICS),)),
+    ('sumsq', '<f8', (len(METRICS),)),
+])
+
+DEFAULT_FLUSH_INTERVAL = 60.0
+
+N = len(METRICS)
+
+
+def empty_stats():
+    """[count x3, sum x3, min x3, max x3, sumsq x3]"""
+    return [0] * N + [0.0] * N + [float('inf')] * N + [float('-inf')] * N + [0.0] * N
+
+
+def partition_of(resolution, bucket):
+    return time.strftime(RESOLUTIONS[resolution][1], time.gmtime(bucket))
+
+
+def merge_records(records):
+    """One record per (entity, bucket), combining correction deltas"""
+    if len(records) == 0:
+        return records
+    order = np.lexsort((records['bucket'], records['entity']))
+    records = records[order]
+    key_change = (np.diff(records['entity']) != 0) | (np.diff(records['bucket']) != 0)
+    starts = np.concatenate([[0], np.flatnonzero(key_change) + 1])
+    merged = np.empty(len(starts), dtype=RECORD)
+    merged['entity'] = records['entity'][starts]
+    merged['bucket'] = records['bucket'][starts]
+    for field in ('count', 'sum', 'sumsq'):
+        merged[field] = np.add.reduceat(records[field], starts, axis=0)
+    merged['min'] = np.minimum.reduceat(records['min'], starts, axis=0)
+    merged['max'] = np.maximum.reduceat(records['max'], starts, axis=0)
+    return merged
+
+
+def summarize(records):
+    """Bucket starts plus count/mean/min/max/std per metric (NaN where a bucket has no values)"""
+    result = {'bucket': records['bucket'].astype(np.float64)}
+    count = records['count'].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = records['sum'] / count
+        variance = np.maximum(records['sumsq'] / count - mean ** 2, 0.0)
+    empty = count == 0
+    for i, name in enumerate(METRICS):
+        result[name] = {
+            'count': records['count'][:, i].astype(np.int64),
+            'mean': mean[:, i],
+            'min': np.where(empty[:, i], np.nan, records['min'][:, i].astype(np.float64)),
+            'max': np.where(empty[:, i], np.nan, records['max'][:, i].astype(np.float64)),
+            'std': np.sqrt(variance[:, i]),
+        }
+    return result
+
+
+class RollupStore:
+    """Rollup tables for every scope and resolution. Thread-safe."""
+
+    def __init__(self, directory, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        # (scope, resolution) -> entity id -> bucket -> stats delta not yet on disk
+        self.pending = {(scope, resolution): {} for scope in SCOPES for resolution in RESOLUTIONS}
+        self.entities = {}
+        for scope in SCOPES:
+            os.makedirs(os.path.join(directory, scope), exist_ok=True)
+            path = self._entities_path(scope)
+            ids = open(path).read().splitlines() if os.path.exists(path) else []
+            self.entities[scope] = {entity_id: i for i, entity_id in enumerate(ids)}
+
+    def _entities_path(self, scope):
+        return os.path.join(self.directory, scope, "entities.txt")
+
+    def _partition_path(self, scope, resolution, partition):
+        return os.path.join(self.directory, scope, resolution, f"{partition}.bin")
+
+    def add(self, device_id, zone_id, timestamp, temperature, humidity, soil_moisture):
+        """Fold one reading into its device and zone buckets (None values are skipped)"""
+        timestamp = parse_timestamp(timestamp)
+        values = [(i, float(v)) for i, v in enumerate((temperature, humidity, soil_moisture)) if v is not None]
+        with self.lock:
+            for scope, entity_id in (('device', device_id), ('zone', zone_id)):
+                if not entity_id:
+                    continue
+                for resolution, (seconds, _) in RESOLUTIONS.items():
+                    bucket = int(timestamp // seconds) * seconds
+                    buckets = self.pending[(scope, resolution)].setdefault(entity_id, {})
+                    stats = buckets.get(bucket)
+                    if stats is None:
+                        stats = buckets[bucket] = empty_stats()
+                    for i, v in values:
+                        stats[i] += 1
+                        stats[N + i] += v
+                        if v < stats[2 * N + i]:
+                            stats[2 * N + i] = v
+                        if v > stats[3 * N + i]:
+                            stats[3 * N + i] = v
+                        stats[4 * N + i] += v * v
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def _entity_index(self, scope, entity_id, new_ids):
+        index = self.entities[scope].get(entity_id)
+        if index is None:
+            index = self.entities[scope][entity_id] = len(self.entities[scope])
+            new_ids.append(entity_id)
+        return index
+
+    def _to_records(self, scope, buckets_by_entity, new_ids=None):
+        rows = [(self._entity_index(scope, entity_id, new_ids) if new_ids is not None
+                 else self.entities[scope].get(entity_id, 0), bucket, stats)
+                for entity_id, buckets in buckets_by_entity.items() for bucket, stats in buckets.items()]
+        records = np.empty(len(rows), dtype=RECORD)
+        if rows:
+            stats = np.array([row[2] for row in rows], dtype=np.float64).reshape(len(rows), 5, N)
+            records['entity'] = [row[0] for row in rows]
+            records['bucket'] = [row[1] for row in rows]
+            for j, field in enumerate(('count', 'sum', 'min', 'max', 'sumsq')):
+                records[field] = stats[:, j]
+        return records
+
+    def _flush(self):
+        """Append pending deltas to their partitions (caller holds the lock)"""
+        for (scope, resolution), buckets_by_entity in self.pending.items():
+            if not buckets_by_entity:
+                continue
+            new_ids = []
+            records = self._to_records(scope, buckets_by_entity, new_ids)
+            if new_ids:
+                # Ids are written before any record that refers to them
+                with open(self._entities_path(scope), 'a') as f:
+                    f.write("".join(f"{entity_id}\n" for entity_id in new_ids))
+            days, day_index = np.unique(records['bucket'] // 86400, return_inverse=True)
+            partitions = np.array([partition_of(resolution, int(day) * 86400) for day in days])[day_index]
+            for partition in np.unique(partitions):
+                path = self._partition_path(scope, resolution, partition)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'ab') as f:
+                    # Drop a torn record from an interrupted write before appending
+                    size = f.tell()
+                    if size % RECORD.itemsize:
+                        f.truncate(size - size % RECORD.itemsize)
+                        f.seek(0, os.SEEK_END)
+                    f.write(records[partitions == partition].tobytes())
+            buckets_by_entity.clear()
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _read_partition(self, path):
+        if not os.path.exists(path):
+            return np.empty(0, dtype=RECORD)
+        data = np.fromfile(path, dtype=np.uint8)
+        return data[:len(data) - len(data) % RECORD.itemsize].view(RECORD)
+
+    def _partitions(self, resolution, start, end):
+        """Partition names covering [start, end); every bucket size divides a day"""
+        names = []
+        t = int(start // 86400) * 86400
+        while t < end:
+            name = partition_of(resolution, t)
+            if not names or names[-1] != name:
+                names.append(name)
+            t += 86400
+        return names
+
+    def query(self, scope, entity_id, resolution, start, end):
+        """Merged buckets of one device or zone with start <= bucket < end (see summarize)"""
+        start, end = parse_timestamp(start), parse_timestamp(end)
+        # Pending deltas and partition files are read under one lock hold: a flush (or
+        # compaction) in between would move deltas to disk and count them twice
+        with self.lock:
+            index = self.entities[scope].get(entity_id)
+            pending = self.pending[(scope, resolution)].get(entity_id, {})
+            pending = {entity_id: {b: list(s) for b, s in pending.items() if start <= b < end}}
+            parts = [self._to_records(scope, pending)]
+            for partition in self._partitions(resolution, start, end) if index is not None else []:
+                records = self._read_partition(self._partition_path(scope, resolution, partition))
+                parts.append(records[(records['entity'] == index)
+                                     & (records['bucket'] >= start) & (records['bucket'] < end)])
+        return summarize(merge_records(np.concatenate(parts)))
+
+    def compact(self):
+        """Rewrite every partition with one record per bucket (atomic replace per file)"""
+        with self.lock:
+            self._flush()
+            for scope in SCOPES:
+                for resolution in RESOLUTIONS:
+                    folder = os.path.join(self.directory, scope, resolution)
+                    if not os.path.isdir(folder):
+                        continue
+                    for file_name in sorted(os.listdir(folder)):
+                        if not file_name.endswith('.bin'):
+                            continue
+                        path = os.path.join(folder, file_name)
+                        before = self._read_partition(path)
+                        merged = merge_records(before)
+                        if len(merged) == len(before):
+                            continue
+                        merged.tofile(path + ".tmp")
+                        os.replace(path + ".tmp", path)
+                        logging.info(f"Compacted {path}: {len(before)} -> {len(merged)} records")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_rollup_store():
+    """Process-wide rollups under TELEMETRY_HISTORY_DIR/rollups (None when history is disabled)"""
+    global _store
+    directory = os.environ.get("TELEMETRY_HISTORY_DIR")
+    if not directory:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RollupStore(os.path.join(directory, "rollups"))
+    return _store
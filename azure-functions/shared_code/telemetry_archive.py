@@ -0,0 +1,233 @@
+"""
+Partitioned Parquet telemetry archive
+ArchiveWriter batches readings from the ingestion path and writes them as Parquet files
+partitioned Hive-style by date and farm/zone:
+
+  <root>/date=2025-12-16/farm=farm_001/zone=zone_A/part-<epoch ms>-<id>.parquet
+
+Rows inside a file are sorted by deviceId then timestamp and written with row-group
+statistics, so query_archive() prunes partitions on date/farm/zone, skips row groups on
+timestamp/deviceId min-max and reads only the requested columns. Files are written under a
+hidden temporary name and renamed into place, so readers never see partial files, and
+files on the stale side of an unfinished compaction (see archive_maintenance.py) are
+skipped, so a crash mid-compaction never shows rows twice.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from shared_code.telemetry_store import parse_timestamp
+
+SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('ms', tz='UTC')),
+    ('deviceId', pa.string()),
+    ('messageId', pa.int64()),
+    ('temperature', pa.float32()),
+    ('humidity', pa.float32()),
+    ('soilMoisture', pa.float32()),
+    ('recommendedCrop', pa.string()),
+    ('recommendationConfidence', pa.float32()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('farm', pa.string()), ('zone', pa.string())]),
+                               flavor='hive')
+
+# Journals of unfinished maintenance steps (written by archive_maintenance.py)
+JOURNAL_DIR = "_maintenance"
+
+DEFAULT_BATCH_ROWS = 5000
+DEFAULT_FLUSH_INTERVAL = 60.0
+ROW_GROUP_ROWS = 64 * 1024
+COMPRESSION = 'zstd'
+
+
+def partition_dir(root, date, farm, zone):
+    return os.path.join(root, f"date={date}", f"farm={farm}", f"zone={zone}")
+
+
+def file_name(prefix="part"):
+    return f"{prefix}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def write_sorted(table, path, row_group_rows=ROW_GROUP_ROWS):
+    """Write table sorted by device/time with row-group statistics"""
+    table = table.sort_by([('deviceId', 'ascending'), ('timestamp', 'ascending')])
+    pq.write_table(table, path, row_group_size=row_group_rows, compression=COMPRESSION, write_statistics=True)
+
+
+def write_partition_file(directory, table, prefix="part"):
+    """Write table under a hidden name, then rename it into place; returns the final path"""
+    os.makedirs(directory, exist_ok=True)
+    name = file_name(prefix)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    write_sorted(table, tmp_path)
+    path = os.path.join(directory, name)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ArchiveWriter:
+    """Buffers readings and writes one Parquet file per (date, farm, zone) per flush. Thread-safe."""
+
+    def __init__(self, root, batch_rows=DEFAULT_BATCH_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.root = root
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.rows = []
+        self.last_flush = time.monotonic()
+        os.makedirs(root, exist_ok=True)
+
+    def append(self, device_id, farm_id, zone_id, timestamp, temperature, humidity, soil_moisture,
+               message_id=None, recommended_crop=None, recommendation_confidence=None):
+        row = (parse_timestamp(timestamp), device_id, message_id, temperature, humidity, soil_moisture,
+               recommended_crop, recommendation_confidence, farm_id or "unknown", zone_id or "unknown")
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_rows or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        """Write buffered rows (caller holds the lock); returns the files written"""
+        rows, self.rows = self.rows, []
+        self.last_flush = time.monotonic()
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        table = pa.table({
+            'timestamp': pa.array([int(t * 1000) for t in columns[0]], pa.int64()).cast(SCHEMA.field('timestamp').type),
+            'deviceId': pa.array(columns[1], pa.string()),
+            'messageId': pa.array(columns[2], pa.int64()),
+            'temperature': pa.array(columns[3], pa.float32()),
+            'humidity': pa.array(columns[4], pa.float32()),
+            'soilMoisture': pa.array(columns[5], pa.float32()),
+            'recommendedCrop': pa.array(columns[6], pa.string()),
+            'recommendationConfidence': pa.array(columns[7], pa.float32()),
+        }, schema=SCHEMA)
+        dates = [datetime.fromtimestamp(t, tz=timezone.utc).strftime('%Y-%m-%d') for t in columns[0]]
+        groups = {}
+        for i, key in enumerate(zip(dates, columns[8], columns[9])):
+            groups.setdefault(key, []).append(i)
+        paths = []
+        for (date, farm, zone), indices in groups.items():
+            paths.append(write_partition_file(partition_dir(self.root, date, farm, zone), table.take(indices)))
+        logging.info(f"Archived {len(rows)} readings into {len(paths)} files")
+        return paths
+
+    def flush(self):
+        with self.lock:
+            return self._flush()
+
+
+def superseded_files(root):
+    """
+    Files readers must skip because a compaction journal is unfinished: its outputs while
+    every input is still present (outputs are renamed into place before any input is
+    removed), otherwise the inputs that remain.
+    """
+    journal_dir = os.path.join(root, JOURNAL_DIR)
+    if not os.path.isdir(journal_dir):
+        return set()
+    skipped = set()
+    for name in os.listdir(journal_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(journal_dir, name)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue  # finished meanwhile
+        if entry.get('kind') != 'compact':
+            continue
+        inputs = [os.path.normpath(os.path.join(root, rel)) for rel in entry['inputs']]
+        if all(os.path.exists(path) for path in inputs):
+            skipped.update(os.path.normpath(os.path.join(root, final)) for _, final in entry['outputs'])
+        else:
+            skipped.update(inputs)
+    return skipped
+
+
+def archive_dataset(root):
+    """pyarrow Dataset over the archive (partition columns date/farm/zone included)"""
+    dataset = ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+    # Journals are read after the files are listed, so the skip list matches the listing
+    skipped = superseded_files(root)
+    if skipped:
+        files = [path for path in dataset.files if os.path.normpath(path) not in skipped]
+        dataset = ds.dataset(files, schema=dataset.schema, format='parquet', partitioning=PARTITIONING,
+                             partition_base_dir=root)
+    return dataset
+
+
+def _to_utc(value):
+    return datetime.fromtimestamp(parse_timestamp(value), tz=timezone.utc)
+
+
+def archive_filter(start=None, end=None, devices=None, farms=None, zones=None):
+    """Filter expression for query_archive; date/farm/zone terms prune whole partitions"""
+    timestamp_type = SCHEMA.field('timestamp').type
+    terms = []
+    if start is not None:
+        start = _to_utc(start)
+        terms += [ds.field('date') >= start.strftime('%Y-%m-%d'),
+                  ds.field('timestamp') >= pa.scalar(start, timestamp_type)]
+    if end is not None:
+        end = _to_utc(end)
+        terms += [ds.field('date') <= end.strftime('%Y-%m-%d'),
+                  ds.field('timestamp') < pa.scalar(end, timestamp_type)]
+    if devices:
+        terms.append(ds.field('deviceId').isin(list(devices)))
+    if farms:
+        terms.append(ds.field('farm').isin(list(farms)))
+    if zones:
+        terms.append(ds.field('zone').isin(list(zones)))
+    expression = None
+    for term in terms:
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def query_archive(root, start=None, end=None, devices=None, farms=None, zones=None, columns=None):
+    """
+    Readings with start <= timestamp < end (epoch seconds or ISO 8601), optionally limited to
+    some devices/farms/zones, as a pyarrow Table with only the requested columns.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"No telemetry archive at {root}")
+    dataset = archive_dataset(root)
+    return dataset.to_table(columns=columns, filter=archive_filter(start, end, devices, farms, zones))
+
+
+def daily_summary(table, keys=('zone', 'date')):
+    """Per-key mean/min/max of the telemetry columns (pyarrow group_by, no pandas round trip)"""
+    aggregations = []
+    for column in ('temperature', 'humidity', 'soilMoisture'):
+        if column in table.column_names:
+            aggregations += [(column, 'mean'), (column, 'min'), (column, 'max')]
+    return table.group_by(list(keys)).aggregate(aggregations + [(keys[0], 'count')])
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_archive_writer():
+    """Process-wide writer configured by TELEMETRY_ARCHIVE_DIR (None when unset)"""
+    global _writer
+    root = os.environ.get("TELEMETRY_ARCHIVE_DIR")
+    if not root:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ArchiveWriter(root, int(os.environ.get("TELEMETRY_ARCHIVE_BATCH_ROWS", DEFAULT_BATCH_ROWS)))
+                logging.info(f"Telemetry archive writer opened at {root}")
+    return _writer
@@ -0,0 +1,279 @@
+"""
+Telemetry history store
+Keeps recent readings per device in a fixed-size NumPy ring buffer (float32 columns:
+timestamp, temperature, humidity, soilMoisture) and spills sealed chunks to an append-only
+columnar file. "Last N hours for device X" is answered from memory when every row evicted from the ring
+buffer is older than the window; otherwise the chunks on disk are merged in.
+
+Timestamps are stored as float32 seconds relative to a float64 base (per ring buffer and
+per chunk) so they keep sub-second precision.
+
+Chunk record layout (little-endian):
+  header  magic 'TCHK', n_rows u32, device-id length u16, t_min f64, t_max f64, crc32 u32
+  body    device id (utf-8), then timestamp | temperature | humidity | soilMoisture,
+          each n_rows float32 (timestamps relative to t_min)
+A torn record at the end of the file (crash mid-write) is detected and truncated on open.
+"""
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+COLUMNS = ('timestamp', 'temperature', 'humidity', 'soilMoisture')
+VALUE_COLUMNS = COLUMNS[1:]
+
+HEADER = struct.Struct('<4sIHddI')
+MAGIC = b'TCHK'
+FILE_NAME = "telemetry.col"
+
+DEFAULT_CAPACITY = 1024      # rows kept in memory per device (~3.5 days at 5-minute telemetry)
+DEFAULT_CHUNK_ROWS = 256     # unsealed rows that force a spill for one device
+DEFAULT_FLUSH_INTERVAL = 300.0  # seconds between spills of every device's unsealed rows
+REBASE_SECONDS = 7 * 86400   # shift a ring buffer's time base once offsets grow past this
+
+
+def parse_timestamp(value):
+    """Epoch seconds from an ISO 8601 string (trailing Z allowed) or a number"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return time.time()
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value).timestamp()
+
+
+class DeviceBuffer:
+    """Ring buffer of one device's latest readings"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((len(COLUMNS), capacity), dtype=np.float32)
+        self.base = None
+        self.size = 0
+        self.head = 0        # next write position
+        self.unsealed = 0    # newest rows not yet written to disk
+        self.evicted_max = -np.inf  # newest timestamp that exists only on disk
+
+    def append(self, timestamp, values):
+        if self.base is None:
+            self.base = float(np.floor(timestamp))
+        elif timestamp - self.base > REBASE_SECONDS:
+            shift = float(np.floor(timestamp)) - self.base
+            self.data[0, :self.size] -= np.float32(shift)
+            self.base += shift
+        if self.size == self.capacity:
+            self.evicted_max = max(self.evicted_max, self.base + float(self.data[0, self.head]))
+        self.data[0, self.head] = timestamp - self.base
+        self.data[1:, self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.unsealed = min(self.unsealed + 1, self.capacity)
+
+    def _ordered(self, count):
+        """Column-major copy of the newest `count` rows in arrival order"""
+        start = (self.head - count) % self.capacity
+        if start + count <= self.capacity:
+            return self.data[:, start:start + count].copy()
+        return np.concatenate([self.data[:, start:], self.data[:, :self.head]], axis=1)
+
+    def unsealed_rows(self):
+        """(base, rows) for rows not yet on disk"""
+        return self.base, self._ordered(self.unsealed)
+
+    def take_unsealed(self):
+        """unsealed_rows(), marking them sealed"""
+        result = self.unsealed_rows()
+        self.unsealed = 0
+        return result
+
+    def window(self, start, end):
+        """Rows with start <= timestamp < end, sorted by time; timestamps as float64 epoch seconds"""
+        rows = self.data[:, :self.size] if self.size < self.capacity else self.data
+        ts = rows[0].astype(np.float64) + self.base
+        mask = (ts >= start) & (ts < end)
+        order = np.argsort(ts[mask], kind='stable')
+        selected = rows[:, mask]
+        result = {'timestamp': ts[mask][order]}
+        for i, name in enumerate(VALUE_COLUMNS, start=1):
+            result[name] = selected[i, order]
+        return result
+
+
+class TelemetryStore:
+    """
+    Per-device history: ring buffers in memory plus an append-only chunk file. Thread-safe;
+    the Functions worker can run several invocations at once.
+    """
+
+    def __init__(self, directory, capacity=DEFAULT_CAPACITY, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.path = os.path.join(directory, FILE_NAME)
+        self.capacity = capacity
+        self.chunk_rows = min(chunk_rows, capacity)
+        self.flush_interval = flush_interval
+        self.buffers = {}
+        self.index = {}      # device id -> [(offset, n_rows, t_min, t_max)]
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+        self.file = open(self.path, 'ab')
+
+    def _load_index(self):
+        """Scan chunk headers; truncate a torn record left by a crash"""
+        if not os.path.exists(self.path):
+            return
+        valid_end = 0
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            while valid_end + HEADER.size <= size:
+                f.seek(valid_end)
+                magic, n_rows, id_len, t_min, t_max, crc = HEADER.unpack(f.read(HEADER.size))
+                body_len = id_len + 4 * len(COLUMNS) * n_rows
+                if magic != MAGIC or valid_end + HEADER.size + body_len > size:
+                    break
+                body = f.read(body_len)
+                if zlib.crc32(body) != crc:
+                    break
+                device_id = body[:id_len].decode('utf-8')
+                self.index.setdefault(device_id, []).append((valid_end, n_rows, t_min, t_max))
+                valid_end += HEADER.size + body_len
+        if valid_end < size:
+            logging.warning(f"Truncating {size - valid_end} bytes of incomplete history at {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+
+    def _buffer(self, device_id):
+        """Ring buffer for a device, filled from its newest chunks the first time it is used"""
+        buffer = self.buffers.get(device_id)
+        if buffer is None:
+            buffer = self.buffers[device_id] = DeviceBuffer(self.capacity)
+            chunks, rows = [], 0
+            for chunk in reversed(self.index.get(device_id, [])):
+                chunks.append(chunk)
+                rows += chunk[1]
+                if rows >= self.capacity:
+                    break
+            for chunk in reversed(chunks):
+                columns = self._read_chunk(chunk)
+                for row in zip(*(columns[name] for name in COLUMNS)):
+                    buffer.append(float(row[0]), row[1:])
+            buffer.unsealed = 0
+            index = self.index.get(device_id, [])
+            skipped = index[:len(index) - len(chunks)]
+            if skipped:
+                buffer.evicted_max = max(buffer.evicted_max, max(chunk[3] for chunk in skipped))
+        return buffer
+
+    def _read_chunk(self, chunk):
+        offset, n_rows, t_min, _ = chunk
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            header = f.read(HEADER.size)
+            id_len = HEADER.unpack(header)[2]
+            f.seek(offset + HEADER.size + id_len)
+            data = np.frombuffer(f.read(4 * len(COLUMNS) * n_rows), dtype='<f4').reshape(len(COLUMNS), n_rows)
+        columns = {'timestamp': data[0].astype(np.float64) + t_min}
+        for i, name in enumerate(VALUE_COLUMNS, start=1):
+            columns[name] = data[i]
+        return columns
+
+    def _spill(self, device_ids):
+        """Write the unsealed rows of the given devices as chunks (caller holds the lock)"""
+        records = []
+        offset = self.file.tell()
+        for device_id in device_ids:
+            buffer = self.buffers[device_id]
+            if not buffer.unsealed:
+                continue
+            base, rows = buffer.take_unsealed()
+            timestamps = rows[0].astype(np.float64) + base
+            t_min, t_max = float(timestamps.min()), float(timestamps.max())
+            rows[0] = (timestamps - t_min).astype(np.float32)
+            encoded_id = device_id.encode('utf-8')
+            body = encoded_id + rows.astype('<f4').tobytes()
+            records.append(HEADER.pack(MAGIC, rows.shape[1], len(encoded_id), t_min, t_max, zlib.crc32(body)) + body)
+            self.index.setdefault(device_id, []).append((offset, rows.shape[1], t_min, t_max))
+            offset += len(records[-1])
+        if records:
+            self.file.write(b''.join(records))
+            self.file.flush()
+
+    def append(self, device_id, timestamp, temperature, humidity, soil_moisture):
+        """Record one reading (missing values are stored as NaN)"""
+        values = [np.nan if v is None else float(v) for v in (temperature, humidity, soil_moisture)]
+        timestamp = parse_timestamp(timestamp)
+        with self.lock:
+            buffer = self._buffer(device_id)
+            buffer.append(timestamp, values)
+            if buffer.unsealed >= self.chunk_rows:
+                self._spill([device_id])
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._spill(list(self.buffers))
+                self.last_flush = time.monotonic()
+
+    def flush(self):
+        """Write every device's unsealed rows to disk"""
+        with self.lock:
+            self._spill(list(self.buffers))
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def devices(self):
+        with self.lock:
+            return sorted(set(self.buffers) | set(self.index))
+
+    def last(self, device_id, hours=24.0, now=None):
+        """Readings from the last `hours` (memory only when the ring buffer covers the window)"""
+        end = time.time() if now is None else now
+        return self.range(device_id, end - hours * 3600.0, end + 1e-3)
+
+    def range(self, device_id, start, end):
+        """Readings with start <= timestamp < end as a dict of arrays, sorted by time"""
+        with self.lock:
+            buffer = self._buffer(device_id)
+            # Memory is complete for the window only if every evicted row is older than it;
+            # the minimum buffered timestamp is not enough (a late reading can be older)
+            if start > buffer.evicted_max:
+                return buffer.window(start, end)
+            chunks = [c for c in self.index.get(device_id, []) if c[3] >= start and c[2] < end]
+            base, rows = buffer.unsealed_rows()
+
+        parts = [self._read_chunk(chunk) for chunk in chunks]
+        parts.append(dict(zip(COLUMNS, [rows[0].astype(np.float64) + base] + list(rows[1:]))))
+        merged = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+        mask = (merged['timestamp'] >= start) & (merged['timestamp'] < end)
+        order = np.argsort(merged['timestamp'][mask], kind='stable')
+        return {name: merged[name][mask][order] for name in COLUMNS}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_telemetry_store():
+    """
+    Process-wide store configured by TELEMETRY_HISTORY_DIR (None when unset, so history is
+    opt-in). TELEMETRY_RING_ROWS sets the per-device in-memory capacity.
+    """
+    global _store
+    directory = os.environ.get("TELEMETRY_HISTORY_DIR")
+    if not directory:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                capacity = int(os.environ.get("TELEMETRY_RING_ROWS", DEFAULT_CAPACITY))
+                _store = TelemetryStore(directory, capacity=capacity)
+                logging.info(f"Telemetry history store opened at {directory}")
+    return _store
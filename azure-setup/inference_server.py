@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Micro-batching inference server for the AI_Inference model
+Serves POST /api/predict with the same request and response as the AI_Inference function,
+but collects concurrent requests for up to --max-delay-ms (or until --max-batch rows are
+waiting), scores them as one matrix with a single predict_proba call and fans the rows
+back to their callers. Batches are scored on one worker thread, so requests that arrive
+while a batch is being scored form the next batch. GET /health returns batch statistics.
+
+With --workers N the server pre-forks N processes that accept on one shared socket. The
+parent flattens the forest into a file (shared_code/flat_forest.py) that every worker
+memory-maps read-only, so the model is in memory once however many workers run, and a
+supervisor loop restarts any worker that dies.
+
+The model and scaler are the AI_Inference ones (AI_MODEL_PATH / AI_SCALER_PATH, see
+azure-functions/shared_code/crop_model.py); without a model, crops are ranked by
+suitability as in the function.
+
+Usage:
+  python azure-setup/inference_server.py serve --port 7073 --max-batch 64 --max-delay-ms 2
+  python azure-setup/inference_server.py serve --workers 4
+  python azure-setup/inference_server.py bench --url http://127.0.0.1:7073/api/predict --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from load_generator import FUNCTIONS_DIR, percentiles_ms
+
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.insert(0, FUNCTIONS_DIR)
+
+from shared_code import crop_model, flat_forest  # noqa: E402
+from shared_code.crop_suitability import get_crop_suitability  # noqa: E402
+
+MODEL_VERSION = "v1.0"
+FEATURES = ('temperature', 'humidity', 'soilMoisture')
+# Same input ranges as AI_Inference
+RANGES = {'temperature': (0, 50, "Temperature out of range (0-50)"),
+          'humidity': (0, 100, "Humidity out of range (0-100)"),
+          'soilMoisture': (0, 100, "Soil moisture out of range (0-100)")}
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_DELAY_MS = 2.0
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+class Scorer:
+    """Top-3 crops for a (rows x 3) feature matrix with the AI_Inference model or the suitability ranking"""
+
+    def __init__(self, model=None, scaler=None):
+        self.model = model
+        self.scaler = scaler
+        self.method = "model" if model is not None else "suitability"
+
+    def __call__(self, features):
+        if self.model is not None:
+            crops, confidences = crop_model.predict_top_k(self.model, self.scaler, features, k=3)
+        else:
+            crops, confidences = get_crop_suitability().top_k(features, k=3)
+        return [[(str(crop), float(confidence)) for crop, confidence in zip(row_crops, row_confidences)]
+                for row_crops, row_confidences in zip(crops, confidences)]
+
+
+class MicroBatcher:
+    """
+    Collects rows submitted from the event loop and scores them in batches. A batch is
+    dispatched when max_batch rows are waiting or max_delay seconds after its first row
+    arrived; only one batch is scored at a time.
+    """
+
+    def __init__(self, score, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY_MS / 1000.0):
+        self.score = score
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self.pending = []          # (row, future)
+        self.timer = None
+        self.running = False
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="score")
+        self.batches = 0
+        self.rows = 0
+        self.largest = 0
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((row, future))
+        if len(self.pending) >= self.max_batch:
+            self._dispatch()
+        elif self.timer is None and not self.running:
+            self.timer = asyncio.get_running_loop().call_later(self.max_delay, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.running or not self.pending:
+            return
+        batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+        self.running = True
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        features = np.array([row for row, _ in batch], dtype=np.float64)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.score, features)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest = max(self.largest, len(batch))
+            self.running = False
+            # Rows that queued up while this batch was scored go next (full batches at once)
+            if len(self.pending) >= self.max_batch:
+                self._dispatch()
+            elif self.pending and self.timer is None:
+                self.timer = asyncio.get_running_loop().call_later(self.max_delay, self._dispatch)
+
+    def stats(self):
+        return {'batches': self.batches, 'rows': self.rows, 'largest_batch': self.largest,
+                'mean_batch': round(self.rows / self.batches, 2) if self.batches else 0.0,
+                'max_batch': self.max_batch, 'max_delay_ms': self.max_delay * 1000.0}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def parse_features(body):
+    """Feature row from a request body; raises ValueError like AI_Inference"""
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Request body is not valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    row = []
+    for name in FEATURES:
+        value = float(data.get(name))
+        low, high, message = RANGES[name]
+        if not (low <= value <= high):
+            raise ValueError(message)
+        row.append(value)
+    return row
+
+
+async def predict(batcher, method, body):
+    """(status, payload) for one /api/predict request"""
+    start = time.perf_counter()
+    try:
+        row = parse_features(body)
+    except (TypeError, ValueError) as e:
+        return 400, {"error": str(e), "errorType": "ValueError"}
+    try:
+        ranked = await batcher.submit(row)
+    except Exception as e:
+        logging.error(f"Error: {e}")
+        return 500, {"error": str(e), "errorType": type(e).__name__}
+    return 200, {
+        "crop": ranked[0][0],
+        "confidence": ranked[0][1],
+        "alternatives": [{"crop": crop, "confidence": confidence} for crop, confidence in ranked[1:]],
+        "inferenceTime": int((time.perf_counter() - start) * 1000),
+        "inferenceLocation": "local",
+        "inferenceMethod": method,
+        "modelVersion": MODEL_VERSION,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "input": dict(zip(FEATURES, row))
+    }
+
+
+async def read_request(reader):
+    """(method, path, body) of one HTTP/1.1 request, or None when the connection closed"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path = request_line.decode('latin-1').split()[:2]
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length) if length else b""
+    return method, urlsplit(path).path, body
+
+
+async def serve(batcher, method, host=None, port=None, sock=None):
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                verb, path, body = request
+                if path.rstrip('/') == '/api/predict':
+                    status, payload = await predict(batcher, method, body) if verb == 'POST' else (405, {})
+                elif path.rstrip('/') == '/health':
+                    status, payload = 200, dict(batcher.stats(), inferenceMethod=method, pid=os.getpid())
+                else:
+                    status, payload = 404, {"error": f"No route for {path}"}
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode('ascii') + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    if sock is not None:
+        server = await asyncio.start_server(handle, sock=sock)
+    else:
+        server = await asyncio.start_server(handle, host, port, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+def share_model(model, directory):
+    """Flatten a tree ensemble into a memory-mapped file; None when the model cannot be flattened"""
+    path = os.path.join(directory, f"crop-model-{os.getpid()}.flat")
+    try:
+        return flat_forest.save(model, path)
+    except TypeError as e:
+        logging.warning(f"{e}; workers share the parent's copy of the model copy-on-write instead")
+        return None
+
+
+def run_worker(sock, model, scaler, shared_path, max_batch, max_delay):
+    """Worker process: attach the shared model read-only and serve on the inherited socket"""
+    if shared_path:
+        model = flat_forest.FlatForest.open(shared_path)
+    scorer = Scorer(model, scaler)
+    batcher = MicroBatcher(scorer, max_batch, max_delay)
+    try:
+        asyncio.run(serve(batcher, scorer.method, sock=sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        batcher.close()
+
+
+def supervise(workers, start_worker, restart_delay=1.0):
+    """
+    Fork `workers` processes running start_worker() and restart any that exits until the
+    supervisor gets SIGINT/SIGTERM. A worker that dies within restart_delay of starting is
+    restarted after restart_delay, so a crash loop does not spin.
+    """
+    children = {}     # pid -> start time
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                start_worker()
+            except BaseException:
+                logging.exception("Worker failed")
+                code = 1
+            os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    restarts = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        restarts += 1
+        logging.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        if time.monotonic() - started < restart_delay:
+            time.sleep(restart_delay)
+        if not stopping:
+            spawn()
+    return restarts
+
+
+async def bench(url, concurrency, duration, seed):
+    """Closed-loop load: `concurrency` keep-alive connections each posting one request at a time"""
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/"
+    rng = np.random.default_rng(seed)
+    bodies = [json.dumps(dict(zip(FEATURES, (round(float(v), 2) for v in row)))).encode('utf-8')
+              for row in rng.uniform([10, 30, 10], [40, 95, 90], size=(1024, 3))]
+    latencies, errors = [], 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def client(i):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        n = i
+        try:
+            while loop.time() < deadline:
+                body = bodies[n % len(bodies)]
+                n += concurrency
+                sent = loop.time()
+                writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+                              f"Content-Length: {len(body)}\r\n\r\n").encode('ascii') + body)
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionError("Connection closed by server")
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                if int(status_line.split()[1]) != 200:
+                    errors += 1
+                    continue
+                latencies.append(loop.time() - sent)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors += 1
+        finally:
+            writer.close()
+
+    start = loop.time()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = loop.time() - start
+    return {'url': url, 'concurrency': concurrency, 'completed': len(latencies), 'errors': errors,
+            'elapsed_s': round(elapsed, 3), 'throughput_per_s': round(len(latencies) / elapsed, 1),
+            'latency_ms': percentiles_ms(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching inference server for the AI_Inference model")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = sub.add_parser("serve", help="Run the server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=7073)
+    serve_parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="Rows per batch (1 disables batching)")
+    serve_parser.add_argument("--max-delay-ms", type=float, default=DEFAULT_MAX_DELAY_MS,
+                              help="Longest a request waits for its batch to fill")
+    serve_parser.add_argument("--model", default=None, help="Model pickle (default: AI_MODEL_PATH)")
+    serve_parser.add_argument("--scaler", default=None, help="Scaler pickle (default: AI_SCALER_PATH)")
+    serve_parser.add_argument("--workers", type=int, default=1,
+                              help="Pre-forked worker processes sharing one memory-mapped model")
+    serve_parser.add_argument("--shared-model-dir", default=tempfile.gettempdir(),
+                              help="Where the flattened model file for --workers is written")
+    serve_parser.add_argument("--log-level", default="WARNING")
+
+    bench_parser = sub.add_parser("bench", help="Measure throughput and latency of a running server")
+    bench_parser.add_argument("--url", default="http://127.0.0.1:7073/api/predict")
+    bench_parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight")
+    bench_parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    bench_parser.add_argument("--seed", type=int, default=42)
+    bench_parser.add_argument("--output", default=None, help="Write the summary as JSON")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        summary = asyncio.run(bench(args.url, args.concurrency, args.duration, args.seed))
+        p = summary['latency_ms']
+        print(f"  Completed: {summary['completed']:,}   Errors: {summary['errors']:,}   "
+              f"Throughput: {summary['throughput_per_s']}/s at concurrency {args.concurrency}")
+        print(f"  Latency p50 {p['p50']} ms  p95 {p['p95']} ms  p99 {p['p99']} ms  max {p['max']} ms")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"\n✅ Summary saved to {args.output}")
+        return
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()))
+    if args.model:
+        os.environ['AI_MODEL_PATH'] = os.path.abspath(args.model)
+    if args.scaler:
+        os.environ['AI_SCALER_PATH'] = os.path.abspath(args.scaler)
+    # Pre-fork workers share the pickled forest through a memory-mapped file (an onnxruntime
+    # session must not cross a fork), so only the single-process server uses a compiled model
+    model = crop_model.load_model(compiled=args.workers <= 1)
+    scorer = Scorer(model, crop_model.load_scaler() if model is not None else None)
+    max_delay = args.max_delay_ms / 1000.0
+    print(f"🌐 Inference server listening on http://{args.host}:{args.port}/api/predict "
+          f"(method={scorer.method}, max batch {args.max_batch}, max delay {args.max_delay_ms:g} ms, "
+          f"workers {args.workers})")
+
+    if args.workers <= 1:
+        batcher = MicroBatcher(scorer, args.max_batch, max_delay)
+        try:
+            asyncio.run(serve(batcher, scorer.method, args.host, args.port))
+        except KeyboardInterrupt:
+            print(f"\nStopped: {json.dumps(batcher.stats())}")
+        finally:
+            batcher.close()
+        return
+
+    shared_path = share_model(model, args.shared_model_dir) if model is not None else None
+    if shared_path:
+        # Workers map the flattened file; the parent's unpickled trees are no longer needed
+        model = scorer.model = None
+        print(f"  Shared model: {shared_path} ({os.path.getsize(shared_path) / 1e6:.1f} MB)")
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    try:
+        restarts = supervise(args.workers, lambda: run_worker(sock, model, scorer.scaler, shared_path,
+                                                              args.max_batch, max_delay))
+        print(f"\nStopped {args.workers} workers ({restarts} restarts)")
+    finally:
+        sock.close()
+        if shared_path:
+            os.remove(shared_path)
+
+
+if __name__ == "__main__":
+    main()
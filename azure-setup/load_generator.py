@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Load generator for the IoT Hub -> Digital Twins ingestion path
+Replaces the one-subprocess-per-update run-sim.py for performance work: telemetry from
+the fleet simulator (simulation/fleet_simulator.py) is wrapped in Event Grid events and
+fed to IoTHub_EventGrid either in-process (the function's dt_client is swapped for the
+local ADT emulator in digital-twins/adt_emulator.py) or over HTTP (an Event Grid webhook
+such as a local Functions host, or the stand-in started with `serve`). Arrivals are open-loop at the configured rate and
+burst profile, so latencies include queueing when the target falls behind.
+
+Usage:
+  python azure-setup/load_generator.py run --devices 1000 --rate 500 --duration 30
+  python azure-setup/load_generator.py run --profile burst --burst-factor 5 --target http://127.0.0.1:7072/api/events
+  python azure-setup/load_generator.py serve --port 7072 --store-latency-ms 5
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTIONS_DIR = os.path.join(REPO_DIR, "azure-functions")
+# The Functions host puts the app root on sys.path (for shared_code)
+sys.path.insert(0, FUNCTIONS_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "simulation"))
+sys.path.insert(0, os.path.join(REPO_DIR, "digital-twins"))
+
+from adt_emulator import (DEFAULT_PATCHES_PER_TWIN_PER_SECOND, DEFAULT_REQUESTS_PER_SECOND,  # noqa: E402
+                          DigitalTwinsEmulator, seed_default_twins)
+from fleet_simulator import FleetSimulator  # noqa: E402
+
+EVENT_TYPE = "Microsoft.Devices.DeviceTelemetry"
+
+
+def make_event(payload):
+    """Event Grid event for a simulator payload, in the shape IoTHub_EventGrid.main expects"""
+    body = dict(payload['telemetry'])
+    body['timestamp'] = payload['timestamp']
+    for key in ('deviceId', 'farmId', 'zoneId', 'messageId'):
+        body[key] = payload[key]
+    return {
+        "id": str(uuid.uuid4()),
+        "subject": f"devices/{payload['deviceId']}",
+        "eventType": EVENT_TYPE,
+        "eventTime": payload['timestamp'],
+        "dataVersion": "1",
+        "data": {
+            "body": body,
+            "properties": {},
+            "systemProperties": {"iothub-connection-device-id": payload['deviceId']}
+        }
+    }
+
+
+def iter_events(n_devices, seed=42):
+    """Endless stream of events: one simulator tick for all devices, then the next"""
+    simulator = FleetSimulator(n_devices, seed=seed)
+    while True:
+        batch = simulator.step()
+        for payload in simulator.payloads(batch):
+            yield make_event(payload)
+
+
+def load_function(name):
+    """Import azure-functions/<name>/__init__.py as a module"""
+    path = os.path.join(FUNCTIONS_DIR, name, "__init__.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def schedule(rate, duration, profile='constant', burst_factor=4.0, burst_seconds=2.0, burst_period=10.0):
+    """Send offsets (seconds from start) for an open-loop arrival process"""
+    if profile == 'constant':
+        return np.arange(0.0, duration, 1.0 / rate)
+    if profile == 'ramp':
+        # Rate grows linearly from 10% to 100%: invert the cumulative count
+        n = int(0.55 * rate * duration)
+        counts = np.arange(n)
+        a, b = 0.1 * rate, 0.9 * rate / duration
+        return (-a + np.sqrt(a * a + 2 * b * counts)) / b
+    if profile == 'burst':
+        # Base rate with burst_factor x rate for burst_seconds at the start of every period
+        offsets, t = [], 0.0
+        while t < duration:
+            in_burst = (t % burst_period) < burst_seconds
+            offsets.append(t)
+            t += 1.0 / (rate * burst_factor if in_burst else rate)
+        return np.asarray(offsets)
+    raise ValueError(f"Unknown profile '{profile}'")
+
+
+class HttpTarget:
+    """Keep-alive HTTP/1.1 connections posting Event Grid batches to one URL"""
+
+    def __init__(self, url, connections):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.pool = asyncio.Queue()
+        for _ in range(connections):
+            self.pool.put_nowait(None)
+
+    async def send(self, event):
+        body = json.dumps([event]).encode('utf-8')
+        request = (f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                   f"Content-Type: application/json\r\naeg-event-type: Notification\r\n"
+                   f"Content-Length: {len(body)}\r\n\r\n").encode('ascii') + body
+        connection = await self.pool.get()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(self.host, self.port)
+            reader, writer = connection
+            writer.write(request)
+            await writer.drain()
+            status = await read_response(reader)
+        except Exception:
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            raise
+        finally:
+            self.pool.put_nowait(connection)
+        if status >= 300:
+            raise RuntimeError(f"HTTP {status}")
+
+    async def close(self):
+        while not self.pool.empty():
+            connection = self.pool.get_nowait()
+            if connection is not None:
+                connection[1].close()
+
+
+async def read_response(reader):
+    """Read one HTTP response (Content-Length or chunked body); returns the status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip() or b"0", 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+class InProcessTarget:
+    """Calls IoTHub_EventGrid.main on worker threads with dt_client swapped for a local twin client"""
+
+    def __init__(self, store, workers):
+        self.function = load_function("IoTHub_EventGrid")
+        self.function.dt_client = store
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    async def send(self, event):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.function.main, event)
+
+    async def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def percentiles_ms(seconds):
+    if not len(seconds):
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    values = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99, 100])
+    return dict(zip(('p50', 'p95', 'p99', 'max'), (round(float(v), 3) for v in values)))
+
+
+async def run_load(target, events, offsets, concurrency):
+    """
+    Send one event per offset. Returns a summary with throughput and two latency views:
+    service (send -> done) and end-to-end (scheduled -> done, includes queueing).
+    """
+    limit = asyncio.Semaphore(concurrency)
+    service, end_to_end = [], []
+    errors = 0
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def one(event, scheduled):
+        nonlocal errors
+        async with limit:
+            sent = loop.time()
+            try:
+                await target.send(event)
+            except Exception:
+                errors += 1
+                return
+            done = loop.time()
+            service.append(done - sent)
+            end_to_end.append(done - scheduled)
+
+    tasks = []
+    for offset in offsets:
+        scheduled = start + offset
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(next(events), scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    return {
+        'sent': len(offsets),
+        'completed': len(service),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'target_rate': round(len(offsets) / offsets[-1], 1) if len(offsets) > 1 and offsets[-1] > 0 else None,
+        'throughput_per_s': round(len(service) / elapsed, 1) if elapsed > 0 else 0.0,
+        'service_latency_ms': percentiles_ms(service),
+        'end_to_end_latency_ms': percentiles_ms(end_to_end)
+    }
+
+
+async def serve(host, port, store, workers):
+    """Event Grid webhook stand-in: POSTed events are run through IoTHub_EventGrid.main"""
+    target = InProcessTarget(store, workers)
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                body = await reader.readexactly(length) if length else b"[]"
+                try:
+                    events = json.loads(body)
+                    for event in events if isinstance(events, list) else [events]:
+                        await target.send(event)
+                    status = "200 OK"
+                except Exception as e:
+                    logging.error(f"Error processing request: {e}")
+                    status = "500 Internal Server Error"
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode('ascii'))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"🌐 Event Grid stand-in listening on http://{host}:{port}/ (POST events)")
+    async with server:
+        await server.serve_forever()
+
+
+def print_summary(summary):
+    print("\n" + "=" * 80)
+    print("LOAD TEST RESULTS")
+    print("=" * 80)
+    print(f"  Sent: {summary['sent']:,}   Completed: {summary['completed']:,}   Errors: {summary['errors']:,}")
+    print(f"  Target rate: {summary['target_rate']}/s   Achieved: {summary['throughput_per_s']}/s "
+          f"over {summary['elapsed_s']}s")
+    for label, key in (("Service", 'service_latency_ms'), ("End-to-end", 'end_to_end_latency_ms')):
+        p = summary[key]
+        print(f"  {label:<11} p50 {p['p50']} ms  p95 {p['p95']} ms  p99 {p['p99']} ms  max {p['max']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the IoT Hub ingestion function")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Generate load")
+    run_parser.add_argument("--devices", type=int, default=1000)
+    run_parser.add_argument("--rate", type=float, default=200.0, help="Events per second (base rate)")
+    run_parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    run_parser.add_argument("--profile", choices=['constant', 'ramp', 'burst'], default='constant')
+    run_parser.add_argument("--burst-factor", type=float, default=4.0)
+    run_parser.add_argument("--burst-seconds", type=float, default=2.0)
+    run_parser.add_argument("--burst-period", type=float, default=10.0)
+    run_parser.add_argument("--concurrency", type=int, default=32, help="Events in flight")
+    run_parser.add_argument("--target", default="inprocess", help="'inprocess' or an http:// webhook URL")
+    run_parser.add_argument("--store-latency-ms", type=float, default=0.0, help="ADT emulator latency per call")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", default=None, help="Write the summary as JSON")
+
+    serve_parser = sub.add_parser("serve", help="Run a local Event Grid webhook stand-in")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=7072)
+    serve_parser.add_argument("--workers", type=int, default=32)
+    serve_parser.add_argument("--store-latency-ms", type=float, default=0.0, help="ADT emulator latency per call")
+
+    for p in (run_parser, serve_parser):
+        p.add_argument("--adt-limits", action="store_true",
+                       help=f"Throttle like ADT ({DEFAULT_REQUESTS_PER_SECOND} requests/s, "
+                            f"{DEFAULT_PATCHES_PER_TWIN_PER_SECOND} patches/s per twin)")
+        p.add_argument("--throttle", choices=['error', 'delay'], default='error',
+                       help="Throttled calls fail with 429 or wait")
+        p.add_argument("--log-level", default="CRITICAL",
+                       help="Log level for the function under test (failures are counted either way)")
+    args = parser.parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()))
+
+    store = seed_default_twins(DigitalTwinsEmulator(latency=args.store_latency_ms / 1000.0, throttle=args.throttle))
+    if args.adt_limits:
+        store.set_limits(DEFAULT_REQUESTS_PER_SECOND, DEFAULT_PATCHES_PER_TWIN_PER_SECOND)
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, store, args.workers))
+        except KeyboardInterrupt:
+            print(f"\nStopped after {store.calls.get('update_digital_twin', 0):,} twin updates")
+        return
+
+    offsets = schedule(args.rate, args.duration, args.profile, args.burst_factor, args.burst_seconds,
+                       args.burst_period)
+    print(f"🌾 {len(offsets):,} events from {args.devices:,} devices, profile={args.profile}, "
+          f"target={args.target}")
+
+    async def run():
+        target = (InProcessTarget(store, args.concurrency) if args.target == "inprocess"
+                  else HttpTarget(args.target, args.concurrency))
+        try:
+            return await run_load(target, iter_events(args.devices, args.seed), offsets, args.concurrency)
+        finally:
+            await target.close()
+
+    summary = asyncio.run(run())
+    summary.update({'devices': args.devices, 'profile': args.profile, 'target': args.target,
+                    'twin_calls': dict(store.calls)})
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n✅ Summary saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmark
+Times every stage of the telemetry pipeline in-process, in the order data flows through it:
+fleet-simulator payloads -> Event Grid events -> IoTHub_EventGrid.main -> twin store (the
+local ADT emulator) -> GetTwinData / DigitalTwinsProxy reads -> AI_Inference, followed by
+microbenchmarks of the three forest predict_proba paths (single row and batch) on sklearn
+and, when compiled models and onnxruntime are available, on the ONNX backend (":onnx"
+stages). Each stage reports p50/p95/p99 latency, throughput and the process's peak RSS after
+the stage.
+
+Results are saved as JSON; `compare` flags stages whose latency grew or throughput fell by
+more than --threshold against a baseline (exit code 1 on regressions).
+
+Usage:
+  python azure-setup/pipeline_benchmark.py run --output bench/baseline.json
+  python azure-setup/pipeline_benchmark.py run --model-dir prediction/output/compact --baseline bench/baseline.json
+  python azure-setup/pipeline_benchmark.py compare bench/baseline.json bench/current.json --threshold 0.15
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from load_generator import REPO_DIR, load_function, make_event, percentiles_ms
+
+sys.path.insert(0, os.path.join(REPO_DIR, "prediction"))
+
+from adt_emulator import DigitalTwinsEmulator, seed_default_twins  # noqa: E402
+from fleet_simulator import FleetSimulator  # noqa: E402
+
+BATCH_ROWS = 1000
+
+# Proxy routes exercised by the read stage (route, JSON body)
+PROXY_ROUTES = {
+    'proxy_twin': ("digitaltwins/zone_A", None),
+    'proxy_query': ("query", {"query": "SELECT * FROM digitaltwins WHERE IS_OF_MODEL('dtmi:agriculture:Zone;1')"}),
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def measure(call, inputs, warmup=0, items_per_call=1):
+    """
+    Run call(x) for every input and time each call. Throughput is items per second, so
+    batch stages can report rows/s. Calls returning an HTTP response with status >= 400
+    are counted as errors.
+    """
+    for x in inputs[:warmup]:
+        call(x)
+    timings = []
+    errors = 0
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    for x in inputs:
+        t0 = time.perf_counter()
+        result = call(x)
+        timings.append(time.perf_counter() - t0)
+        if getattr(result, 'status_code', 200) >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    rss_after = peak_rss_mb()
+    return {
+        'calls': len(inputs),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(len(inputs) * items_per_call / elapsed, 1) if elapsed > 0 else None,
+        'latency_ms': percentiles_ms(timings),
+        'peak_rss_mb': rss_after,
+        'rss_growth_mb': round(rss_after - rss_before, 1) if rss_after is not None else None
+    }
+
+
+def http_request(method, url, body=None, route_params=None):
+    """azure.functions.HttpRequest as the Functions host would build it"""
+    import azure.functions as func
+    return func.HttpRequest(method=method, url=url, headers={'Content-Type': 'application/json'}, params={},
+                            route_params=route_params or {},
+                            body=json.dumps(body).encode('utf-8') if body is not None else b'')
+
+
+def pipeline_stages(n_devices, n_ticks, repeats, warmup, seed, store_latency, ai_model):
+    """Yield (stage name, result) for the simulator -> ingestion -> reads -> inference path"""
+    simulator = FleetSimulator(n_devices, seed=seed)
+    ticks = [None] * n_ticks
+    batches = []
+
+    def simulate(_):
+        batch = simulator.step()
+        events = [make_event(payload) for payload in simulator.payloads(batch)]
+        batches.append(events)
+
+    yield 'simulate', measure(simulate, ticks, items_per_call=n_devices)
+    events = [event for batch in batches for event in batch]
+
+    store = seed_default_twins(DigitalTwinsEmulator(latency=store_latency))
+
+    def stage(name, setup):
+        """Run setup() -> (call, inputs, warmup); missing Azure packages skip the stage"""
+        try:
+            call, inputs, stage_warmup = setup()
+        except ImportError as e:
+            return name, {'skipped': f"{e}"}
+        return name, measure(call, inputs, stage_warmup)
+
+    def ingest():
+        function = load_function("IoTHub_EventGrid")
+        function.dt_client = store
+        return function.main, events, 0
+
+    yield stage('ingest', ingest)
+
+    def twin_data():
+        function = load_function("GetTwinData")
+        function.dt_client = store
+        request = http_request('GET', '/api/getTwinData')
+        return function.main, [request] * repeats, warmup
+
+    yield stage('get_twin_data', twin_data)
+
+    for name, (route, body) in PROXY_ROUTES.items():
+        def proxy(route=route, body=body):
+            function = load_function("DigitalTwinsProxy")
+            function._dt_client = store
+            request = http_request('POST' if body else 'GET', f'/api/dt/{route}', body, {'route': route})
+            return function.main, [request] * repeats, warmup
+
+        yield stage(name, proxy)
+
+    loaded = {}
+
+    def inference():
+        if ai_model:
+            os.environ['AI_MODEL_PATH'] = os.path.abspath(ai_model)
+        function = loaded['AI_Inference'] = load_function("AI_Inference")
+        bodies = [events[i % len(events)]['data']['body'] for i in range(repeats)]
+        requests = [http_request('POST', '/api/predict', {key: body[key] for key in
+                                                          ('temperature', 'humidity', 'soilMoisture')})
+                    for body in bodies]
+        return function.main, requests, warmup
+
+    name, result = stage('ai_inference', inference)
+    if 'skipped' not in result:
+        result['method'] = 'model' if loaded['AI_Inference']._predictor else 'suitability'
+    yield name, result
+
+
+def forest_stages(model_dir, repeats, warmup, seed):
+    """Yield (stage name, result) for single-row and batch predict_proba of every forest on each backend"""
+    import joblib
+    from model_store import ModelStore
+    from synthetic_data import SyntheticDataGenerator
+
+    config = joblib.load(os.path.join(model_dir, "model_config.joblib"))
+    encoders = joblib.load(os.path.join(model_dir, "label_encoders.joblib"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+    X_raw, _ = SyntheticDataGenerator(config['feature_columns'], encoders, seed=seed).generate(BATCH_ROWS)
+    X = scaler.transform(X_raw)
+    rows = [X[i % len(X):i % len(X) + 1] for i in range(repeats)]
+
+    # sklearn keeps the unsuffixed stage names so older baselines stay comparable
+    for backend, suffix in (('sklearn', ''), ('onnx', ':onnx')):
+        store = ModelStore(model_dir, backend=backend)
+        for name in store.model_files:
+            try:
+                model = store.get(name)
+            except Exception as e:
+                yield f"forest:{name}{suffix}", {'skipped': str(e)}
+                continue
+            yield f"forest:{name}{suffix}:single", measure(model.predict_proba, rows, warmup)
+            yield f"forest:{name}{suffix}:batch{BATCH_ROWS}", measure(model.predict_proba, [X] * max(3, repeats // 20),
+                                                                      1, items_per_call=len(X))
+
+
+def compare(baseline, current, threshold):
+    """Rows (stage, metric, baseline, current, change, regressed) for stages present in both"""
+    rows = []
+    for stage, result in current['stages'].items():
+        base = baseline['stages'].get(stage)
+        if base is None or 'skipped' in base or 'skipped' in result:
+            continue
+        metrics = [(f"{p} ms", base['latency_ms'][p], result['latency_ms'][p], True) for p in ('p50', 'p95', 'p99')]
+        metrics.append(("throughput/s", base['throughput_per_s'], result['throughput_per_s'], False))
+        for metric, old, new, lower_is_better in metrics:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            regressed = change > threshold if lower_is_better else change < -threshold
+            rows.append((stage, metric, old, new, change, regressed))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n{'Stage':<40}{'Metric':<14}{'Baseline':>12}{'Current':>12}{'Change':>9}")
+    for stage, metric, old, new, change, regressed in rows:
+        flag = "  ✗ REGRESSION" if regressed else ""
+        print(f"{stage:<40}{metric:<14}{old:>12.3f}{new:>12.3f}{change:>+9.1%}{flag}")
+    regressions = sum(row[5] for row in rows)
+    if regressions:
+        print(f"\n✗ {regressions} metric(s) regressed by more than {threshold:.0%}")
+    else:
+        print(f"\n✅ No regressions beyond {threshold:.0%}")
+    return regressions
+
+
+def print_results(stages):
+    print(f"\n{'Stage':<40}{'Calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Throughput/s':>15}{'Peak RSS MB':>13}")
+    for name, result in stages.items():
+        if 'skipped' in result:
+            print(f"{name:<40}  ✗ skipped: {result['skipped']}")
+            continue
+        p = result['latency_ms']
+        print(f"{name:<40}{result['calls']:>7}{p['p50']:>10.3f}{p['p95']:>10.3f}{p['p99']:>10.3f}"
+              f"{result['throughput_per_s']:>15,.1f}{result['peak_rss_mb'] or 0:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the telemetry pipeline stage by stage")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmark")
+    run_parser.add_argument("--devices", type=int, default=500)
+    run_parser.add_argument("--ticks", type=int, default=10, help="Simulator ticks (events = devices * ticks)")
+    run_parser.add_argument("--repeats", type=int, default=500, help="Calls per read/inference stage")
+    run_parser.add_argument("--warmup", type=int, default=20, help="Untimed calls before each stage")
+    run_parser.add_argument("--store-latency-ms", type=float, default=0.0, help="ADT emulator latency per call")
+    run_parser.add_argument("--ai-model", default=None,
+                            help="Pickle for AI_Inference (default: AI_MODEL_PATH / simulation fallback)")
+    run_parser.add_argument("--model-dir", default=os.path.join(REPO_DIR, "prediction", "output"),
+                            help="Forest models for the predict_proba microbenchmarks")
+    run_parser.add_argument("--skip-forests", action="store_true")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", default=None, help="Write the results as JSON")
+    run_parser.add_argument("--baseline", default=None, help="Compare against a previous results file")
+    run_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+
+    compare_parser = sub.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        sys.exit(1 if print_comparison(compare(baseline, current, args.threshold), args.threshold) else 0)
+
+    # The functions log every call at INFO; keep logging out of the timings
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print("=" * 80)
+    print("PIPELINE BENCHMARK")
+    print("=" * 80)
+    stages = {}
+    runs = [pipeline_stages(args.devices, args.ticks, args.repeats, args.warmup, args.seed,
+                            args.store_latency_ms / 1000.0, args.ai_model)]
+    if not args.skip_forests:
+        runs.append(forest_stages(args.model_dir, args.repeats, args.warmup, args.seed))
+    for run in runs:
+        for name, result in run:
+            stages[name] = result
+            print(f"  {'✗' if 'skipped' in result else '✓'} {name}")
+    print_results(stages)
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('command', 'output', 'baseline')},
+        'stages': stages
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output + ".tmp", 'w') as f:
+            json.dump(results, f, indent=2)
+        os.replace(args.output + ".tmp", args.output)
+        print(f"\n✅ Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if print_comparison(compare(baseline, results, args.threshold), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
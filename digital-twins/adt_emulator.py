@@ -0,0 +1,682 @@
+"""
+Local in-memory Azure Digital Twins emulator
+Drop-in stand-in for azure.digitaltwins.core.DigitalTwinsClient in benchmarks and local
+runs: loads the DTDL models in digital-twins/models, validates twins, patches and
+relationships against them, and answers a subset of the ADT query language. Per-call
+latency and ADT-style throttling (instance-wide request rate, per-twin patch rate) can be
+injected to make benchmarks repeatable without network access.
+
+Supported queries:
+  SELECT * | COUNT() | TOP(n) ... | T.prop, ... | T, Z
+  FROM digitaltwins [T] [JOIN Z RELATED T.relationship ...]
+  WHERE comparisons (= != < > <= >=), IN [...], AND / OR / NOT, parentheses,
+        IS_OF_MODEL(['T',] 'dtmi'), IS_DEFINED(T.prop), STARTSWITH / ENDSWITH / CONTAINS(T.prop, 'x')
+
+Usage:
+  from adt_emulator import DigitalTwinsEmulator, seed_default_twins
+  client = seed_default_twins(DigitalTwinsEmulator())
+"""
+import copy
+import glob
+import json
+import operator
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+except ImportError:
+    class HttpResponseError(Exception):
+        def __init__(self, message=None, response=None, **kwargs):
+            super().__init__(message)
+            self.message = message
+            self.status_code = kwargs.get('status_code')
+
+    class ResourceNotFoundError(HttpResponseError):
+        pass
+
+    class ResourceExistsError(HttpResponseError):
+        pass
+
+DEFAULT_MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+# Published ADT limits used by default: API requests per instance, patches per twin
+DEFAULT_REQUESTS_PER_SECOND = 1000
+DEFAULT_PATCHES_PER_TWIN_PER_SECOND = 10
+
+SCHEMA_TYPES = {
+    'string': (str,),
+    'double': (int, float),
+    'float': (int, float),
+    'integer': (int,),
+    'long': (int,),
+    'boolean': (bool,),
+    'dateTime': (str,),
+    'date': (str,),
+    'time': (str,),
+    'duration': (str,),
+}
+
+
+def _error(cls, message, status_code):
+    err = cls(message=message)
+    err.status_code = status_code
+    return err
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _etag():
+    return f'W/"{uuid.uuid4()}"'
+
+
+class ModelData:
+    """Subset of DigitalTwinsModelData (what DigitalTwinsProxy reads via as_dict())"""
+
+    def __init__(self, definition):
+        self.id = definition['@id']
+        self.model = definition
+        self.display_name = {'en': definition.get('displayName', '')}
+        self.description = {'en': definition.get('description', '')}
+        self.upload_time = datetime.now(timezone.utc)
+        self.decommissioned = False
+        self.properties = {c['name']: c for c in definition.get('contents', []) if c['@type'] == 'Property'}
+        self.relationships = {c['name']: c for c in definition.get('contents', []) if c['@type'] == 'Relationship'}
+
+    def as_dict(self, include_model_definition=True):
+        data = {
+            'id': self.id,
+            'display_name': self.display_name,
+            'description': self.description,
+            'upload_time': self.upload_time,
+            'decommissioned': self.decommissioned
+        }
+        if include_model_definition:
+            data['model'] = self.model
+        return data
+
+
+class TokenBucket:
+    """rate tokens per second with a burst of one second's worth"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Consume a token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class DigitalTwinsEmulator:
+    """
+    In-memory twin graph with DigitalTwinsClient method names.
+
+    latency: seconds added to every call; jitter: extra uniform random seconds.
+    requests_per_second / patches_per_twin_per_second: None disables that limit.
+    throttle: 'error' raises HttpResponseError (429) like ADT, 'delay' waits instead.
+    strict_patch: 'replace' of a property the twin does not have fails (ADT behaviour);
+    off by default because IoTHub_EventGrid replaces telemetry properties on first write.
+    """
+
+    def __init__(self, models_dir=DEFAULT_MODELS_DIR, latency=0.0, jitter=0.0,
+                 requests_per_second=None, patches_per_twin_per_second=None, throttle='error',
+                 strict_patch=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.strict_patch = strict_patch
+        self.models = {}
+        self.twins = {}
+        self.relationships = {}   # source id -> {relationship id: relationship}
+        self.incoming = {}        # target id -> set of (source id, relationship id)
+        self.calls = {}
+        self._lock = threading.RLock()
+        self.set_limits(requests_per_second, patches_per_twin_per_second)
+        if models_dir:
+            definitions = []
+            for path in sorted(glob.glob(os.path.join(models_dir, "*.json"))):
+                with open(path) as f:
+                    definitions.append(json.load(f))
+            self.create_models(definitions)
+
+    def set_limits(self, requests_per_second=None, patches_per_twin_per_second=None):
+        """Change throttling (e.g. after seeding twins); None disables a limit"""
+        with self._lock:
+            self._request_bucket = TokenBucket(requests_per_second) if requests_per_second else None
+            self._patch_rate = patches_per_twin_per_second
+            self._patch_buckets = {}
+
+    # --- latency / throttling -------------------------------------------------
+
+    def _enter(self, operation, twin_id=None, patch=False):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        while True:
+            with self._lock:
+                buckets = [self._request_bucket] if self._request_bucket else []
+                if patch and self._patch_rate:
+                    buckets.append(self._patch_buckets.setdefault(twin_id, TokenBucket(self._patch_rate)))
+                wait = max([bucket.take() for bucket in buckets], default=0.0)
+            if not wait:
+                break
+            if self.throttle == 'error':
+                raise _error(HttpResponseError, f"Too many requests ({operation})", 429)
+            time.sleep(wait)
+        delay = self.latency + (self.jitter * random.random() if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    # --- models --------------------------------------------------------------
+
+    def create_models(self, dtdl_models, **kwargs):
+        self._enter('create_models')
+        created = []
+        with self._lock:
+            for definition in dtdl_models:
+                if definition['@id'] in self.models:
+                    raise _error(ResourceExistsError, f"Model {definition['@id']} already exists", 409)
+                self.models[definition['@id']] = ModelData(definition)
+                created.append(self.models[definition['@id']])
+        return created
+
+    def get_model(self, model_id, **kwargs):
+        self._enter('get_model')
+        model = self.models.get(model_id)
+        if model is None:
+            raise _error(ResourceNotFoundError, f"Model {model_id} not found", 404)
+        return model
+
+    def list_models(self, dependencies_for=None, include_model_definition=False, **kwargs):
+        self._enter('list_models')
+        models = list(self.models.values())
+        if dependencies_for:
+            models = [m for m in models if m.id in dependencies_for]
+        return iter(models)
+
+    # --- twins ---------------------------------------------------------------
+
+    def _model_for(self, twin):
+        model_id = twin.get('$metadata', {}).get('$model')
+        model = self.models.get(model_id)
+        if model is None:
+            raise _error(HttpResponseError, f"Model {model_id} is not uploaded", 400)
+        return model
+
+    def _validate_property(self, model, name, value):
+        prop = model.properties.get(name)
+        if prop is None:
+            raise _error(HttpResponseError, f"Property '{name}' is not defined in {model.id}", 400)
+        types = SCHEMA_TYPES.get(prop['schema']) if isinstance(prop['schema'], str) else None
+        if types and value is not None and (not isinstance(value, types) or
+                                            (isinstance(value, bool) and bool not in types)):
+            raise _error(HttpResponseError, f"Property '{name}' expects {prop['schema']}, got {value!r}", 400)
+
+    def upsert_digital_twin(self, digital_twin_id, digital_twin, **kwargs):
+        self._enter('upsert_digital_twin', digital_twin_id)
+        with self._lock:
+            model = self._model_for(digital_twin)
+            properties = {k: v for k, v in digital_twin.items() if not k.startswith('$')}
+            for name, value in properties.items():
+                self._validate_property(model, name, value)
+            now = _now()
+            twin = {'$dtId': digital_twin_id, '$etag': _etag(),
+                    '$metadata': {'$model': model.id, '$lastUpdateTime': now}}
+            for name, value in properties.items():
+                twin[name] = copy.deepcopy(value)
+                twin['$metadata'][name] = {'lastUpdateTime': now}
+            self.twins[digital_twin_id] = twin
+            return copy.deepcopy(twin)
+
+    def get_digital_twin(self, digital_twin_id, **kwargs):
+        self._enter('get_digital_twin', digital_twin_id)
+        with self._lock:
+            twin = self.twins.get(digital_twin_id)
+            if twin is None:
+                raise _error(ResourceNotFoundError, f"Twin {digital_twin_id} not found", 404)
+            return copy.deepcopy(twin)
+
+    def update_digital_twin(self, digital_twin_id, json_patch, **kwargs):
+        """Apply a JSON Patch (add / replace / remove on top-level or nested properties)"""
+        self._enter('update_digital_twin', digital_twin_id, patch=True)
+        with self._lock:
+            twin = self.twins.get(digital_twin_id)
+            if twin is None:
+                raise _error(ResourceNotFoundError, f"Twin {digital_twin_id} not found", 404)
+            model = self._model_for(twin)
+            updated = copy.deepcopy(twin)
+            now = _now()
+            for op in json_patch:
+                keys = [k.replace('~1', '/').replace('~0', '~') for k in op['path'].lstrip('/').split('/')]
+                if not keys or keys[0].startswith('$'):
+                    raise _error(HttpResponseError, f"Invalid patch path {op['path']}", 400)
+                if len(keys) == 1 and op['op'] != 'remove':
+                    self._validate_property(model, keys[0], op['value'])
+                elif keys[0] not in model.properties:
+                    raise _error(HttpResponseError, f"Property '{keys[0]}' is not defined in {model.id}", 400)
+                parent = updated
+                for key in keys[:-1]:
+                    parent = parent.setdefault(key, {})
+                last = keys[-1]
+                if op['op'] == 'remove' or (op['op'] == 'replace' and self.strict_patch):
+                    if last not in parent:
+                        raise _error(HttpResponseError, f"Path {op['path']} does not exist", 400)
+                if op['op'] == 'remove':
+                    del parent[last]
+                    updated['$metadata'].pop(keys[0], None)
+                elif op['op'] in ('add', 'replace'):
+                    parent[last] = copy.deepcopy(op['value'])
+                    updated['$metadata'][keys[0]] = {'lastUpdateTime': now}
+                else:
+                    raise _error(HttpResponseError, f"Unsupported patch op {op['op']}", 400)
+            updated['$etag'] = _etag()
+            updated['$metadata']['$lastUpdateTime'] = now
+            self.twins[digital_twin_id] = updated
+
+    def delete_digital_twin(self, digital_twin_id, **kwargs):
+        self._enter('delete_digital_twin', digital_twin_id)
+        with self._lock:
+            if digital_twin_id not in self.twins:
+                raise _error(ResourceNotFoundError, f"Twin {digital_twin_id} not found", 404)
+            if self.relationships.get(digital_twin_id) or self.incoming.get(digital_twin_id):
+                raise _error(HttpResponseError, f"Twin {digital_twin_id} still has relationships", 400)
+            del self.twins[digital_twin_id]
+
+    # --- relationships -------------------------------------------------------
+
+    def upsert_relationship(self, digital_twin_id, relationship_id, relationship, **kwargs):
+        self._enter('upsert_relationship', digital_twin_id)
+        with self._lock:
+            source = self.twins.get(digital_twin_id)
+            target_id = relationship.get('$targetId')
+            target = self.twins.get(target_id)
+            if source is None or target is None:
+                raise _error(ResourceNotFoundError, f"Twin {digital_twin_id if source is None else target_id} not found", 404)
+            name = relationship.get('$relationshipName')
+            definition = self._model_for(source).relationships.get(name)
+            if definition is None:
+                raise _error(HttpResponseError, f"Relationship '{name}' is not defined for {digital_twin_id}", 400)
+            if definition.get('target') and definition['target'] != target['$metadata']['$model']:
+                raise _error(HttpResponseError, f"Relationship '{name}' cannot target {target_id}", 400)
+            stored = dict(relationship, **{'$relationshipId': relationship_id, '$sourceId': digital_twin_id,
+                                           '$etag': _etag()})
+            self.relationships.setdefault(digital_twin_id, {})[relationship_id] = stored
+            self.incoming.setdefault(target_id, set()).add((digital_twin_id, relationship_id))
+            return copy.deepcopy(stored)
+
+    def get_relationship(self, digital_twin_id, relationship_id, **kwargs):
+        self._enter('get_relationship', digital_twin_id)
+        with self._lock:
+            relationship = self.relationships.get(digital_twin_id, {}).get(relationship_id)
+            if relationship is None:
+                raise _error(ResourceNotFoundError, f"Relationship {relationship_id} not found", 404)
+            return copy.deepcopy(relationship)
+
+    def delete_relationship(self, digital_twin_id, relationship_id, **kwargs):
+        self._enter('delete_relationship', digital_twin_id)
+        with self._lock:
+            relationship = self.relationships.get(digital_twin_id, {}).pop(relationship_id, None)
+            if relationship is None:
+                raise _error(ResourceNotFoundError, f"Relationship {relationship_id} not found", 404)
+            self.incoming.get(relationship['$targetId'], set()).discard((digital_twin_id, relationship_id))
+
+    def list_relationships(self, digital_twin_id, relationship_id=None, **kwargs):
+        """Outgoing relationships; relationship_id filters by relationship name (as in the SDK)"""
+        self._enter('list_relationships', digital_twin_id)
+        with self._lock:
+            values = [copy.deepcopy(r) for r in self.relationships.get(digital_twin_id, {}).values()
+                      if relationship_id is None or r['$relationshipName'] == relationship_id]
+        return iter(values)
+
+    def list_incoming_relationships(self, digital_twin_id, **kwargs):
+        self._enter('list_incoming_relationships', digital_twin_id)
+        with self._lock:
+            values = []
+            for source_id, rel_id in sorted(self.incoming.get(digital_twin_id, ())):
+                rel = self.relationships[source_id][rel_id]
+                values.append({'$relationshipId': rel_id, '$sourceId': source_id,
+                               '$relationshipName': rel['$relationshipName'],
+                               '$relationshipLink': f"/digitaltwins/{source_id}/relationships/{rel_id}"})
+        return iter(values)
+
+    # --- queries -------------------------------------------------------------
+
+    def query_twins(self, query_expression, **kwargs):
+        self._enter('query_twins')
+        query = parse_query(query_expression)
+        with self._lock:
+            rows = run_query(query, self)
+        return iter(rows)
+
+
+# --- query language ----------------------------------------------------------
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<string>'(?:[^']|'')*'|"(?:[^"])*")
+    | (?P<number>-?\d+(?:\.\d+)?)
+    | (?P<op><=|>=|!=|<>|=|<|>)
+    | (?P<punct>[(),\[\]*])
+    | (?P<name>[A-Za-z_$][A-Za-z0-9_$]*(?:\.[A-Za-z_$][A-Za-z0-9_$]*)*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {'SELECT', 'FROM', 'WHERE', 'JOIN', 'RELATED', 'AND', 'OR', 'NOT', 'IN', 'TOP', 'COUNT',
+            'AS', 'TRUE', 'FALSE', 'NULL', 'DIGITALTWINS'}
+
+
+def tokenize(text):
+    tokens, pos = [], 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise _error(HttpResponseError, f"Invalid query near: {text[pos:pos + 20]!r}", 400)
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1].replace("''", "'")
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'name' and value.upper() in KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (value is not None and token[1] != value):
+            raise _error(HttpResponseError, f"Query syntax error: expected {value or kind}, got {token[1]!r}", 400)
+        self.pos += 1
+        return token[1]
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        self.take('keyword', 'SELECT')
+        query = {'top': None, 'count': False, 'select': [], 'joins': [], 'where': None}
+        if self.accept('keyword', 'TOP'):
+            self.take('punct', '(')
+            query['top'] = self.take('number')
+            self.take('punct', ')')
+        if self.accept('keyword', 'COUNT'):
+            self.take('punct', '(')
+            self.take('punct', ')')
+            query['count'] = True
+        elif self.accept('punct', '*'):
+            query['select'] = ['*']
+        else:
+            query['select'].append(self.take('name'))
+            while self.accept('punct', ','):
+                query['select'].append(self.take('name'))
+        self.take('keyword', 'FROM')
+        self.take('keyword', 'DIGITALTWINS')
+        query['alias'] = self.take('name') if self.peek()[0] == 'name' else None
+        while self.accept('keyword', 'JOIN'):
+            alias = self.take('name')
+            self.take('keyword', 'RELATED')
+            source, _, relationship = self.take('name').partition('.')
+            query['joins'].append((alias, source, relationship))
+        if self.accept('keyword', 'WHERE'):
+            query['where'] = self.parse_or()
+        if self.peek()[0] is not None:
+            raise _error(HttpResponseError, f"Unexpected token {self.peek()[1]!r} in query", 400)
+        return query
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.accept('keyword', 'OR'):
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.accept('keyword', 'AND'):
+            node = ('and', node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.accept('keyword', 'NOT'):
+            return ('not', self.parse_not())
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        if self.accept('punct', '('):
+            node = self.parse_or()
+            self.take('punct', ')')
+            return node
+        kind, value = self.peek()
+        if kind == 'name' and self.peek(1) == ('punct', '('):
+            self.pos += 1
+            self.take('punct', '(')
+            args = [self.parse_operand()]
+            while self.accept('punct', ','):
+                args.append(self.parse_operand())
+            self.take('punct', ')')
+            return ('call', value.upper(), args)
+        left = self.parse_operand()
+        if self.accept('keyword', 'IN'):
+            self.take('punct', '[')
+            values = [self.parse_operand()]
+            while self.accept('punct', ','):
+                values.append(self.parse_operand())
+            self.take('punct', ']')
+            return ('in', left, values)
+        op = self.take('op')
+        return ('cmp', '!=' if op == '<>' else op, left, self.parse_operand())
+
+    def parse_operand(self):
+        kind, value = self.peek()
+        self.pos += 1
+        if kind in ('string', 'number'):
+            return ('literal', value)
+        if kind == 'keyword' and value in ('TRUE', 'FALSE', 'NULL'):
+            return ('literal', {'TRUE': True, 'FALSE': False, 'NULL': None}[value])
+        if kind == 'name':
+            return ('ref', value)
+        raise _error(HttpResponseError, f"Query syntax error near {value!r}", 400)
+
+
+def parse_query(text):
+    """Parse a query into a small dict AST (raises HttpResponseError 400 on syntax errors)"""
+    return _Parser(text).parse()
+
+
+_MISSING = object()
+
+COMPARISONS = {'=': operator.eq, '!=': operator.ne, '<': operator.lt, '>': operator.gt,
+               '<=': operator.le, '>=': operator.ge}
+
+
+def _resolve(ref, binding, default_alias):
+    parts = ref.split('.')
+    if parts[0] in binding:
+        twin, path = binding[parts[0]], parts[1:]
+    else:
+        twin, path = binding[default_alias], parts
+    value = twin
+    for part in path:
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _evaluate(node, binding, default_alias):
+    kind = node[0]
+    if kind == 'literal':
+        return node[1]
+    if kind == 'ref':
+        return _resolve(node[1], binding, default_alias)
+    if kind == 'and':
+        return _evaluate(node[1], binding, default_alias) is True and _evaluate(node[2], binding, default_alias) is True
+    if kind == 'or':
+        return _evaluate(node[1], binding, default_alias) is True or _evaluate(node[2], binding, default_alias) is True
+    if kind == 'not':
+        return not _evaluate(node[1], binding, default_alias)
+    if kind == 'in':
+        value = _evaluate(node[1], binding, default_alias)
+        return value is not _MISSING and value in [_evaluate(v, binding, default_alias) for v in node[2]]
+    if kind == 'cmp':
+        left = _evaluate(node[2], binding, default_alias)
+        right = _evaluate(node[3], binding, default_alias)
+        if left is _MISSING or right is _MISSING:
+            return False
+        try:
+            return COMPARISONS[node[1]](left, right)
+        except TypeError:
+            return False
+    if kind == 'call':
+        name, args = node[1], node[2]
+        if name == 'IS_OF_MODEL':
+            twin = binding[args[0][1]] if len(args) > 1 else binding[default_alias]
+            return twin['$metadata']['$model'] == _evaluate(args[-1], binding, default_alias)
+        if name == 'IS_DEFINED':
+            return _evaluate(args[0], binding, default_alias) is not _MISSING
+        if name in ('STARTSWITH', 'ENDSWITH', 'CONTAINS'):
+            value = _evaluate(args[0], binding, default_alias)
+            needle = _evaluate(args[1], binding, default_alias)
+            if not isinstance(value, str) or not isinstance(needle, str):
+                return False
+            return {'STARTSWITH': value.startswith, 'ENDSWITH': value.endswith,
+                    'CONTAINS': value.__contains__}[name](needle)
+        raise _error(HttpResponseError, f"Unsupported query function {name}", 400)
+    raise _error(HttpResponseError, f"Unsupported query expression {kind}", 400)
+
+
+def run_query(query, emulator):
+    """Evaluate a parsed query against the emulator's twins (caller holds the lock)"""
+    alias = query['alias'] or '__twin__'
+    bindings = [{alias: twin} for twin in emulator.twins.values()]
+    for join_alias, source_alias, relationship in query['joins']:
+        joined = []
+        for binding in bindings:
+            source = binding[source_alias]
+            for rel in emulator.relationships.get(source['$dtId'], {}).values():
+                if rel['$relationshipName'] == relationship and rel['$targetId'] in emulator.twins:
+                    joined.append(dict(binding, **{join_alias: emulator.twins[rel['$targetId']]}))
+        bindings = joined
+    if query['where'] is not None:
+        bindings = [b for b in bindings if _evaluate(query['where'], b, alias) is True]
+
+    if query['count']:
+        return [{'COUNT': len(bindings)}]
+    if query['top'] is not None:
+        bindings = bindings[:query['top']]
+
+    rows = []
+    for binding in bindings:
+        if query['select'] == ['*']:
+            if query['joins']:
+                raise _error(HttpResponseError, "SELECT * is not supported with JOIN; select the aliases", 400)
+            rows.append(copy.deepcopy(binding[alias]))
+            continue
+        row = {}
+        for item in query['select']:
+            if item in binding:
+                row[item] = copy.deepcopy(binding[item])
+            else:
+                value = _resolve(item, binding, alias)
+                if value is not _MISSING:
+                    row[item.split('.')[-1]] = copy.deepcopy(value)
+        rows.append(row)
+    return rows
+
+
+# --- default twin graph -----------------------------------------------------
+
+DEFAULT_TWINS = {
+    'farm_001': ('dtmi:agriculture:Farm;1', {
+        'name': 'Research Farm', 'location': 'Dhaka, Bangladesh', 'totalArea': 10.5,
+        'owner': 'Agricultural Research Institute'}),
+    'rice': ('dtmi:agriculture:Crop;1', {
+        'name': 'Rice', 'scientificName': 'Oryza sativa',
+        'optimalTemperatureMin': 20.0, 'optimalTemperatureMax': 35.0,
+        'optimalHumidityMin': 60.0, 'optimalHumidityMax': 80.0,
+        'optimalSoilMoistureMin': 70.0, 'optimalSoilMoistureMax': 90.0,
+        'growthDuration': 120, 'season': 'Monsoon'}),
+    'wheat': ('dtmi:agriculture:Crop;1', {
+        'name': 'Wheat', 'scientificName': 'Triticum aestivum',
+        'optimalTemperatureMin': 12.0, 'optimalTemperatureMax': 25.0,
+        'optimalHumidityMin': 40.0, 'optimalHumidityMax': 70.0,
+        'optimalSoilMoistureMin': 50.0, 'optimalSoilMoistureMax': 75.0,
+        'growthDuration': 150, 'season': 'Winter'}),
+    'maize': ('dtmi:agriculture:Crop;1', {
+        'name': 'Maize', 'scientificName': 'Zea mays',
+        'optimalTemperatureMin': 18.0, 'optimalTemperatureMax': 32.0,
+        'optimalHumidityMin': 50.0, 'optimalHumidityMax': 75.0,
+        'optimalSoilMoistureMin': 55.0, 'optimalSoilMoistureMax': 80.0,
+        'growthDuration': 100, 'season': 'Summer'}),
+    'zone_A': ('dtmi:agriculture:Zone;1', {
+        'name': 'Zone A', 'area': 2.5, 'soilType': 'Clay Loam', 'currentCrop': 'rice',
+        'recommendedCrop': 'rice', 'recommendationConfidence': 0.96}),
+    'pc_sim_01': ('dtmi:agriculture:Device;1', {
+        'deviceId': 'pc_sim_01', 'deviceType': 'Environment Sensor', 'firmwareVersion': '1.0.0',
+        'status': 'active'}),
+}
+
+DEFAULT_RELATIONSHIPS = [
+    ('farm_001', 'farm_001_has_zone_A', 'hasZone', 'zone_A'),
+    ('zone_A', 'zone_A_has_device_pc_sim_01', 'hasDevice', 'pc_sim_01'),
+    ('zone_A', 'zone_A_grows_rice', 'growsCrop', 'rice'),
+]
+
+
+def seed_default_twins(client):
+    """Create the twins and relationships of azure-setup/deploy-digital-twins.sh"""
+    for twin_id, (model_id, properties) in DEFAULT_TWINS.items():
+        client.upsert_digital_twin(twin_id, dict(properties, **{'$metadata': {'$model': model_id}}))
+    for source, rel_id, name, target in DEFAULT_RELATIONSHIPS:
+        client.upsert_relationship(source, rel_id, {'$relationshipName': name, '$targetId': target})
+    return client
+
+
+def seed_fleet(client, n_zones, devices_per_zone=10, zones_per_farm=5, device_prefix="sim"):
+    """
+    Farms, zones and devices named like simulation/fleet_simulator.py
+    (farm_001.., zone_0000.., sim_00000..) with hasZone/hasDevice relationships.
+    """
+    for zone in range(n_zones):
+        farm_id = f"farm_{zone // zones_per_farm + 1:03d}"
+        zone_id = f"zone_{zone:04d}"
+        if zone % zones_per_farm == 0:
+            client.upsert_digital_twin(farm_id, {'name': farm_id, '$metadata': {'$model': 'dtmi:agriculture:Farm;1'}})
+        client.upsert_digital_twin(zone_id, {'name': zone_id, '$metadata': {'$model': 'dtmi:agriculture:Zone;1'}})
+        client.upsert_relationship(farm_id, f"{farm_id}_has_{zone_id}",
+                                   {'$relationshipName': 'hasZone', '$targetId': zone_id})
+        for index in range(zone * devices_per_zone, (zone + 1) * devices_per_zone):
+            device_id = f"{device_prefix}_{index:05d}"
+            client.upsert_digital_twin(device_id, {'deviceId': device_id, 'deviceType': 'simulator',
+                                                   '$metadata': {'$model': 'dtmi:agriculture:Device;1'}})
+            client.upsert_relationship(zone_id, f"{zone_id}_has_device_{device_id}",
+                                       {'$relationshipName': 'hasDevice', '$targetId': device_id})
+    return client
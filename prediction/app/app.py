@@ -1,17 +1,21 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import requests
-import joblib
 import os
+import sys
 import time
-import plotly.express as px
-import plotly.graph_objects as go
+import threading
 from datetime import datetime
-from sklearn.base import BaseEstimator, ClassifierMixin
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.cluster import KMeans
-from sklearn.utils.validation import check_X_y, check_array, check_is_fitted
+
+# Shared prediction modules live in prediction/, one level above this app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from startup_timing import STARTUP
+
+# Only what the first paint needs is imported here; pandas, plotly, requests and
+# sklearn are imported after the header is on screen (see load_ui_modules/ModelStore)
+st = STARTUP.import_module('streamlit')
+np = STARTUP.import_module('numpy')
+from feature_pipeline import FeaturePipeline, derive_features
+from ranking import top_k_indices
+from model_store import MODEL_FILES, ModelStore, load_artifact
+from crop_images import CropImageCache
 
 # Page configuration
 st.set_page_config(
@@ -205,7 +209,7 @@ st.markdown("""
 def get_crop_image_url(crop_name):
     """
     Generate image URL for crop using Bing's thumbnail service.
-    This ensures a valid image is always returned based on the crop name.
+    Used as the remote source for CropImageCache; the dashboard serves cached bytes.
     """
     # Mapping for better search terms to ensure accurate images
     search_term_map = {
@@ -285,127 +289,50 @@ def get_crop_image_url(crop_name):
     # Use Bing Thumbnail API (reliable, no key required for low volume)
     return f"https://tse2.mm.bing.net/th?q={query_encoded}&w=200&h=150&c=7&rs=1&p=0"
 
-# ==========================================
-# Custom Model Definitions
-# ==========================================
-
-class CascadeRandomForest(ClassifierMixin, BaseEstimator):
-    def __init__(self, n_layers=3, n_estimators_per_layer=50, max_depth=15, min_samples_split=5, random_state=42):
-        self.n_layers = n_layers
-        self.n_estimators_per_layer = n_estimators_per_layer
-        self.max_depth = max_depth
-        self.min_samples_split = min_samples_split
-        self.random_state = random_state
-        self.layers = []
-        self.feature_importances_ = None
-        self.classes_ = None
-        self.n_classes_ = None
-    
-    def fit(self, X, y): pass
-    
-    def predict_proba(self, X):
-        check_is_fitted(self)
-        X = check_array(X)
-        proba = np.zeros((X.shape[0], self.n_classes_))
-        total_weight = sum([2.0 ** (len(self.layers) - i - 1) for i in range(len(self.layers))])
-        for i, layer in enumerate(self.layers):
-            layer_weight = (2.0 ** (len(self.layers) - i - 1)) / total_weight
-            layer_proba = layer.predict_proba(X)
-            layer_proba_aligned = np.zeros_like(proba)
-            for cls_idx, cls in enumerate(self.classes_):
-                if cls in layer.classes_:
-                    class_idx_in_layer = np.where(layer.classes_ == cls)[0][0]
-                    layer_proba_aligned[:, cls_idx] = layer_proba[:, class_idx_in_layer]
-            proba += layer_weight * layer_proba_aligned
-        proba_sum = proba.sum(axis=1, keepdims=True)
-        proba_sum[proba_sum == 0] = 1
-        return proba / proba_sum
-    
-    def predict(self, X):
-        proba = self.predict_proba(X)
-        return self.classes_[np.argmax(proba, axis=1)]
-
-class HierarchicalRandomForest(ClassifierMixin, BaseEstimator):
-    def __init__(self, n_clusters=3, n_estimators_global=50, n_estimators_local=30, max_depth=12, random_state=42):
-        self.n_clusters = n_clusters
-        self.n_estimators_global = n_estimators_global
-        self.n_estimators_local = n_estimators_local
-        self.max_depth = max_depth
-        self.random_state = random_state
-        self.global_rf = None
-        self.cluster_models = {}
-        self.kmeans = None
-        self.feature_importances_ = None
-        self.classes_ = None
-        self.n_classes_ = None
-        
-    def fit(self, X, y): pass
-    
-    def predict_proba(self, X):
-        check_is_fitted(self)
-        X = check_array(X)
-        clusters = self.kmeans.predict(X)
-        proba = np.zeros((X.shape[0], self.n_classes_))
-        global_proba = self.global_rf.predict_proba(X)
-        global_proba_aligned = np.zeros_like(proba)
-        for cls_idx, cls in enumerate(self.classes_):
-            if cls in self.global_rf.classes_:
-                class_idx_in_global = np.where(self.global_rf.classes_ == cls)[0][0]
-                global_proba_aligned[:, cls_idx] = global_proba[:, class_idx_in_global]
-        proba = 0.25 * global_proba_aligned
-        for cluster_id, cluster_model in self.cluster_models.items():
-            cluster_mask = (clusters == cluster_id)
-            if cluster_mask.sum() == 0: continue
-            X_cluster = X[cluster_mask]
-            cluster_proba = cluster_model.predict_proba(X_cluster)
-            cluster_proba_aligned = np.zeros((len(X_cluster), self.n_classes_))
-            for cls_idx, cls in enumerate(self.classes_):
-                if cls in cluster_model.classes_:
-                    class_idx_in_cluster = np.where(cluster_model.classes_ == cls)[0][0]
-                    cluster_proba_aligned[:, cls_idx] = cluster_proba[:, class_idx_in_cluster]
-            proba[cluster_mask] += 0.75 * cluster_proba_aligned
-        proba_sum = proba.sum(axis=1, keepdims=True)
-        proba_sum[proba_sum == 0] = 1
-        return proba / proba_sum
-    
-    def predict(self, X):
-        proba = self.predict_proba(X)
-        return self.classes_[np.argmax(proba, axis=1)]
-
 # ==========================================
 # Helper Functions
 # ==========================================
 
 @st.cache_resource
 def load_models():
-    """Load trained models and configurations"""
+    """Load configurations and create the lazy model store (forests load on first use)"""
     try:
-        # Register custom classes in the main module to fix unpickling
-        import sys
-        current_module = sys.modules[__name__]
-        if not hasattr(current_module, 'CascadeRandomForest'):
-            current_module.CascadeRandomForest = CascadeRandomForest
-        if not hasattr(current_module, 'HierarchicalRandomForest'):
-            current_module.HierarchicalRandomForest = HierarchicalRandomForest
-        
         current_dir = os.path.dirname(os.path.abspath(__file__))
         model_dir = os.path.join(current_dir, "../output")
         
-        models = {
-            "Standard RF": joblib.load(os.path.join(model_dir, "standard_random_forest_model.joblib")),
-            "Cascade RF": joblib.load(os.path.join(model_dir, "cascade_random_forest_model.joblib")),
-            "Hierarchical RF": joblib.load(os.path.join(model_dir, "hierarchical_random_forest_model.joblib"))
-        }
-        config = joblib.load(os.path.join(model_dir, "model_config.joblib"))
-        encoders = joblib.load(os.path.join(model_dir, "label_encoders.joblib"))
-        scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+        config = load_artifact(os.path.join(model_dir, "model_config.joblib"))
+        store = ModelStore(model_dir, n_features=len(config['feature_columns']))
+        encoders = load_artifact(os.path.join(model_dir, "label_encoders.joblib"))
+        scaler = load_artifact(os.path.join(model_dir, "scaler.joblib"))
+        pipeline = FeaturePipeline(config['feature_columns'], encoders, scaler)
+        
+        # Decode crop labels once instead of per UI section
+        crop_names = np.asarray(encoders['Crop Name'].classes_) if 'Crop Name' in encoders else None
         
-        return models, config, encoders, scaler, None
+        # Thumbnails: bundled assets or one remote fetch per crop, then disk/memory
+        crop_images = CropImageCache(
+            cache_dir=os.path.join(current_dir, ".image_cache"),
+            bundled_dir=os.path.join(current_dir, "assets", "crops"),
+            fixture_dir=os.path.join(current_dir, "assets", "crops", "fixtures"),
+            url_for=get_crop_image_url
+        )
+        if crop_names is not None:
+            threading.Thread(target=crop_images.warm, args=(list(crop_names),), daemon=True).start()
+        
+        return store, config, encoders, scaler, pipeline, (crop_names, crop_images), None
     except Exception as e:
-        return None, None, None, None, str(e)
+        return None, None, None, None, None, None, str(e)
+
+def load_ui_modules():
+    """Deferred heavy imports for tables and charts (first call is timed)"""
+    pd = STARTUP.import_module('pandas')
+    px = STARTUP.import_module('plotly.express')
+    go = STARTUP.import_module('plotly.graph_objects')
+    return pd, px, go
 
 def fetch_simulation_data(api_url):
     """Fetch data from simulation API"""
+    requests = STARTUP.import_module('requests')
     try:
         response = requests.get(api_url, timeout=5)
         if response.status_code == 200:
@@ -419,8 +346,19 @@ def fetch_simulation_data(api_url):
     except Exception as e:
         return None, f"Error: {str(e)}"
 
-def prepare_features(telemetry_data, user_inputs, feature_columns):
-    """Prepare feature vector from telemetry and user inputs"""
+def fetch_telemetry_history(history_url, device_id, hours):
+    """Fetch a device's recent readings from the GetTelemetryHistory function"""
+    requests = STARTUP.import_module('requests')
+    try:
+        response = requests.get(f"{history_url.rstrip('/')}/{device_id}", params={'hours': hours}, timeout=5)
+        if response.status_code == 200:
+            return response.json(), None
+        return None, f"History API returned status code {response.status_code}"
+    except Exception as e:
+        return None, f"Error: {str(e)}"
+
+def prepare_features(telemetry_data, user_inputs):
+    """Merge telemetry and user inputs into a feature dict (derived features included)"""
     feature_dict = {}
     
     if 'telemetry' in telemetry_data:
@@ -430,40 +368,14 @@ def prepare_features(telemetry_data, user_inputs, feature_columns):
     
     feature_dict.update(user_inputs)
     
-    if 'Max Temp' in feature_dict and 'Min Temp' in feature_dict:
-        feature_dict['Temp_Range'] = feature_dict['Max Temp'] - feature_dict['Min Temp']
-    
-    if 'Max Relative Humidity' in feature_dict and 'Min Relative Humidity' in feature_dict:
-        feature_dict['Humidity_Range'] = feature_dict['Max Relative Humidity'] - feature_dict['Min Relative Humidity']
-    
-    if 'Avg Temp' in feature_dict and 'Avg Humidity' in feature_dict:
-        feature_dict['Temp_Humidity_Index'] = feature_dict['Avg Temp'] * feature_dict['Avg Humidity'] / 100
-    
-    df = pd.DataFrame([feature_dict])
-    
-    for col in feature_columns:
-        if col not in df.columns:
-            df[col] = 0
-    
-    return df[feature_columns]
+    return derive_features(feature_dict)
 
-def encode_and_scale(df, encoders, scaler, feature_columns):
-    """Encode categorical variables and scale features"""
-    df_processed = df.copy()
-    
-    for col, encoder in encoders.items():
-        if col in df_processed.columns:
-            try:
-                df_processed[col] = encoder.transform(df_processed[col].astype(str))
-            except:
-                df_processed[col] = 0
-    
-    df_scaled = pd.DataFrame(
-        scaler.transform(df_processed),
-        columns=feature_columns
-    )
-    
-    return df_scaled
+def encode_and_scale(features, pipeline):
+    """
+    Encode categorical variables and scale features into this thread's preallocated float32
+    (1, n_features) row; it is overwritten by the next call from the same thread
+    """
+    return pipeline.transform_row32(features)
 
 # ==========================================
 # Main Application
@@ -473,15 +385,18 @@ def main():
     # Header
     st.markdown('<div class="main-header">🌾 Advanced Crop Yield Prediction System</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Multi-Model AI-Powered Agricultural Decision Support Platform</div>', unsafe_allow_html=True)
+    STARTUP.mark("first paint (header)")
     
-    # Load models
-    models, config, encoders, scaler, error = load_models()
+    # Load configuration (forests are loaded lazily below)
+    store, config, encoders, scaler, pipeline, labels, error = load_models()
     
     if error:
         st.error(f"❌ **System Error:** Unable to load prediction models\n\n`{error}`")
         st.info("📋 **Action Required:** Ensure model files are present in `prediction/output/` directory")
         return
     
+    crop_names, crop_images = labels
+    
     # Sidebar Configuration
     with st.sidebar:
         st.header("⚙️ System Configuration")
@@ -497,21 +412,52 @@ def main():
         auto_refresh = st.checkbox("Enable Auto-Refresh", value=True)
         refresh_interval = st.slider("Refresh Interval (seconds)", 1, 60, 5)
         
+        st.markdown("### 📈 Trend Charts")
+        history_url = st.text_input(
+            "History API",
+            value="",
+            help="GetTelemetryHistory endpoint, e.g. https://<function-app>.azurewebsites.net/api/history (empty: no trends)"
+        )
+        history_hours = st.slider("Trend Window (hours)", 1, 72, 24)
+        
         st.markdown("---")
         st.markdown("### 📊 Model Information")
+        primary_model = st.selectbox(
+            "Primary Model",
+            list(MODEL_FILES.keys()),
+            help="Loaded first; the other models load in the background"
+        )
+        
+        # Selected model now, the rest in a background thread
+        try:
+            with st.spinner(f"Loading {primary_model}..."):
+                store.get(primary_model)
+        except Exception as e:
+            st.error(f"❌ **System Error:** Unable to load {primary_model}\n\n`{e}`")
+            st.info("📋 **Action Required:** Ensure model files are present in `prediction/output/` directory")
+            return
+        store.load_in_background([name for name in MODEL_FILES if name != primary_model])
+        STARTUP.mark("primary model ready")
+        
+        loaded_names = list(store.loaded().keys())
+        model_lines = "\n".join(f"- {name}" for name in loaded_names)
         st.info(f"""
-        **Active Models:** {len(models)}
-        - Standard Random Forest
-        - Cascade Random Forest  
-        - Hierarchical Random Forest
+**Active Models:** {len(loaded_names)} of {len(MODEL_FILES)} loaded
+{model_lines}
+
+**Features:** {len(config['feature_columns'])}
+**Crop Classes:** {len(encoders['Crop Name'].classes_) if 'Crop Name' in encoders else 'N/A'}
+""")
         
-        **Features:** {len(config['feature_columns'])}
-        **Crop Classes:** {len(encoders['Crop Name'].classes_) if 'Crop Name' in encoders else 'N/A'}
-        """)
+        with st.expander("⏱️ Startup Timing"):
+            st.code(STARTUP.report() or "No timings recorded yet", language=None)
         
         st.markdown("---")
         st.caption("💡 Configure farm parameters below the dashboard")
     
+    # Heavy charting/table imports happen after the first paint
+    pd, px, go = load_ui_modules()
+    
     # Farm Parameters Configuration
     districts = list(encoders['District'].classes_) if 'District' in encoders else ['District_A']
     seasons = list(encoders['Season'].classes_) if 'Season' in encoders else ['Kharif', 'Rabi']
@@ -595,18 +541,32 @@ def main():
                     }
                     
                     try:
-                        features_df = prepare_features(data, user_inputs, config['feature_columns'])
-                        features_scaled = encode_and_scale(features_df, encoders, scaler, config['feature_columns'])
+                        # Models loaded so far (background loads join on later refreshes)
+                        models = store.loaded()
+                        
+                        features = prepare_features(data, user_inputs)
+                        features_scaled = encode_and_scale(features, pipeline)
                         
-                        # Make predictions
+                        # Make predictions (one predict_proba per model, top-k for all models at once);
+                        # predictions hold crop labels and prediction_probas are indexed by label
                         predictions = {}
                         prediction_probas = {}
                         
+                        # Schemas were checked when the store loaded the models
+                        from forest_models import predict_proba_unchecked
                         for model_name, model in models.items():
-                            prediction = model.predict(features_scaled)[0]
-                            proba = model.predict_proba(features_scaled)[0]
-                            predictions[model_name] = prediction
-                            prediction_probas[model_name] = proba
+                            proba = predict_proba_unchecked(model, features_scaled)[0]
+                            labels = np.asarray(model.classes_)
+                            predictions[model_name] = labels[np.argmax(proba)]
+                            # Columns follow model.classes_, which may lack crops the training data never
+                            # produced; spread them over every label so proba[label] / crop_names[label]
+                            # hold for all models alike
+                            by_label = np.zeros(len(crop_names) if crop_names is not None else int(labels.max()) + 1)
+                            by_label[labels] = proba
+                            prediction_probas[model_name] = by_label
+                        
+                        model_names = list(prediction_probas.keys())
+                        top_10_by_model = dict(zip(model_names, top_k_indices(np.vstack(list(prediction_probas.values())), 10)))
                         
                         # Create two-column layout for organized display
                         left_col, right_col = st.columns([1, 1])
@@ -621,8 +581,8 @@ def main():
                                     pred_idx = predictions[model_name]
                                     proba = prediction_probas[model_name]
                                     
-                                    if 'Crop Name' in encoders:
-                                        crop_name = encoders['Crop Name'].inverse_transform([pred_idx])[0]
+                                    if crop_names is not None:
+                                        crop_name = crop_names[pred_idx]
                                         confidence = proba[pred_idx] * 100
                                         
                                         # Model prediction card
@@ -631,8 +591,7 @@ def main():
                                         
                                         with pred_col1:
                                             try:
-                                                img_url = get_crop_image_url(crop_name)
-                                                st.image(img_url, width=120)
+                                                st.image(crop_images.get(crop_name), width=120)
                                             except:
                                                 st.write("🌾")
                                         
@@ -650,17 +609,17 @@ def main():
                             
                             for idx, (model_name, proba) in enumerate(prediction_probas.items()):
                                 with tabs[idx]:
-                                    top_5_indices = np.argsort(proba)[-5:][::-1]
+                                    top_5_indices = top_10_by_model[model_name][:5]
                                     
                                     for rank, class_idx in enumerate(top_5_indices, 1):
-                                        if 'Crop Name' in encoders:
-                                            crop_name = encoders['Crop Name'].inverse_transform([class_idx])[0]
+                                        if crop_names is not None:
+                                            crop_name = crop_names[class_idx]
                                             confidence = proba[class_idx] * 100
                                             
                                             rec_col1, rec_col2 = st.columns([1, 4])
                                             with rec_col1:
                                                 try:
-                                                    st.image(get_crop_image_url(crop_name), width=60)
+                                                    st.image(crop_images.get(crop_name), width=60)
                                                 except:
                                                     st.write(f"{rank}.")
                                             with rec_col2:
@@ -751,6 +710,26 @@ def main():
                                 ))
                                 fig_soil.update_layout(height=200, margin=dict(l=10, r=10, t=30, b=10))
                                 st.plotly_chart(fig_soil, use_container_width=True, key=f"soil_{iteration}")
+                            
+                            # Telemetry trends from the history store
+                            if history_url and data.get('deviceId'):
+                                st.markdown(f"##### 📈 Last {history_hours}h Trends")
+                                history, history_error = fetch_telemetry_history(history_url, data['deviceId'], history_hours)
+                                if history_error:
+                                    st.caption(f"⚠️ {history_error}")
+                                elif history['count'] == 0:
+                                    st.caption("No readings recorded in this window yet")
+                                else:
+                                    times = pd.to_datetime(history['timestamp'], unit='ms')
+                                    fig_trend = go.Figure()
+                                    for column, label, color in (('temperature', 'Temp (°C)', '#FF5722'),
+                                                                 ('humidity', 'Humidity (%)', '#2196F3'),
+                                                                 ('soilMoisture', 'Soil (%)', '#8D6E63')):
+                                        fig_trend.add_trace(go.Scatter(x=times, y=history[column], name=label,
+                                                                       mode='lines', line={'color': color}))
+                                    fig_trend.update_layout(height=280, margin=dict(l=10, r=10, t=10, b=10),
+                                                            legend=dict(orientation='h', y=-0.2))
+                                    st.plotly_chart(fig_trend, use_container_width=True, key=f"trend_{iteration}")
                         
                         # ===== SECTION 2: DETAILED ANALYSIS (Full Width) =====
                         st.markdown("---")
@@ -770,12 +749,12 @@ def main():
                             for model_name, proba in prediction_probas.items():
                                 pred_idx = predictions[model_name]
                                 confidence = proba[pred_idx] * 100
-                                top_5 = np.mean(np.sort(proba)[-5:]) * 100
+                                top_5 = np.mean(proba[top_10_by_model[model_name][:5]]) * 100
                                 entropy = -np.sum(proba * np.log(proba + 1e-10))
                                 
                                 perf_data.append({
                                     'Model': model_name,
-                                    'Prediction': encoders['Crop Name'].inverse_transform([pred_idx])[0],
+                                    'Prediction': crop_names[pred_idx],
                                     'Confidence (%)': f"{confidence:.2f}",
                                     'Top-5 Avg (%)': f"{top_5:.2f}",
                                     'Entropy': f"{entropy:.3f}",
@@ -796,14 +775,13 @@ def main():
                         
                         with analysis_tabs[1]:
                             # Probability distribution
-                            primary_proba = prediction_probas["Standard RF"]
-                            top_10 = np.argsort(primary_proba)[-10:][::-1]
+                            primary_proba = prediction_probas[primary_model]
+                            top_10 = top_10_by_model[primary_model]
                             
                             dist_data = []
                             for idx in top_10:
-                                crop_name = encoders['Crop Name'].inverse_transform([idx])[0]
                                 dist_data.append({
-                                    'Crop': crop_name,
+                                    'Crop': crop_names[idx],
                                     'Probability (%)': primary_proba[idx] * 100
                                 })
                             
@@ -824,8 +802,8 @@ def main():
                         
                         with analysis_tabs[2]:
                             # Feature importance
-                            if hasattr(models["Standard RF"], 'feature_importances_'):
-                                importances = models["Standard RF"].feature_importances_
+                            if hasattr(models[primary_model], 'feature_importances_'):
+                                importances = models[primary_model].feature_importances_
                                 feature_names = config['feature_columns']
                                 
                                 imp_df = pd.DataFrame({
@@ -853,14 +831,13 @@ def main():
                             st.markdown("**Probability Distribution Comparison Across Models**")
                             
                             # Get top 10 crops from primary model
-                            primary_proba = prediction_probas["Standard RF"]
-                            top_10_indices = np.argsort(primary_proba)[-10:][::-1]
+                            primary_proba = prediction_probas[primary_model]
+                            top_10_indices = top_10_by_model[primary_model]
                             
                             comparison_data = []
                             for idx in top_10_indices:
-                                if 'Crop Name' in encoders:
-                                    crop_name = encoders['Crop Name'].inverse_transform([idx])[0]
-                                    row = {'Crop': crop_name}
+                                if crop_names is not None:
+                                    row = {'Crop': crop_names[idx]}
                                     
                                     for model_name, proba in prediction_probas.items():
                                         row[model_name] = proba[idx] * 100
@@ -988,17 +965,15 @@ def main():
                             pred_counter = Counter(pred_values)
                             most_common_pred = pred_counter.most_common(1)[0][0]
                             
-                            if 'Crop Name' in encoders:
-                                recommended_crop = encoders['Crop Name'].inverse_transform([most_common_pred])[0]
+                            if crop_names is not None:
+                                recommended_crop = crop_names[most_common_pred]
                                 st.success(f"**🏆 Primary Recommendation:** {recommended_crop}")
                                 
                                 # Get alternative crops from ensemble
                                 all_top_crops = set()
-                                for proba in prediction_probas.values():
-                                    top_3 = np.argsort(proba)[-3:][::-1]
-                                    for idx in top_3:
-                                        crop = encoders['Crop Name'].inverse_transform([idx])[0]
-                                        all_top_crops.add(crop)
+                                for model_name in prediction_probas.keys():
+                                    for idx in top_10_by_model[model_name][:3]:
+                                        all_top_crops.add(crop_names[idx])
                                 
                                 st.markdown("**🌱 Alternative Options:**")
                                 alternatives = [crop for crop in list(all_top_crops)[:5] if crop != recommended_crop]
@@ -1013,7 +988,7 @@ def main():
                                 st.json(data)
                             with col2:
                                 st.markdown("**Feature Vector:**")
-                                st.dataframe(features_df)
+                                st.dataframe(pd.DataFrame([{col: features.get(col, 0) for col in config['feature_columns']}]))
                     
                     except Exception as e:
                         st.error(f"❌ **Prediction Error:** {str(e)}")
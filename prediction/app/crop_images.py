@@ -0,0 +1,256 @@
+"""
+Local thumbnail cache for crop images
+Images are resolved once per crop (bundled directory first, then a single remote fetch),
+stored on disk under content-hash names and served from memory afterwards. Remote
+fetches never run on the caller's thread: until one finishes the crop's fixture card
+(labelled thumbnail shipped in assets/crops/fixtures) or the placeholder is served.
+Set CROP_IMAGE_OFFLINE=1 to never touch the network.
+
+Usage:
+  python prediction/app/crop_images.py --write-fixtures prediction/app/assets/crops/fixtures
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+import threading
+import urllib.request
+import zlib
+
+THUMBNAIL_SIZE = (200, 150)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def crop_slug(crop_name):
+    """File-name friendly key for a crop (e.g. "Lady’s Finger" -> "lady_s_finger")"""
+    return ''.join(c if c.isalnum() else '_' for c in crop_name.lower().strip()).strip('_')
+
+
+def make_placeholder_png(width=THUMBNAIL_SIZE[0], height=THUMBNAIL_SIZE[1], rgb=(200, 230, 201)):
+    """Solid-colour PNG built with zlib only, so a placeholder is always available"""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    row = b"\x00" + bytes(rgb) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(row * height, 9)) + chunk(b"IEND", b""))
+
+
+def resize_image(data, size=THUMBNAIL_SIZE):
+    """Downscale to a JPEG thumbnail when Pillow is installed, otherwise keep the original bytes"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("RGB")
+            img.thumbnail(size)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=85, optimize=True)
+            return out.getvalue()
+    except Exception:
+        return data
+
+
+def fixture_image(crop_name, size=THUMBNAIL_SIZE):
+    """Labelled PNG card for a crop (needs Pillow), colour derived from the crop name"""
+    from PIL import Image, ImageDraw
+
+    digest = hashlib.sha256(crop_slug(crop_name).encode('utf-8')).digest()
+    background = tuple(150 + b % 90 for b in digest[:3])
+    img = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(img)
+    box = draw.textbbox((0, 0), crop_name)
+    draw.text(((size[0] - box[2]) / 2, (size[1] - box[3]) / 2), crop_name, fill=(33, 33, 33))
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def write_atomic(path, data):
+    """Write through a uniquely named temporary file so concurrent writers never collide"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CropImageCache:
+    """Memory + disk cache of crop thumbnails keyed by crop name"""
+
+    def __init__(self, cache_dir, bundled_dir=None, url_for=None, offline=None, timeout=3, fixture_dir=None):
+        self.bundled_dir = bundled_dir
+        self.fixture_dir = fixture_dir
+        self.url_for = url_for
+        self.offline = os.environ.get("CROP_IMAGE_OFFLINE", "0") == "1" if offline is None else offline
+        self.timeout = timeout
+        self.placeholder = make_placeholder_png()
+        self._memory = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._index = {}
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError:
+            # Read-only filesystem: no disk cache, images are kept in memory only
+            cache_dir = None
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            self._index_path = os.path.join(cache_dir, "index.json")
+            try:
+                with open(self._index_path) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def get(self, crop_name):
+        """
+        Thumbnail bytes for a crop; never blocks on the network and never raises.
+        A crop that needs a remote fetch gets it scheduled in the background and its
+        fixture card (or the placeholder) is returned until the fetch completes.
+        """
+        data = self._memory.get(crop_name)
+        if data is not None:
+            return data
+        data = self._resolve_local(crop_name)
+        if data is not None:
+            self._remember(crop_name, data)
+            return data
+        if self._claim(crop_name):
+            threading.Thread(target=self._load_claimed, args=(crop_name,), daemon=True).start()
+        return self._fallback(crop_name)
+
+    def warm(self, crop_names):
+        """Resolve a batch of crops up front, fetching in the calling (background) thread"""
+        for name in crop_names:
+            if name in self._memory:
+                continue
+            data = self._resolve_local(name)
+            if data is not None:
+                self._remember(name, data)
+            elif self._claim(name):
+                self._load_claimed(name)
+
+    def _remember(self, crop_name, data):
+        with self._lock:
+            self._memory[crop_name] = data
+
+    def _claim(self, crop_name):
+        """True for the one caller that should load crop_name remotely"""
+        with self._lock:
+            if crop_name in self._memory or crop_name in self._pending:
+                return False
+            self._pending.add(crop_name)
+            return True
+
+    def _load_claimed(self, crop_name):
+        """Single remote fetch for a claimed crop; failures settle on the fallback image"""
+        try:
+            raw = None
+            if not self.offline and self.url_for is not None:
+                raw = self._fetch(self.url_for(crop_name))
+            if raw is None:
+                data = self._fallback(crop_name)
+            else:
+                data = resize_image(raw)
+                self._store(crop_slug(crop_name), data)
+            self._remember(crop_name, data)
+        finally:
+            with self._lock:
+                self._pending.discard(crop_name)
+
+    def _resolve_local(self, crop_name):
+        """Image from the disk cache or the bundled directory, None when a fetch is needed"""
+        slug = crop_slug(crop_name)
+
+        # 1. Already on disk from an earlier run
+        cached_file = self._index.get(slug)
+        if cached_file and self.cache_dir is not None:
+            try:
+                with open(os.path.join(self.cache_dir, cached_file), 'rb') as f:
+                    return f.read()
+            except OSError:
+                pass
+
+        # 2. Bundled image shipped with the app
+        raw = self._read_image(self.bundled_dir, slug)
+        if raw is not None:
+            data = resize_image(raw)
+            self._store(slug, data)
+            return data
+        return None
+
+    def _fallback(self, crop_name):
+        """Fixture card for the crop, or the generic placeholder; never stored in the disk cache"""
+        data = self._read_image(self.fixture_dir, crop_slug(crop_name))
+        return self.placeholder if data is None else data
+
+    def _read_image(self, directory, slug):
+        if not directory:
+            return None
+        for ext in IMAGE_EXTENSIONS:
+            path = os.path.join(directory, slug + ext)
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except OSError:
+                continue
+        return None
+
+    def _fetch(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                if response.status == 200:
+                    return response.read()
+        except Exception:
+            pass
+        return None
+
+    def _store(self, slug, data):
+        if self.cache_dir is None:
+            return
+        file_name = hashlib.sha256(data).hexdigest()[:20] + ".img"
+        path = os.path.join(self.cache_dir, file_name)
+        try:
+            if not os.path.exists(path):
+                write_atomic(path, data)
+            with self._lock:
+                self._index[slug] = file_name
+                index = json.dumps(self._index, indent=2, sort_keys=True)
+                write_atomic(self._index_path, index.encode('utf-8'))
+        except OSError:
+            # Read-only filesystem: keep serving from memory
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop thumbnail cache tools")
+    parser.add_argument("--write-fixtures", metavar="DIR", required=True,
+                        help="Write a labelled fixture card per crop (from the label encoder) to DIR")
+    parser.add_argument("--encoders", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          "..", "output", "label_encoders.joblib"),
+                        help="label_encoders.joblib with the 'Crop Name' classes")
+    args = parser.parse_args()
+
+    import joblib
+    crop_names = joblib.load(args.encoders)['Crop Name'].classes_
+    os.makedirs(args.write_fixtures, exist_ok=True)
+    for name in crop_names:
+        write_atomic(os.path.join(args.write_fixtures, crop_slug(str(name)) + ".png"), fixture_image(str(name)))
+    print(f"✓ {len(crop_names)} fixture images written to {args.write_fixtures}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Batch scoring for the crop prediction models
+Streams a CSV or Parquet file of farm records in chunks, encodes/scales them like the
+dashboard, scores every chunk with all three forests in a process pool and writes
+predictions plus top-k probabilities to Parquet.
+
+Usage:
+  python prediction/batch_score.py farms.csv predictions.parquet --chunk-size 50000 --workers 4
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import FeaturePipeline
+from model_store import DEFAULT_MODEL_DIR, MODEL_FILES, ModelStore, load_artifact
+from ranking import top_k_indices
+
+# Per-process scoring state (set by _init_worker or score_file for in-process runs)
+_WORKER = {}
+
+
+def model_column_prefix(model_name):
+    """Output column prefix for a model display name (e.g. "Cascade RF" -> "cascade_rf")"""
+    return model_name.lower().replace(' ', '_')
+
+
+def iter_chunks(path, chunk_size, columns=None):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file"""
+    if path.endswith('.parquet') or path.endswith('.pq'):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=columns)
+
+
+def load_scoring_state(model_dir=DEFAULT_MODEL_DIR, model_names=None):
+    """Pipeline, forests and decoded crop names needed to score chunks"""
+    config = load_artifact(os.path.join(model_dir, "model_config.joblib"))
+    encoders = load_artifact(os.path.join(model_dir, "label_encoders.joblib"))
+    scaler = load_artifact(os.path.join(model_dir, "scaler.joblib"))
+    pipeline = FeaturePipeline(config['feature_columns'], encoders, scaler)
+    store = ModelStore(model_dir)
+    model_names = list(MODEL_FILES) if model_names is None else list(model_names)
+    models = {name: store.get(name) for name in model_names}
+    crop_names = np.asarray(encoders['Crop Name'].classes_) if 'Crop Name' in encoders else None
+    return {'pipeline': pipeline, 'models': models, 'crop_names': crop_names}
+
+
+def score_frame(df, state, top_k=3):
+    """Score one DataFrame chunk; returns a dict of output column -> array"""
+    X = state['pipeline'].transform(df)
+    crop_names = state['crop_names']
+    result = {}
+    for model_name, model in state['models'].items():
+        prefix = model_column_prefix(model_name)
+        proba = model.predict_proba(X)
+        top = top_k_indices(proba, top_k)
+        top_proba = np.take_along_axis(proba, top, axis=1).astype(np.float32)
+        labels = model.classes_[top]
+        decoded = crop_names[labels] if crop_names is not None else labels
+        result[f"{prefix}_prediction"] = decoded[:, 0]
+        result[f"{prefix}_confidence"] = top_proba[:, 0]
+        for rank in range(1, top.shape[1]):
+            result[f"{prefix}_top{rank + 1}_crop"] = decoded[:, rank]
+            result[f"{prefix}_top{rank + 1}_proba"] = top_proba[:, rank]
+    return result
+
+
+def _init_worker(model_dir, model_names):
+    from forest_models import set_inference_jobs
+    _WORKER.update(load_scoring_state(model_dir, model_names))
+    # One thread per process: the pool provides the parallelism
+    for model in _WORKER['models'].values():
+        set_inference_jobs(model, 1)
+
+
+def _score_chunk(df, top_k):
+    return score_frame(df, _WORKER, top_k)
+
+
+def score_file(input_path, output_path, model_dir=DEFAULT_MODEL_DIR, chunk_size=50000,
+               workers=None, top_k=3, model_names=None, keep_columns=None, verbose=True):
+    """
+    Score input_path into output_path (Parquet). At most 2 chunks per worker are in
+    flight, so memory stays bounded regardless of file size. Returns a summary dict.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    keep_columns = list(keep_columns or [])
+    start = time.perf_counter()
+    rows_done = 0
+    writer = None
+    pending = deque()
+
+    def write(chunk_keep, future_or_result, row_offset):
+        nonlocal writer, rows_done
+        result = future_or_result.result() if hasattr(future_or_result, 'result') else future_or_result
+        n_rows = len(next(iter(result.values())))
+        columns = {'row_id': np.arange(row_offset, row_offset + n_rows, dtype=np.int64)}
+        for col in keep_columns:
+            columns[col] = chunk_keep[col].to_numpy()
+        columns.update(result)
+        table = pa.table(columns)
+        if writer is None:
+            writer = pq.ParquetWriter(output_path, table.schema, compression='zstd')
+        writer.write_table(table)
+        rows_done += n_rows
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"  ✓ {rows_done:,} rows scored ({rows_done / elapsed:,.0f} rows/s)")
+
+    try:
+        row_offset = 0
+        if workers <= 0:
+            state = load_scoring_state(model_dir, model_names)
+            for chunk in iter_chunks(input_path, chunk_size):
+                write(chunk[keep_columns], score_frame(chunk, state, top_k), row_offset)
+                row_offset += len(chunk)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(model_dir, model_names)) as pool:
+                for chunk in iter_chunks(input_path, chunk_size):
+                    pending.append((chunk[keep_columns], pool.submit(_score_chunk, chunk, top_k), row_offset))
+                    row_offset += len(chunk)
+                    if len(pending) >= 2 * workers:
+                        write(*pending.popleft())
+                while pending:
+                    write(*pending.popleft())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'rows': rows_done,
+        'seconds': elapsed,
+        'rows_per_sec': rows_done / elapsed if elapsed > 0 else 0.0,
+        'output': output_path
+    }
+    if verbose:
+        print(f"✅ Scored {rows_done:,} rows in {elapsed:.1f}s ({summary['rows_per_sec']:,.0f} rows/s) -> {output_path}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-score farm records with the crop prediction models")
+    parser.add_argument("input", help="CSV or Parquet file of farm records (model feature columns)")
+    parser.add_argument("output", help="Parquet file to write predictions to")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR, help="Directory with trained artifacts")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (0 = in-process)")
+    parser.add_argument("--top-k", type=int, default=3, help="Top-k crops to keep per model")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_FILES), default=None, help="Subset of models")
+    parser.add_argument("--keep-columns", nargs="+", default=None, help="Input columns copied to the output")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("BATCH CROP SCORING")
+    print("=" * 80)
+    score_file(args.input, args.output, model_dir=args.model_dir, chunk_size=args.chunk_size,
+               workers=args.workers, top_k=args.top_k, model_names=args.models,
+               keep_columns=args.keep_columns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Post-training compaction for the crop prediction forests
+Every inner forest is pruned by greedy ensemble selection (keep adding the tree that best
+reproduces the full forest's predictions on validation data until agreement is within
+--tolerance) and flattened into a CompactForest: float32 thresholds, int16/int32 child
+indices, leaf-only float32 probabilities and no sklearn tree objects. The accuracy,
+prediction agreement, size and single-row latency of every model are reported against the
+original.
+
+Usage:
+  python prediction/compact_models.py [--output-dir prediction/output/compact] [--tolerance 0.005]
+  python prediction/compact_models.py --data labelled.csv --in-place
+"""
+import argparse
+import os
+import pickle
+import shutil
+import time
+
+import joblib
+import numpy as np
+
+from forest_models import (CascadeRandomForest, CompactForest, HierarchicalRandomForest,
+                           register_custom_models)
+from model_store import MODEL_FILES
+from retrain_models import TRAINING_SEED, generate_synthetic_data, load_new_data, output_dir
+
+# Files copied next to the compacted models so the directory is usable as a model dir
+SUPPORT_FILES = ("model_config.joblib", "label_encoders.joblib", "scaler.joblib")
+
+
+def greedy_select(tree_proba, target, tolerance=0.005, min_trees=1):
+    """
+    Forward ensemble selection without replacement. tree_proba is (n_trees, n_rows,
+    n_classes); target holds the class index each row should predict. Returns the sorted
+    indices of the selected trees.
+    """
+    n_trees, n_rows, n_classes = tree_proba.shape
+    goal = 1.0 - tolerance
+    total = np.zeros((n_rows, n_classes), dtype=np.float32)
+    remaining = list(range(n_trees))
+    selected = []
+    # Candidates scored per step in blocks of bounded size
+    block = max(1, CompactForest.CHUNK_ELEMENTS // max(1, n_rows * n_classes))
+    while remaining:
+        agreement = np.empty(len(remaining))
+        for start in range(0, len(remaining), block):
+            candidates = total + tree_proba[remaining[start:start + block]]
+            agreement[start:start + block] = (candidates.argmax(axis=2) == target).mean(axis=1)
+        best = int(np.argmax(agreement))
+        tree_idx = remaining.pop(best)
+        selected.append(tree_idx)
+        total += tree_proba[tree_idx]
+        if len(selected) >= min_trees and agreement[best] >= goal:
+            break
+    return sorted(selected)
+
+
+def compact_forest(forest, X_val, tolerance=0.005, min_trees=1):
+    """CompactForest with the trees needed to reproduce forest's predictions on X_val"""
+    full = CompactForest.from_forest(forest)
+    if len(X_val) == 0:
+        return full
+    tree_proba = full.tree_proba(X_val)
+    target = tree_proba.sum(axis=0).argmax(axis=1)
+    return CompactForest.from_forest(forest, greedy_select(tree_proba, target, tolerance, min_trees))
+
+
+def compact_model(model, X_val, tolerance=0.005, min_trees=1):
+    """
+    Compacted copy of a standard, cascade or hierarchical model. Each inner forest is
+    selected on the validation rows it actually scores (cluster models on their cluster).
+    """
+    if isinstance(model, CascadeRandomForest):
+        compacted = pickle.loads(pickle.dumps(model))
+        compacted.layers = [compact_forest(layer, X_val, tolerance, min_trees) for layer in model.layers]
+        return compacted
+    if isinstance(model, HierarchicalRandomForest):
+        compacted = pickle.loads(pickle.dumps(model))
+        # Cluster assignments of the training rows are not needed to predict
+        if hasattr(compacted.kmeans, 'labels_'):
+            del compacted.kmeans.labels_
+        compacted.global_rf = compact_forest(model.global_rf, X_val, tolerance, min_trees)
+        clusters = model.kmeans.predict(X_val)
+        compacted.cluster_models = {
+            cluster_id: compact_forest(forest, X_val[clusters == cluster_id], tolerance, min_trees)
+            for cluster_id, forest in model.cluster_models.items()
+        }
+        return compacted
+    return compact_forest(model, X_val, tolerance, min_trees)
+
+
+def count_trees(model):
+    if isinstance(model, CascadeRandomForest):
+        return sum(count_trees(layer) for layer in model.layers)
+    if isinstance(model, HierarchicalRandomForest):
+        return count_trees(model.global_rf) + sum(count_trees(m) for m in model.cluster_models.values())
+    return model.n_estimators if isinstance(model, CompactForest) else len(model.estimators_)
+
+
+def single_row_latency_ms(model, X, repeats=30):
+    timings = []
+    for i in range(repeats):
+        row = X[i % len(X):i % len(X) + 1]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def model_report(name, original, compacted, X_val, y_val):
+    """Accuracy / agreement / size / latency of a compacted model next to its original"""
+    pred_original = original.predict(X_val)
+    pred_compact = compacted.predict(X_val)
+    return {
+        'model': name,
+        'trees': (count_trees(original), count_trees(compacted)),
+        'bytes': (len(pickle.dumps(original, protocol=pickle.HIGHEST_PROTOCOL)),
+                  len(pickle.dumps(compacted, protocol=pickle.HIGHEST_PROTOCOL))),
+        'accuracy': (float(np.mean(pred_original == y_val)), float(np.mean(pred_compact == y_val))),
+        'agreement': float(np.mean(pred_original == pred_compact)),
+        'latency_ms': (single_row_latency_ms(original, X_val), single_row_latency_ms(compacted, X_val))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the trained crop prediction forests")
+    parser.add_argument("--model-dir", default=output_dir, help="Directory with the trained models")
+    parser.add_argument("--output-dir", default=None, help="Where to write compacted models (default: <model-dir>/compact)")
+    parser.add_argument("--in-place", action="store_true", help="Overwrite the original model files")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_FILES), default=list(MODEL_FILES))
+    parser.add_argument("--data", default=None,
+                        help="Labelled CSV/Parquet used for selection and the report (default: synthetic)")
+    parser.add_argument("--n-samples", type=int, default=2000, help="Synthetic validation samples")
+    parser.add_argument("--seed", type=int, default=TRAINING_SEED,
+                        help="Seed for synthetic validation data (default: the training seed)")
+    parser.add_argument("--chunk", type=int, default=1,
+                        help="Synthetic sample stream; chunk 0 is the training set, so keep it > 0")
+    parser.add_argument("--tolerance", type=float, default=0.005,
+                        help="Allowed drop in agreement with each full forest during selection")
+    parser.add_argument("--min-trees", type=int, default=1, help="Minimum trees kept per forest")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("MODEL COMPACTION")
+    print("=" * 80)
+
+    config = joblib.load(os.path.join(args.model_dir, "model_config.joblib"))
+    encoders = joblib.load(os.path.join(args.model_dir, "label_encoders.joblib"))
+    scaler = joblib.load(os.path.join(args.model_dir, "scaler.joblib"))
+    if args.data:
+        X_val, y_val = load_new_data(args.data, config, encoders, scaler)
+    else:
+        # Held-out rows: the training prototypes, drawn from a sample stream disjoint from training
+        X_raw, y_val = generate_synthetic_data(config['feature_columns'], encoders, args.n_samples, args.seed,
+                                               args.chunk)
+        X_val = scaler.transform(X_raw)
+    print(f"  ✓ {len(y_val)} validation samples")
+
+    target_dir = args.model_dir if args.in_place else (args.output_dir or os.path.join(args.model_dir, "compact"))
+    os.makedirs(target_dir, exist_ok=True)
+    if not args.in_place:
+        for file_name in SUPPORT_FILES:
+            shutil.copyfile(os.path.join(args.model_dir, file_name), os.path.join(target_dir, file_name))
+
+    register_custom_models()
+    reports = []
+    for name in args.models:
+        model_path = os.path.join(args.model_dir, MODEL_FILES[name])
+        try:
+            original = joblib.load(model_path)
+        except Exception as e:
+            print(f"  ✗ {name}: {e}")
+            continue
+        start = time.perf_counter()
+        compacted = compact_model(original, X_val, args.tolerance, args.min_trees)
+        out_path = os.path.join(target_dir, MODEL_FILES[name])
+        joblib.dump(compacted, out_path + ".tmp")
+        os.replace(out_path + ".tmp", out_path)
+        reports.append(model_report(name, original, compacted, X_val, y_val))
+        print(f"  ✓ {name} compacted in {time.perf_counter() - start:.1f}s -> {out_path}")
+
+    print(f"\n{'Model':<18}{'Trees':>13}{'Size (MB)':>18}{'Accuracy':>18}{'Delta':>9}{'Agree':>8}{'Latency (ms)':>18}")
+    for r in reports:
+        print(f"{r['model']:<18}"
+              f"{r['trees'][0]:>6} -> {r['trees'][1]:<4}"
+              f"{r['bytes'][0] / 1e6:>8.1f} -> {r['bytes'][1] / 1e6:<6.1f}"
+              f"{r['accuracy'][0]:>8.3f} -> {r['accuracy'][1]:<6.3f}"
+              f"{r['accuracy'][1] - r['accuracy'][0]:>+9.3f}"
+              f"{r['agreement']:>8.3f}"
+              f"{r['latency_ms'][0]:>8.2f} -> {r['latency_ms'][1]:<6.2f}")
+
+    print("\n" + "=" * 80)
+    print("✅ MODEL COMPACTION COMPLETE!")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Compiled ONNX backend for the crop prediction forests
+export_model() turns a Standard, Cascade or Hierarchical forest (original or compacted) or a
+plain RandomForestClassifier pickle into one ONNX graph: every inner forest becomes an
+ai.onnx.ml TreeEnsembleClassifier, and the cascade layer weighting and the hierarchical
+model's KMeans routing are graph ops (class alignment MatMul, weighted Sum, ArgMin cluster
+mask). OnnxForest runs the graph with onnxruntime and skips sklearn's per-call input
+validation, which dominates single-row latency.
+
+ModelStore picks up <model>.onnx next to a model's joblib when onnxruntime is installed
+(FOREST_BACKEND=auto|sklearn|onnx, see model_store.py). onnx and onnxruntime are optional:
+without them everything keeps running on sklearn.
+
+`export` checks every graph against sklearn on synthetic rows and on rows sitting exactly
+on split thresholds before renaming it into place, so a graph that fails is never picked
+up; `check` re-runs that comparison (exit code 1 on mismatch).
+
+Usage:
+  python prediction/compiled_backend.py export [--model-dir prediction/output]
+  python prediction/compiled_backend.py export --model ../azure-functions/models/random_forest_v1.pkl
+  python prediction/compiled_backend.py check [--model-dir prediction/output]
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+# Graph opsets: TreeEnsembleClassifier comes from ai.onnx.ml 3, everything else from ai.onnx 17
+ONNX_OPSET = 17
+ML_OPSET = 3
+# Oldest IR version that carries those opsets, so older onnxruntime releases can load the file
+IR_VERSION = 8
+COMPILED_SUFFIX = ".onnx"
+
+# Largest acceptable |onnx - sklearn| probability difference in the parity check
+PARITY_TOLERANCE = 1e-5
+
+
+def compiled_path(path):
+    """Where the compiled graph of the model at path lives"""
+    return os.path.splitext(path)[0] + COMPILED_SUFFIX
+
+
+def _trees(forest):
+    """
+    Yield (feature, threshold, left, right, is_leaf, leaf_proba) per tree of a fitted
+    RandomForestClassifier or CompactForest. Thresholds are the largest float32 <= sklearn's
+    float64 threshold, so BRANCH_LEQ on float32 inputs takes the same branch as sklearn.
+    """
+    from forest_models import CompactForest
+
+    if isinstance(forest, CompactForest):
+        bounds = list(forest.tree_offsets) + [len(forest.feature)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            leaf_index = forest.leaf_index[start:end]
+            is_leaf = leaf_index >= 0
+            yield (forest.feature[start:end].astype(np.int64), forest.threshold[start:end],
+                   forest.left[start:end].astype(np.int64), forest.right[start:end].astype(np.int64),
+                   is_leaf, forest.leaf_values[leaf_index[is_leaf]])
+        return
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        t32 = tree.threshold.astype(np.float32)
+        over = t32.astype(np.float64) > tree.threshold
+        t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+        values = tree.value[is_leaf, 0, :]
+        totals = values.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1
+        yield (tree.feature.astype(np.int64), t32, tree.children_left.astype(np.int64),
+               tree.children_right.astype(np.int64), is_leaf, (values / totals).astype(np.float32))
+
+
+class GraphBuilder:
+    """Accumulates nodes and initializers for one model graph"""
+
+    def __init__(self):
+        self.nodes = []
+        self.initializers = []
+        self.counter = 0
+
+    def name(self, prefix):
+        self.counter += 1
+        return f"{prefix}_{self.counter}"
+
+    def const(self, value, dtype=np.float64, prefix='const'):
+        from onnx import numpy_helper
+        name = self.name(prefix)
+        self.initializers.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), name))
+        return name
+
+    def op(self, op_type, inputs, n_outputs=1, domain='', **attributes):
+        from onnx import helper
+        outputs = [self.name(op_type.lower()) for _ in range(n_outputs)]
+        self.nodes.append(helper.make_node(op_type, list(inputs), outputs, domain=domain, **attributes))
+        return outputs[0] if n_outputs == 1 else outputs
+
+    def forest(self, forest, X32):
+        """(rows x forest classes) float64 probabilities of an inner forest on float32 input X32"""
+        from onnx import TensorProto
+        columns = {key: [] for key in ('nodes_treeids', 'nodes_nodeids', 'nodes_featureids', 'nodes_values',
+                                       'nodes_truenodeids', 'nodes_falsenodeids', 'class_treeids',
+                                       'class_nodeids', 'class_ids', 'class_weights')}
+        modes = []
+        trees = list(_trees(forest))
+        for tree_id, (feature, threshold, left, right, is_leaf, leaf_proba) in enumerate(trees):
+            node_ids = np.arange(len(feature))
+            columns['nodes_treeids'].append(np.full(len(feature), tree_id))
+            columns['nodes_nodeids'].append(node_ids)
+            columns['nodes_featureids'].append(np.where(is_leaf, 0, feature))
+            columns['nodes_values'].append(np.where(is_leaf, 0, threshold).astype(np.float32))
+            columns['nodes_truenodeids'].append(np.where(is_leaf, 0, left))
+            columns['nodes_falsenodeids'].append(np.where(is_leaf, 0, right))
+            modes.extend('LEAF' if leaf else 'BRANCH_LEQ' for leaf in is_leaf)
+            # Averaging over trees is folded into the leaf weights; zero weights are left out
+            rows, classes = np.nonzero(leaf_proba)
+            columns['class_treeids'].append(np.full(len(rows), tree_id))
+            columns['class_nodeids'].append(node_ids[is_leaf][rows])
+            columns['class_ids'].append(classes)
+            columns['class_weights'].append(leaf_proba[rows, classes] / len(trees))
+        attributes = {key: np.concatenate(parts).tolist() for key, parts in columns.items()}
+        _, proba = self.op('TreeEnsembleClassifier', [X32], n_outputs=2, domain='ai.onnx.ml',
+                           nodes_modes=modes, classlabels_int64s=list(range(len(forest.classes_))),
+                           post_transform='NONE', **attributes)
+        return self.op('Cast', [proba], to=TensorProto.DOUBLE)
+
+    def aligned(self, proba, forest_classes, classes, weight=1.0):
+        """Map an inner forest's class columns onto the model's classes, scaled by weight"""
+        forest_classes = list(np.asarray(forest_classes))
+        if forest_classes == list(classes) and weight == 1.0:
+            return proba
+        alignment = np.zeros((len(forest_classes), len(classes)))
+        for row, cls in enumerate(forest_classes):
+            alignment[row, list(classes).index(cls)] = weight
+        return self.op('MatMul', [proba, self.const(alignment, prefix='alignment')])
+
+    def normalized(self, proba):
+        """Rows divided by their sum (all-zero rows are left at zero), as the custom forests do"""
+        total = self.op('ReduceSum', [proba, self.const([1], np.int64)], keepdims=1)
+        is_zero = self.op('Equal', [total, self.const(0.0)])
+        total = self.op('Where', [is_zero, self.const(1.0), total])
+        return self.op('Div', [proba, total])
+
+
+def _json_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+def build_graph(model):
+    """onnx ModelProto computing model.predict_proba for float64 (rows x features) input"""
+    from onnx import TensorProto, helper
+    from forest_models import CascadeRandomForest, HierarchicalRandomForest
+
+    classes = list(np.asarray(model.classes_))
+    builder = GraphBuilder()
+    X = 'X'
+    X32 = builder.op('Cast', [X], to=TensorProto.FLOAT)
+
+    if isinstance(model, CascadeRandomForest):
+        n_layers = len(model.layers)
+        total_weight = sum(2.0 ** (n_layers - i - 1) for i in range(n_layers))
+        terms = [builder.aligned(builder.forest(layer, X32), layer.classes_, classes,
+                                 2.0 ** (n_layers - i - 1) / total_weight)
+                 for i, layer in enumerate(model.layers)]
+        proba = builder.normalized(builder.op('Sum', terms) if len(terms) > 1 else terms[0])
+        kind = 'cascade'
+    elif isinstance(model, HierarchicalRandomForest):
+        # KMeans.predict: nearest centre in float64
+        centres = builder.const(model.kmeans.cluster_centers_, prefix='centres')
+        offsets = builder.op('Sub', [builder.op('Unsqueeze', [X, builder.const([1], np.int64)]), centres])
+        distances = builder.op('ReduceSumSquare', [offsets], axes=[2], keepdims=0)
+        cluster = builder.op('ArgMin', [distances], axis=1, keepdims=1)
+        terms = [builder.aligned(builder.forest(model.global_rf, X32), model.global_rf.classes_, classes, 0.25)]
+        for cluster_id, cluster_model in model.cluster_models.items():
+            member = builder.op('Cast', [builder.op('Equal', [cluster, builder.const([[cluster_id]], np.int64)])],
+                                to=TensorProto.DOUBLE)
+            cluster_proba = builder.aligned(builder.forest(cluster_model, X32), cluster_model.classes_, classes, 0.75)
+            terms.append(builder.op('Mul', [cluster_proba, member]))
+        proba = builder.normalized(builder.op('Sum', terms) if len(terms) > 1 else terms[0])
+        kind = 'hierarchical'
+    elif hasattr(model, 'estimators_') or hasattr(model, 'tree_offsets'):
+        proba = builder.forest(model, X32)
+        kind = 'forest'
+    else:
+        raise TypeError(f"{type(model).__name__} cannot be compiled")
+    builder.nodes.append(helper.make_node('Identity', [proba], ['probabilities']))
+
+    n_features = int(next(_forests(model)).n_features_in_)
+    graph = helper.make_graph(
+        builder.nodes, f"{kind}_forest",
+        [helper.make_tensor_value_info(X, TensorProto.DOUBLE, [None, n_features])],
+        [helper.make_tensor_value_info('probabilities', TensorProto.DOUBLE, [None, len(classes)])],
+        builder.initializers)
+    onnx_model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', ONNX_OPSET),
+                                                         helper.make_opsetid('ai.onnx.ml', ML_OPSET)],
+                                   ir_version=IR_VERSION)
+    importances = getattr(model, 'feature_importances_', None)
+    metadata = {
+        'kind': kind,
+        'classes': json.dumps([_json_value(c) for c in classes]),
+        'n_features': str(n_features),
+        'feature_importances': json.dumps(None if importances is None else np.asarray(importances).tolist()),
+    }
+    helper.set_model_props(onnx_model, metadata)
+    return onnx_model
+
+
+def _forests(model):
+    from forest_models import iter_forests
+    return iter_forests(model)
+
+
+def export_model(model, path):
+    """Write the compiled graph of model to path (atomically); returns path"""
+    onnx_model = build_graph(model)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(onnx_model.SerializeToString())
+    os.replace(tmp_path, path)
+    return path
+
+
+# azure-functions/shared_code/crop_model.OnnxModel is a trimmed copy of this class for the
+# Function app, which is deployed without prediction/; keep both in sync.
+class OnnxForest:
+    """
+    Compiled model; drop-in for predict / predict_proba / classes_ / feature_importances_.
+    Inputs are passed to onnxruntime as-is when they already are a C-contiguous float64
+    matrix, so the only per-call work outside the graph is one ndarray check.
+    """
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.kind = metadata.get('kind', 'forest')
+        self.classes_ = np.array(json.loads(metadata['classes']))
+        self.n_classes_ = len(self.classes_)
+        self.n_features_in_ = int(metadata['n_features'])
+        importances = json.loads(metadata.get('feature_importances', 'null'))
+        self.feature_importances_ = None if importances is None else np.asarray(importances)
+        self.n_jobs = 1
+
+    def predict_proba(self, X):
+        if not (isinstance(X, np.ndarray) and X.dtype == np.float64 and X.ndim == 2 and X.flags.c_contiguous):
+            X = np.ascontiguousarray(np.atleast_2d(np.asarray(X, dtype=np.float64)))
+        return self.session.run(['probabilities'], {'X': X})[0]
+
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+
+def threshold_rows(model, X, seed=0):
+    """Copies of the rows of X with every feature moved exactly onto a split threshold of the model"""
+    rng = np.random.default_rng(seed)
+    rows = np.array(X, dtype=np.float64)
+    for forest in _forests(model):
+        for feature, threshold, _, _, is_leaf, _ in _trees(forest):
+            internal = ~is_leaf
+            for f in np.unique(feature[internal]):
+                rows[:, f] = rng.choice(threshold[internal][feature[internal] == f], size=len(rows))
+    return rows
+
+
+def parity(model, compiled, X):
+    """
+    (max |probability difference|, fraction of rows with the same predicted class). Rows
+    whose two best sklearn classes are within PARITY_TOLERANCE are tied, so either class
+    counts as agreeing.
+    """
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    ranked = np.sort(expected, axis=1)
+    tied = ranked[:, -1] - ranked[:, -2] <= PARITY_TOLERANCE if expected.shape[1] > 1 else np.zeros(len(X), bool)
+    agree = (expected.argmax(axis=1) == actual.argmax(axis=1)) | tied
+    return float(np.abs(expected - actual).max()), float(np.mean(agree))
+
+
+def single_row_ms(predict_proba, X, repeats=200):
+    """Median single-row predict_proba latency"""
+    timings = []
+    for i in range(repeats):
+        row = np.ascontiguousarray(X[i % len(X):i % len(X) + 1])
+        start = time.perf_counter()
+        predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def check_model(name, model, compiled, X):
+    """Print parity and latency of a compiled model against sklearn; returns True when they agree"""
+    probes = np.vstack([X, threshold_rows(model, X)])
+    max_diff, agreement = parity(model, compiled, probes)
+    ok = max_diff <= PARITY_TOLERANCE and agreement == 1.0
+    sklearn_ms = single_row_ms(model.predict_proba, X)
+    onnx_ms = single_row_ms(compiled.predict_proba, X)
+    print(f"  {'✓' if ok else '✗'} {name}: max |Δp| {max_diff:.2e}, agreement {agreement:.2%} "
+          f"on {len(probes)} rows; single row {sklearn_ms:.3f} ms -> {onnx_ms:.3f} ms "
+          f"({sklearn_ms / onnx_ms:.1f}x)")
+    return ok
+
+
+def _model_dir_targets(model_dir):
+    from model_store import MODEL_FILES, load_artifact
+    import joblib
+    from synthetic_data import SyntheticDataGenerator
+
+    config = joblib.load(os.path.join(model_dir, "model_config.joblib"))
+    encoders = joblib.load(os.path.join(model_dir, "label_encoders.joblib"))
+    scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+    X_raw, _ = SyntheticDataGenerator(config['feature_columns'], encoders, seed=11).generate(500)
+    X = scaler.transform(X_raw)
+    for name, file_name in MODEL_FILES.items():
+        path = os.path.join(model_dir, file_name)
+        if not os.path.exists(path):
+            print(f"  ✗ {name}: {path} not found")
+            continue
+        yield name, path, lambda path=path: load_artifact(path, mmap_mode=None), X
+
+
+def _pickle_targets(paths):
+    for path in paths:
+        def load(path=path):
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        model = load()
+        X = np.random.default_rng(11).normal(size=(500, model.n_features_in_))
+        yield os.path.basename(path), path, lambda model=model: model, X
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the crop prediction forests to ONNX")
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--model-dir", default=None, help="Training output directory (default: prediction/output)")
+    parser.add_argument("--model", nargs="+", default=None,
+                        help="Pickled RandomForestClassifier(s) to compile instead, e.g. the AI_Inference model")
+    args = parser.parse_args()
+
+    from forest_models import register_custom_models
+    register_custom_models()
+    if args.model:
+        targets = _pickle_targets(args.model)
+    else:
+        from model_store import DEFAULT_MODEL_DIR
+        targets = _model_dir_targets(args.model_dir or DEFAULT_MODEL_DIR)
+
+    print("=" * 80)
+    print(f"{'EXPORTING' if args.command == 'export' else 'CHECKING'} COMPILED FORESTS")
+    print("=" * 80)
+    ok = True
+    for name, path, load, X in targets:
+        model = load()
+        if args.command == 'export':
+            # Written under a name load_forest ignores until it has passed the parity check
+            candidate = export_model(model, compiled_path(path) + ".candidate")
+            passed = check_model(name, model, OnnxForest(candidate), X)
+            if passed:
+                os.replace(candidate, compiled_path(path))
+                print(f"  → {compiled_path(path)} ({os.path.getsize(compiled_path(path)) / 1e6:.1f} MB)")
+            else:
+                os.remove(candidate)
+            ok = passed and ok
+            continue
+        if not os.path.exists(compiled_path(path)):
+            print(f"  ✗ {name}: {compiled_path(path)} not found (run export first)")
+            ok = False
+            continue
+        ok = check_model(name, model, OnnxForest(compiled_path(path)), X) and ok
+    if not ok:
+        print("\n✗ Compiled models disagree with sklearn")
+        sys.exit(1)
+    print("\n✅ Compiled models match sklearn")
+
+
+if __name__ == "__main__":
+    main()
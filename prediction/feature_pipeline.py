@@ -0,0 +1,152 @@
+"""
+Compiled feature pipeline for the crop prediction models
+Turns raw farm records into the encoded, scaled matrix the forests were trained on
+without going through pandas on the hot path.
+"""
+import os
+import threading
+
+import joblib
+import numpy as np
+
+# Derived features: target column -> (left column, right column, combine function)
+DERIVED_FEATURES = {
+    'Temp_Range': ('Max Temp', 'Min Temp', lambda a, b: a - b),
+    'Humidity_Range': ('Max Relative Humidity', 'Min Relative Humidity', lambda a, b: a - b),
+    'Temp_Humidity_Index': ('Avg Temp', 'Avg Humidity', lambda a, b: a * b / 100),
+}
+
+
+def derive_features(features):
+    """Add derived features whose source columns are present (works for scalars and arrays)"""
+    derived = dict(features)
+    for target, (left, right, combine) in DERIVED_FEATURES.items():
+        if target not in derived and left in derived and right in derived:
+            derived[target] = combine(derived[left], derived[right])
+    return derived
+
+
+class FeaturePipeline:
+    """
+    Column order, category lookup tables and scaler statistics resolved once.
+
+    Categories missing from an encoder's vocabulary (or missing columns) encode to 0,
+    matching what the dashboard has always fed the models.
+    """
+
+    def __init__(self, feature_columns, encoders, scaler):
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+
+        # Per-column category -> code dicts, keyed by position in the feature vector
+        self.lookups = {}
+        for idx, col in enumerate(self.feature_columns):
+            if col in encoders:
+                classes = encoders[col].classes_
+                self.lookups[idx] = {str(cls): code for code, cls in enumerate(classes)}
+
+        # Fused scale step: x * inv_scale - offset == (x - mean_) / scale_
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        mean = np.zeros(self.n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(self.n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+        self.inv_scale = 1.0 / scale
+        self.offset = mean * self.inv_scale
+
+        # Preallocated single-row buffers reused by transform_row / transform_row32, one set per thread
+        self._local = threading.local()
+
+    @classmethod
+    def from_output_dir(cls, model_dir):
+        """Build the pipeline from model_config/label_encoders/scaler in a training output directory"""
+        config = joblib.load(os.path.join(model_dir, "model_config.joblib"))
+        encoders = joblib.load(os.path.join(model_dir, "label_encoders.joblib"))
+        scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
+        return cls(config['feature_columns'], encoders, scaler)
+
+    def encode_value(self, idx, value):
+        """Encode a single value for the feature at position idx"""
+        lookup = self.lookups.get(idx)
+        if lookup is not None:
+            return lookup.get(str(value), 0)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _encode_column(self, idx, values):
+        lookup = self.lookups[idx]
+        uniques, inverse = np.unique(np.asarray(values).astype(str), return_inverse=True)
+        codes = np.fromiter((lookup.get(u, 0) for u in uniques), dtype=np.float64, count=len(uniques))
+        return codes[inverse.reshape(-1)]
+
+    def _row_buffers(self):
+        """This thread's (float64, float32) single-row buffers"""
+        buffers = getattr(self._local, 'rows', None)
+        if buffers is None:
+            buffers = self._local.rows = (np.zeros((1, self.n_features), dtype=np.float64),
+                                          np.zeros((1, self.n_features), dtype=np.float32))
+        return buffers
+
+    def transform_row(self, features):
+        """
+        Encode and scale one record (dict of column -> scalar).
+        Returns this thread's (1, n_features) float64 buffer; copy it if you need to keep it.
+        """
+        features = derive_features(features)
+        buffer = self._row_buffers()[0]
+        row = buffer[0]
+        for idx, col in enumerate(self.feature_columns):
+            value = features.get(col)
+            row[idx] = 0.0 if value is None else self.encode_value(idx, value)
+        np.multiply(buffer, self.inv_scale, out=buffer)
+        np.subtract(buffer, self.offset, out=buffer)
+        return buffer
+
+    def transform_row32(self, features):
+        """
+        transform_row written into this thread's float32 buffer, the dtype the trees compare
+        in, ready for forest_models.predict_proba_unchecked without a conversion copy.
+        """
+        buffer = self._row_buffers()[1]
+        np.copyto(buffer, self.transform_row(features), casting='same_kind')
+        return buffer
+
+    def transform(self, columns, out=None):
+        """
+        Encode and scale N records given as a mapping of column -> 1-D array
+        (a dict of arrays or a DataFrame). Returns an (N, n_features) float64 matrix.
+        """
+        columns = derive_features(columns)
+        n_rows = None
+        for col in self.feature_columns:
+            if col in columns:
+                n_rows = len(columns[col])
+                break
+        if n_rows is None:
+            raise ValueError("None of the model feature columns are present in the input")
+
+        if out is None:
+            out = np.empty((n_rows, self.n_features), dtype=np.float64)
+        for idx, col in enumerate(self.feature_columns):
+            if col not in columns:
+                out[:, idx] = 0.0
+            elif idx in self.lookups:
+                out[:, idx] = self._encode_column(idx, columns[col])
+            else:
+                out[:, idx] = np.asarray(columns[col], dtype=np.float64)
+        np.multiply(out, self.inv_scale, out=out)
+        np.subtract(out, self.offset, out=out)
+        return out
+
+    def transform_records(self, records):
+        """Encode and scale a list of record dicts"""
+        records = [derive_features(record) for record in records]
+        out = np.empty((len(records), self.n_features), dtype=np.float64)
+        for row_idx, record in enumerate(records):
+            for idx, col in enumerate(self.feature_columns):
+                value = record.get(col)
+                out[row_idx, idx] = 0.0 if value is None else self.encode_value(idx, value)
+        np.multiply(out, self.inv_scale, out=out)
+        np.subtract(out, self.offset, out=out)
+        return out
@@ -0,0 +1,545 @@
+"""
+Custom Random Forest variants used by the crop prediction models
+Shared by retrain_models.py (training) and the dashboard/batch tools (inference).
+"""
+import sys
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.cluster import KMeans
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils.validation import check_X_y, check_array, check_is_fitted
+
+# Below this many samples a layer/cluster forest is neither trained nor grown
+MIN_SAMPLES_PER_FOREST = 10
+
+
+def grow_forest(forest, X, y, n_new_estimators, max_estimators=None):
+    """
+    Warm-start n_new_estimators extra trees on (X, y) and, if max_estimators is set,
+    drop the oldest trees beyond that budget. Returns the number of trees added.
+
+    The class axis must not change, so classes the forest has never seen are dropped
+    from the new data, and classes absent from it get a zero-weight anchor row each.
+    """
+    known = np.isin(y, forest.classes_)
+    X, y = X[known], y[known]
+    if len(y) < MIN_SAMPLES_PER_FOREST:
+        return 0
+
+    sample_weight = np.ones(len(y))
+    missing = np.setdiff1d(forest.classes_, y)
+    if len(missing):
+        X = np.vstack([X, np.zeros((len(missing), X.shape[1]), dtype=X.dtype)])
+        y = np.concatenate([y, missing])
+        sample_weight = np.concatenate([sample_weight, np.zeros(len(missing))])
+
+    forest.set_params(warm_start=True, oob_score=False,
+                      n_estimators=len(forest.estimators_) + n_new_estimators)
+    forest.fit(X, y, sample_weight=sample_weight)
+    # A saved forest with warm_start=True would keep its old trees on the next full refit
+    forest.set_params(warm_start=False)
+    for stale in ('oob_score_', 'oob_decision_function_'):
+        if hasattr(forest, stale):
+            delattr(forest, stale)
+
+    if max_estimators is not None and len(forest.estimators_) > max_estimators:
+        forest.estimators_ = forest.estimators_[-max_estimators:]
+        forest.n_estimators = len(forest.estimators_)
+    return n_new_estimators
+
+
+class CascadeRandomForest(ClassifierMixin, BaseEstimator):
+    def __init__(self, n_layers=3, n_estimators_per_layer=50, max_depth=15, min_samples_split=5, random_state=42, n_jobs=-1,
+                 max_layer_samples=None):
+        self.n_layers = n_layers
+        self.n_estimators_per_layer = n_estimators_per_layer
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.max_layer_samples = max_layer_samples
+        self.layers = []
+        self.feature_importances_ = None
+        self.classes_ = None
+        self.n_classes_ = None
+        
+    def fit(self, X, y):
+        """
+        Each layer trains on the rows the previous layer got wrong. "Wrong" is judged on
+        out-of-bag predictions, so layers see genuinely hard rows rather than training-set
+        errors and no extra pass over the training set is needed. Rows are tracked as
+        index arrays into one float32 copy of X; max_layer_samples caps a layer's rows.
+        """
+        X, y = check_X_y(X, y)
+        # Trees work in float32: convert once instead of once per layer
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        self.classes_ = np.unique(y)
+        self.n_classes_ = len(self.classes_)
+        self.layers = []
+        rng = np.random.RandomState(self.random_state)
+        
+        n_features = X.shape[1]
+        self.feature_importances_ = np.zeros(n_features)
+        
+        hard_idx = np.arange(len(X))
+        for layer_idx in range(self.n_layers):
+            if layer_idx > 0 and len(hard_idx) < MIN_SAMPLES_PER_FOREST:
+                break
+            if self.max_layer_samples is not None and len(hard_idx) > self.max_layer_samples:
+                hard_idx = np.sort(rng.choice(hard_idx, self.max_layer_samples, replace=False))
+            
+            # OOB votes are only needed if another layer can follow
+            needs_oob = layer_idx < self.n_layers - 1
+            if layer_idx == 0:
+                print(f"  [Cascade RF Layer 1] Training on all {len(hard_idx)} samples...")
+            else:
+                print(f"  [Cascade RF Layer {layer_idx+1}] Training on {len(hard_idx)} samples...")
+            rf_layer = RandomForestClassifier(
+                n_estimators=self.n_estimators_per_layer,
+                max_depth=self.max_depth,
+                min_samples_split=self.min_samples_split,
+                random_state=self.random_state + layer_idx,
+                oob_score=needs_oob,
+                n_jobs=self.n_jobs
+            )
+            X_layer = X if len(hard_idx) == len(X) else X[hard_idx]
+            y_layer = y[hard_idx]
+            rf_layer.fit(X_layer, y_layer)
+            self.layers.append(rf_layer)
+            self.feature_importances_ += rf_layer.feature_importances_
+            if not needs_oob:
+                break
+            
+            # Rows without any OOB vote (all-zero rows) count as hard
+            oob_votes = np.nan_to_num(rf_layer.oob_decision_function_)
+            oob_pred = rf_layer.classes_[np.argmax(oob_votes, axis=1)]
+            misclassified = (oob_pred != y_layer) | (oob_votes.sum(axis=1) == 0)
+            del X_layer, oob_votes
+            # OOB bookkeeping is not needed at predict time
+            del rf_layer.oob_decision_function_
+            
+            if not misclassified.any():
+                print("    All remaining correctly classified (out-of-bag)!")
+                break
+            hard_idx = hard_idx[misclassified]
+            print(f"    Misclassified (out-of-bag): {len(hard_idx)} samples")
+        
+        self.feature_importances_ /= len(self.layers)
+        print(f"  [Cascade RF] Complete with {len(self.layers)} layers")
+        return self
+    
+    def update(self, X, y, n_new_estimators=10, max_estimators_per_layer=None):
+        """
+        Incremental update with new data. New rows are routed through the cascade as in
+        fit; only layers that misclassify some of their routed rows get new trees, and a
+        missing layer is added if hard examples remain and n_layers allows it.
+        """
+        check_is_fitted(self)
+        X, y = check_X_y(X, y)
+        remaining = np.arange(len(y))
+        
+        for layer_idx in range(self.n_layers):
+            if len(remaining) < MIN_SAMPLES_PER_FOREST:
+                break
+            X_layer, y_layer = X[remaining], y[remaining]
+            
+            if layer_idx < len(self.layers):
+                layer = self.layers[layer_idx]
+                wrong = layer.predict(X_layer) != y_layer
+                if not wrong.any():
+                    print(f"  [Cascade RF Layer {layer_idx+1}] Unaffected ({len(remaining)} samples correct)")
+                    break
+                added = grow_forest(layer, X_layer, y_layer, n_new_estimators, max_estimators_per_layer)
+                print(f"  [Cascade RF Layer {layer_idx+1}] +{added} trees on {len(remaining)} samples ({wrong.sum()} misclassified)")
+            else:
+                print(f"  [Cascade RF Layer {layer_idx+1}] New layer on {len(remaining)} samples...")
+                layer = RandomForestClassifier(
+                    n_estimators=self.n_estimators_per_layer,
+                    max_depth=self.max_depth,
+                    min_samples_split=self.min_samples_split,
+                    random_state=self.random_state + layer_idx,
+                    n_jobs=self.n_jobs
+                )
+                layer.fit(X_layer, y_layer)
+                self.layers.append(layer)
+                wrong = layer.predict(X_layer) != y_layer
+            
+            remaining = remaining[wrong]
+        
+        self.feature_importances_ = np.mean([layer.feature_importances_ for layer in self.layers], axis=0)
+        return self
+    
+    def predict_proba(self, X, check_input=True):
+        """check_input=False skips validation; X must be a float32 matrix checked at load (see check_schema)"""
+        if check_input:
+            check_is_fitted(self)
+            X = check_array(X)
+        proba = np.zeros((X.shape[0], self.n_classes_))
+        total_weight = sum([2.0 ** (len(self.layers) - i - 1) for i in range(len(self.layers))])
+        for i, layer in enumerate(self.layers):
+            layer_weight = (2.0 ** (len(self.layers) - i - 1)) / total_weight
+            layer_proba = layer.predict_proba(X) if check_input else forest_proba(layer, X)
+            layer_proba_aligned = np.zeros_like(proba)
+            for cls_idx, cls in enumerate(self.classes_):
+                if cls in layer.classes_:
+                    class_idx_in_layer = np.where(layer.classes_ == cls)[0][0]
+                    layer_proba_aligned[:, cls_idx] = layer_proba[:, class_idx_in_layer]
+            proba += layer_weight * layer_proba_aligned
+        proba_sum = proba.sum(axis=1, keepdims=True)
+        proba_sum[proba_sum == 0] = 1
+        return proba / proba_sum
+    
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+class HierarchicalRandomForest(ClassifierMixin, BaseEstimator):
+    def __init__(self, n_clusters=3, n_estimators_global=50, n_estimators_local=30, max_depth=12, random_state=42, n_jobs=-1):
+        self.n_clusters = n_clusters
+        self.n_estimators_global = n_estimators_global
+        self.n_estimators_local = n_estimators_local
+        self.max_depth = max_depth
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.global_rf = None
+        self.cluster_models = {}
+        self.kmeans = None
+        self.feature_importances_ = None
+        self.classes_ = None
+        self.n_classes_ = None
+        
+    def fit(self, X, y):
+        X, y = check_X_y(X, y)
+        self.classes_ = np.unique(y)
+        self.n_classes_ = len(self.classes_)
+        
+        print(f"  [Hierarchical RF] Clustering into {self.n_clusters} groups...")
+        self.kmeans = KMeans(n_clusters=self.n_clusters, random_state=self.random_state, n_init=10)
+        clusters = self.kmeans.fit_predict(X)
+        print(f"    Cluster sizes: {np.bincount(clusters)}")
+        
+        print(f"  [Hierarchical RF] Training global model...")
+        self.global_rf = RandomForestClassifier(
+            n_estimators=self.n_estimators_global,
+            max_depth=self.max_depth,
+            random_state=self.random_state,
+            n_jobs=self.n_jobs
+        )
+        self.global_rf.fit(X, y)
+        self.feature_importances_ = self.global_rf.feature_importances_.copy()
+        
+        print(f"  [Hierarchical RF] Training cluster-specific models...")
+        for cluster_id in range(self.n_clusters):
+            cluster_mask = (clusters == cluster_id)
+            if cluster_mask.sum() < 10:
+                print(f"    Cluster {cluster_id}: Skipped (only {cluster_mask.sum()} samples)")
+                continue
+            
+            X_cluster = X[cluster_mask]
+            y_cluster = y[cluster_mask]
+            
+            print(f"    Cluster {cluster_id}: Training on {len(X_cluster)} samples")
+            cluster_rf = RandomForestClassifier(
+                n_estimators=self.n_estimators_local,
+                max_depth=self.max_depth,
+                random_state=self.random_state + cluster_id,
+                n_jobs=self.n_jobs
+            )
+            cluster_rf.fit(X_cluster, y_cluster)
+            self.cluster_models[cluster_id] = cluster_rf
+            self.feature_importances_ += cluster_rf.feature_importances_
+        
+        self.feature_importances_ /= (1 + len(self.cluster_models))
+        print(f"  [Hierarchical RF] Complete with {len(self.cluster_models)} cluster models")
+        return self
+    
+    def update(self, X, y, n_new_estimators=10, max_estimators_per_cluster=None, update_global=False):
+        """
+        Incremental update with new data. Rows are assigned with the existing KMeans and
+        only the cluster models that received enough new rows get new trees (a cluster
+        that was skipped at fit time gets its first model). The global forest is grown
+        only when update_global is set.
+        """
+        check_is_fitted(self)
+        X, y = check_X_y(X, y)
+        clusters = self.kmeans.predict(X)
+        
+        for cluster_id in np.unique(clusters):
+            cluster_mask = (clusters == cluster_id)
+            if cluster_mask.sum() < MIN_SAMPLES_PER_FOREST:
+                continue
+            X_cluster, y_cluster = X[cluster_mask], y[cluster_mask]
+            cluster_model = self.cluster_models.get(cluster_id)
+            if cluster_model is None:
+                print(f"    Cluster {cluster_id}: New model on {len(X_cluster)} samples")
+                cluster_model = RandomForestClassifier(
+                    n_estimators=self.n_estimators_local,
+                    max_depth=self.max_depth,
+                    random_state=self.random_state + cluster_id,
+                    n_jobs=self.n_jobs
+                )
+                cluster_model.fit(X_cluster, y_cluster)
+                self.cluster_models[cluster_id] = cluster_model
+            else:
+                added = grow_forest(cluster_model, X_cluster, y_cluster, n_new_estimators, max_estimators_per_cluster)
+                print(f"    Cluster {cluster_id}: +{added} trees on {len(X_cluster)} samples")
+        
+        if update_global:
+            added = grow_forest(self.global_rf, X, y, n_new_estimators, max_estimators_per_cluster)
+            print(f"  [Hierarchical RF] Global model: +{added} trees")
+        
+        importances = [self.global_rf.feature_importances_] + [m.feature_importances_ for m in self.cluster_models.values()]
+        self.feature_importances_ = np.mean(importances, axis=0)
+        return self
+    
+    def predict_proba(self, X, check_input=True):
+        """check_input=False skips validation; X must be a float32 matrix checked at load (see check_schema)"""
+        if check_input:
+            check_is_fitted(self)
+            X = check_array(X)
+            clusters = self.kmeans.predict(X)
+        else:
+            # Nearest centre without KMeans.predict's validation (which rejects float32 against float64 centres)
+            offsets = X[:, None, :] - self.kmeans.cluster_centers_
+            clusters = np.einsum('ijk,ijk->ij', offsets, offsets).argmin(axis=1)
+        predict = (lambda forest, rows: forest.predict_proba(rows)) if check_input else forest_proba
+        proba = np.zeros((X.shape[0], self.n_classes_))
+        global_proba = predict(self.global_rf, X)
+        global_proba_aligned = np.zeros_like(proba)
+        for cls_idx, cls in enumerate(self.classes_):
+            if cls in self.global_rf.classes_:
+                class_idx_in_global = np.where(self.global_rf.classes_ == cls)[0][0]
+                global_proba_aligned[:, cls_idx] = global_proba[:, class_idx_in_global]
+        proba = 0.25 * global_proba_aligned
+        for cluster_id, cluster_model in self.cluster_models.items():
+            cluster_mask = (clusters == cluster_id)
+            if cluster_mask.sum() == 0: continue
+            X_cluster = X[cluster_mask]
+            cluster_proba = predict(cluster_model, X_cluster)
+            cluster_proba_aligned = np.zeros((len(X_cluster), self.n_classes_))
+            for cls_idx, cls in enumerate(self.classes_):
+                if cls in cluster_model.classes_:
+                    class_idx_in_cluster = np.where(cluster_model.classes_ == cls)[0][0]
+                    cluster_proba_aligned[:, cls_idx] = cluster_proba[:, class_idx_in_cluster]
+            proba[cluster_mask] += 0.75 * cluster_proba_aligned
+        proba_sum = proba.sum(axis=1, keepdims=True)
+        proba_sum[proba_sum == 0] = 1
+        return proba / proba_sum
+    
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+
+class CompactForest:
+    """
+    Inference-only, flattened copy of a fitted RandomForestClassifier.
+
+    All trees share flat node arrays: int16 feature ids, float32 thresholds, int16/int32
+    tree-local child indices and a float32 probability table holding leaves only. Leaves
+    point at themselves, so every row walks a fixed number of levels with vectorized
+    gathers. Thresholds are rounded down to the nearest float32, which keeps decisions
+    identical to sklearn (it compares float32 inputs against float64 thresholds).
+    """
+
+    # Upper bound on (trees x rows x classes) elements materialized per chunk
+    CHUNK_ELEMENTS = 1 << 22
+
+    def __init__(self, classes, feature, threshold, left, right, tree_offsets, leaf_index, leaf_values,
+                 depth, n_features, feature_importances=None):
+        self.classes_ = classes
+        self.n_classes_ = len(classes)
+        self.n_features_in_ = n_features
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.tree_offsets = tree_offsets
+        self.leaf_index = leaf_index
+        self.leaf_values = leaf_values
+        self.depth = depth
+        self.feature_importances_ = feature_importances
+        self.n_jobs = 1
+
+    @classmethod
+    def from_forest(cls, forest, tree_indices=None):
+        """Flatten a fitted forest, optionally keeping only the trees in tree_indices"""
+        estimators = forest.estimators_
+        if tree_indices is not None:
+            estimators = [estimators[i] for i in tree_indices]
+        trees = [est.tree_ for est in estimators]
+        child_dtype = np.int16 if max(t.node_count for t in trees) <= np.iinfo(np.int16).max else np.int32
+
+        features, thresholds, lefts, rights, leaf_index, leaf_values = [], [], [], [], [], []
+        offsets = np.zeros(len(trees), dtype=np.int32)
+        n_nodes = n_leaves = 0
+        for tree_idx, tree in enumerate(trees):
+            offsets[tree_idx] = n_nodes
+            is_leaf = tree.children_left == -1
+            local = np.arange(tree.node_count)
+            lefts.append(np.where(is_leaf, local, tree.children_left).astype(child_dtype))
+            rights.append(np.where(is_leaf, local, tree.children_right).astype(child_dtype))
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int16))
+
+            # Largest float32 <= the float64 threshold: x <= t32 iff x <= t for float32 x
+            t32 = tree.threshold.astype(np.float32)
+            over = t32.astype(np.float64) > tree.threshold
+            t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+            thresholds.append(np.where(is_leaf, np.float32(0), t32))
+
+            values = tree.value[is_leaf, 0, :]
+            totals = values.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1
+            leaf_values.append((values / totals).astype(np.float32))
+            index = np.full(tree.node_count, -1, dtype=np.int32)
+            index[is_leaf] = n_leaves + np.arange(is_leaf.sum())
+            leaf_index.append(index)
+            n_nodes += tree.node_count
+            n_leaves += int(is_leaf.sum())
+
+        importances = getattr(forest, 'feature_importances_', None)
+        return cls(
+            classes=np.asarray(forest.classes_),
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            tree_offsets=offsets,
+            leaf_index=np.concatenate(leaf_index),
+            leaf_values=np.concatenate(leaf_values),
+            depth=max(est.get_depth() for est in estimators),
+            n_features=forest.n_features_in_,
+            feature_importances=None if importances is None else np.asarray(importances, dtype=np.float64)
+        )
+
+    @property
+    def n_estimators(self):
+        return len(self.tree_offsets)
+
+    @property
+    def nbytes(self):
+        """Memory held by the node and leaf arrays"""
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right,
+                                      self.tree_offsets, self.leaf_index, self.leaf_values))
+
+    def _leaves(self, X):
+        """Global leaf node ids, shape (n_trees, n_rows)"""
+        cols = np.arange(len(X))
+        offsets = self.tree_offsets[:, None]
+        node = np.repeat(offsets, len(X), axis=1)
+        for _ in range(self.depth):
+            go_left = X[cols, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node]) + offsets
+        return node
+
+    def _rows(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        chunk = max(1, self.CHUNK_ELEMENTS // (self.n_estimators * self.n_classes_))
+        return X, chunk
+
+    def tree_proba(self, X):
+        """Per-tree class probabilities, shape (n_trees, n_rows, n_classes), float32"""
+        X, _ = self._rows(X)
+        return self.leaf_values[self.leaf_index[self._leaves(X)]]
+
+    def predict_proba(self, X):
+        X, chunk = self._rows(X)
+        proba = np.empty((len(X), self.n_classes_), dtype=np.float64)
+        for start in range(0, len(X), chunk):
+            rows = self.leaf_index[self._leaves(X[start:start + chunk])]
+            np.divide(self.leaf_values[rows].sum(axis=0, dtype=np.float64), self.n_estimators,
+                      out=proba[start:start + chunk])
+        return proba
+
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+
+def register_custom_models():
+    """
+    Expose the custom classes on __main__ so models pickled by running
+    retrain_models.py as a script can be unpickled from any entry point.
+    """
+    main_module = sys.modules['__main__']
+    if not hasattr(main_module, 'CascadeRandomForest'):
+        main_module.CascadeRandomForest = CascadeRandomForest
+    if not hasattr(main_module, 'HierarchicalRandomForest'):
+        main_module.HierarchicalRandomForest = HierarchicalRandomForest
+
+
+def iter_forests(model):
+    """Yield every RandomForestClassifier inside a standard, cascade or hierarchical model"""
+    if isinstance(model, CascadeRandomForest):
+        yield from model.layers
+    elif isinstance(model, HierarchicalRandomForest):
+        yield model.global_rf
+        yield from model.cluster_models.values()
+    elif hasattr(model, 'estimators_') or isinstance(model, CompactForest):
+        yield model
+
+
+def forest_proba(forest, X):
+    """
+    predict_proba of one inner forest on a float32 matrix without sklearn's per-call
+    validation and thread pool. Tree probabilities are summed in estimator order and then
+    divided, as RandomForestClassifier does with one job, so results are identical.
+    """
+    if isinstance(forest, CompactForest):
+        return forest.predict_proba(X)
+    proba = np.zeros((X.shape[0], forest.n_classes_))
+    for estimator in forest.estimators_:
+        proba += estimator.predict_proba(X, check_input=False)
+    proba /= len(forest.estimators_)
+    return proba
+
+
+def check_schema(model, n_features):
+    """
+    Validate once, at load, what sklearn otherwise re-checks on every call: the model is
+    fitted and every inner forest expects n_features features. Raises ValueError.
+    """
+    forests = list(iter_forests(model)) or [model]
+    for forest in forests:
+        if not hasattr(forest, 'classes_') or getattr(forest, 'n_features_in_', None) is None:
+            raise ValueError(f"{type(forest).__name__} is not fitted")
+        if forest.n_features_in_ != n_features:
+            raise ValueError(f"{type(model).__name__} expects {forest.n_features_in_} features, "
+                             f"the pipeline produces {n_features}")
+    return model
+
+
+def predict_proba_unchecked(model, X):
+    """
+    predict_proba for a model that passed check_schema, on a C-contiguous float32 matrix
+    (e.g. FeaturePipeline.transform_row32). Skips input validation and dtype conversion;
+    models this module does not know are called normally.
+    """
+    if isinstance(model, (CascadeRandomForest, HierarchicalRandomForest)):
+        return model.predict_proba(X, check_input=False)
+    if isinstance(model, CompactForest) or (isinstance(model, RandomForestClassifier) and model.n_outputs_ == 1):
+        return forest_proba(model, X)
+    return model.predict_proba(X)
+
+
+def set_inference_jobs(model, n_jobs):
+    """Set n_jobs on every inner forest (e.g. 1 per process when scoring in a process pool)"""
+    for forest in iter_forests(model):
+        forest.n_jobs = n_jobs
+    return model
+
+
+def update_model(model, X, y, n_new_estimators=10, max_estimators=None):
+    """Incrementally update a standard, cascade or hierarchical model in place"""
+    if any(isinstance(forest, CompactForest) for forest in iter_forests(model)):
+        raise ValueError("Compacted models cannot be updated; update the original model and compact it again")
+    if isinstance(model, CascadeRandomForest):
+        return model.update(X, y, n_new_estimators, max_estimators)
+    if isinstance(model, HierarchicalRandomForest):
+        return model.update(X, y, n_new_estimators, max_estimators)
+    added = grow_forest(model, np.asarray(X), np.asarray(y), n_new_estimators, max_estimators)
+    print(f"  [Standard RF] +{added} trees ({len(model.estimators_)} total)")
+    return model
@@ -0,0 +1,131 @@
+"""
+Model artifact loading for the crop prediction models
+Loads forests on demand (optionally in a background thread) and records load times.
+
+FOREST_BACKEND picks how forests run: "auto" (default) uses a compiled <model>.onnx written
+by compiled_backend.py when onnxruntime is installed and the file is not older than the
+joblib, "onnx" requires it, "sklearn" always loads the joblib.
+"""
+import os
+import threading
+
+import joblib
+
+from startup_timing import STARTUP
+
+# Display name -> joblib file in the training output directory
+MODEL_FILES = {
+    "Standard RF": "standard_random_forest_model.joblib",
+    "Cascade RF": "cascade_random_forest_model.joblib",
+    "Hierarchical RF": "hierarchical_random_forest_model.joblib"
+}
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+FOREST_BACKEND = os.environ.get("FOREST_BACKEND", "auto")
+
+
+def load_artifact(path, mmap_mode='r'):
+    """
+    joblib.load with timing. Uncompressed dumps memory-map their NumPy arrays;
+    compressed dumps are read normally (joblib ignores mmap_mode for them).
+    """
+    with STARTUP.measure('artifact', os.path.basename(path)):
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+
+# Same staleness rule as azure-functions/shared_code/crop_model._load_compiled
+def load_forest(path, backend=FOREST_BACKEND):
+    """The compiled model next to path when backend allows it (see FOREST_BACKEND), else the joblib"""
+    if backend != "sklearn":
+        onnx_path = os.path.splitext(path)[0] + ".onnx"
+        if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(path):
+            try:
+                with STARTUP.measure('import', 'compiled_backend (onnxruntime)'):
+                    from compiled_backend import OnnxForest
+                with STARTUP.measure('artifact', os.path.basename(onnx_path)):
+                    return OnnxForest(onnx_path)
+            except ImportError:
+                if backend == "onnx":
+                    raise
+        elif backend == "onnx":
+            raise FileNotFoundError(f"No up-to-date compiled model at {onnx_path}")
+    return load_artifact(path)
+
+
+class ModelStore:
+    """
+    Lazily loaded forests keyed by display name (see MODEL_FILES). With n_features set,
+    every model's input schema is checked once at load (forest_models.check_schema), so
+    callers can score with predict_proba_unchecked.
+    """
+
+    def __init__(self, model_dir=DEFAULT_MODEL_DIR, model_files=MODEL_FILES, backend=FOREST_BACKEND,
+                 n_features=None):
+        self.model_dir = model_dir
+        self.backend = backend
+        self.n_features = n_features
+        self.model_files = dict(model_files)
+        self._models = {}
+        self._errors = {}
+        self._locks = {name: threading.Lock() for name in self.model_files}
+        self._registered = False
+        self._background = None
+
+    def _register(self):
+        if not self._registered:
+            with STARTUP.measure('import', 'forest_models (sklearn)'):
+                from forest_models import register_custom_models
+                register_custom_models()
+            self._registered = True
+
+    def get(self, name):
+        """Return a model, loading it now if needed (raises on load failure)"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                self._register()
+                try:
+                    path = os.path.join(self.model_dir, self.model_files[name])
+                    model = load_forest(path, self.backend)
+                    if self.n_features is not None:
+                        from forest_models import check_schema
+                        check_schema(model, self.n_features)
+                    self._models[name] = model
+                    self._errors.pop(name, None)
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+        return self._models[name]
+
+    def load_in_background(self, names=None):
+        """Start (once) a daemon thread that loads the given (default: all) models in order"""
+        if self._background is not None:
+            return self._background
+        names = list(self.model_files) if names is None else list(names)
+
+        def _load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass
+
+        self._background = threading.Thread(target=_load_all, name="model-loader", daemon=True)
+        self._background.start()
+        return self._background
+
+    def load_all(self):
+        """Load every model in the calling thread"""
+        return {name: self.get(name) for name in self.model_files}
+
+    def loaded(self):
+        """Models loaded so far, in MODEL_FILES order"""
+        return {name: self._models[name] for name in self.model_files if name in self._models}
+
+    def errors(self):
+        return dict(self._errors)
+
+    def is_complete(self):
+        return all(name in self._models or name in self._errors for name in self.model_files)
@@ -0,0 +1,13 @@
+"""
+Top-k helpers shared by the dashboard, batch scoring and recommendation tools
+"""
+import numpy as np
+
+
+def top_k_indices(scores, k):
+    """Top-k column indices per row (highest first) for an (n_rows, n_classes) matrix"""
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    part = np.argpartition(scores, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(scores, part, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
@@ -1,325 +1,378 @@
 """
 Retrain models with compatible scikit-learn version
-This script retrains all models using the current scikit-learn installation
+This script retrains all models using the current scikit-learn installation.
+
+The run is split into stages (data -> scaling -> per-model fit). Each stage output is
+cached in output/.cache under a hash of its inputs, and the model fits run in parallel
+processes with a per-job core budget, so rerunning after changing one model's
+hyperparameters only retrains that model. Cached custom forests are also keyed on the
+forest_models.py source, and a --models subset is refused when the training data no
+longer matches the deployed scaler.
+
+With --incremental the existing models are updated instead of refit: new trees are
+warm-started on the new data (standard forest, affected cascade layers, affected
+hierarchical cluster models), optionally capped by --max-trees per forest.
+
+With --archive the training (or new) data comes from the Parquet telemetry archive
+(azure-functions/shared_code/telemetry_archive.py): daily per-zone temperature/humidity
+summaries for the requested dates, joined with --archive-labels (one row per zone with
+'zone', 'Crop Name' and any other feature columns). Only the needed partitions and
+columns are read.
+
+Usage:
+  python prediction/retrain_models.py [--models "Cascade RF"] [--workers 3] [--force]
+  python prediction/retrain_models.py --incremental --new-data telemetry.csv [--new-trees 10] [--max-trees 150]
+  python prediction/retrain_models.py --archive /data/archive --archive-labels zones.csv --archive-start 2025-06-01
 """
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
 import numpy as np
 import joblib
-import os
+import sklearn
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.cluster import KMeans
-from sklearn.base import BaseEstimator, ClassifierMixin
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.utils.validation import check_X_y, check_array, check_is_fitted
-
-# Set random seed for reproducibility
-np.random.seed(42)
-
-# Custom Model Classes
-class CascadeRandomForest(ClassifierMixin, BaseEstimator):
-    def __init__(self, n_layers=3, n_estimators_per_layer=50, max_depth=15, min_samples_split=5, random_state=42):
-        self.n_layers = n_layers
-        self.n_estimators_per_layer = n_estimators_per_layer
-        self.max_depth = max_depth
-        self.min_samples_split = min_samples_split
-        self.random_state = random_state
-        self.layers = []
-        self.feature_importances_ = None
-        self.classes_ = None
-        self.n_classes_ = None
-        
-    def fit(self, X, y):
-        X, y = check_X_y(X, y)
-        self.classes_ = np.unique(y)
-        self.n_classes_ = len(self.classes_)
-        
-        n_features = X.shape[1]
-        self.feature_importances_ = np.zeros(n_features)
-        
-        print(f"  [Cascade RF Layer 1] Training on all {len(X)} samples...")
-        rf_layer1 = RandomForestClassifier(
-            n_estimators=self.n_estimators_per_layer,
-            max_depth=self.max_depth,
-            min_samples_split=self.min_samples_split,
-            random_state=self.random_state,
-            n_jobs=-1
-        )
-        rf_layer1.fit(X, y)
-        self.layers.append(rf_layer1)
-        self.feature_importances_ += rf_layer1.feature_importances_
-        
-        y_pred_layer1 = rf_layer1.predict(X)
-        misclassified_mask = (y_pred_layer1 != y)
-        
-        if misclassified_mask.sum() == 0:
-            print("    All instances correctly classified!")
-            return self
-        
-        X_misclassified = X[misclassified_mask]
-        y_misclassified = y[misclassified_mask]
-        print(f"    Misclassified: {len(X_misclassified)} samples")
-        
-        for layer_idx in range(1, self.n_layers):
-            if len(X_misclassified) < 10:
-                break
-            
-            print(f"  [Cascade RF Layer {layer_idx+1}] Training on {len(X_misclassified)} samples...")
-            rf_layer = RandomForestClassifier(
-                n_estimators=self.n_estimators_per_layer,
-                max_depth=self.max_depth,
-                min_samples_split=self.min_samples_split,
-                random_state=self.random_state + layer_idx,
-                n_jobs=-1
-            )
-            rf_layer.fit(X_misclassified, y_misclassified)
-            self.layers.append(rf_layer)
-            self.feature_importances_ += rf_layer.feature_importances_
-            
-            y_pred_layer = rf_layer.predict(X_misclassified)
-            new_misclassified_mask = (y_pred_layer != y_misclassified)
-            
-            if new_misclassified_mask.sum() == 0:
-                print("    All remaining correctly classified!")
-                break
-            
-            X_misclassified = X_misclassified[new_misclassified_mask]
-            y_misclassified = y_misclassified[new_misclassified_mask]
-        
-        self.feature_importances_ /= len(self.layers)
-        print(f"  [Cascade RF] Complete with {len(self.layers)} layers")
-        return self
-    
-    def predict_proba(self, X):
-        check_is_fitted(self)
-        X = check_array(X)
-        proba = np.zeros((X.shape[0], self.n_classes_))
-        total_weight = sum([2.0 ** (len(self.layers) - i - 1) for i in range(len(self.layers))])
-        for i, layer in enumerate(self.layers):
-            layer_weight = (2.0 ** (len(self.layers) - i - 1)) / total_weight
-            layer_proba = layer.predict_proba(X)
-            layer_proba_aligned = np.zeros_like(proba)
-            for cls_idx, cls in enumerate(self.classes_):
-                if cls in layer.classes_:
-                    class_idx_in_layer = np.where(layer.classes_ == cls)[0][0]
-                    layer_proba_aligned[:, cls_idx] = layer_proba[:, class_idx_in_layer]
-            proba += layer_weight * layer_proba_aligned
-        proba_sum = proba.sum(axis=1, keepdims=True)
-        proba_sum[proba_sum == 0] = 1
-        return proba / proba_sum
-    
-    def predict(self, X):
-        proba = self.predict_proba(X)
-        return self.classes_[np.argmax(proba, axis=1)]
-
-class HierarchicalRandomForest(ClassifierMixin, BaseEstimator):
-    def __init__(self, n_clusters=3, n_estimators_global=50, n_estimators_local=30, max_depth=12, random_state=42):
-        self.n_clusters = n_clusters
-        self.n_estimators_global = n_estimators_global
-        self.n_estimators_local = n_estimators_local
-        self.max_depth = max_depth
-        self.random_state = random_state
-        self.global_rf = None
-        self.cluster_models = {}
-        self.kmeans = None
-        self.feature_importances_ = None
-        self.classes_ = None
-        self.n_classes_ = None
-        
-    def fit(self, X, y):
-        X, y = check_X_y(X, y)
-        self.classes_ = np.unique(y)
-        self.n_classes_ = len(self.classes_)
-        
-        print(f"  [Hierarchical RF] Clustering into {self.n_clusters} groups...")
-        self.kmeans = KMeans(n_clusters=self.n_clusters, random_state=self.random_state, n_init=10)
-        clusters = self.kmeans.fit_predict(X)
-        print(f"    Cluster sizes: {np.bincount(clusters)}")
-        
-        print(f"  [Hierarchical RF] Training global model...")
-        self.global_rf = RandomForestClassifier(
-            n_estimators=self.n_estimators_global,
-            max_depth=self.max_depth,
-            random_state=self.random_state,
-            n_jobs=-1
-        )
-        self.global_rf.fit(X, y)
-        self.feature_importances_ = self.global_rf.feature_importances_.copy()
-        
-        print(f"  [Hierarchical RF] Training cluster-specific models...")
-        for cluster_id in range(self.n_clusters):
-            cluster_mask = (clusters == cluster_id)
-            if cluster_mask.sum() < 10:
-                print(f"    Cluster {cluster_id}: Skipped (only {cluster_mask.sum()} samples)")
-                continue
-            
-            X_cluster = X[cluster_mask]
-            y_cluster = y[cluster_mask]
-            
-            print(f"    Cluster {cluster_id}: Training on {len(X_cluster)} samples")
-            cluster_rf = RandomForestClassifier(
-                n_estimators=self.n_estimators_local,
-                max_depth=self.max_depth,
-                random_state=self.random_state + cluster_id,
-                n_jobs=-1
-            )
-            cluster_rf.fit(X_cluster, y_cluster)
-            self.cluster_models[cluster_id] = cluster_rf
-            self.feature_importances_ += cluster_rf.feature_importances_
-        
-        self.feature_importances_ /= (1 + len(self.cluster_models))
-        print(f"  [Hierarchical RF] Complete with {len(self.cluster_models)} cluster models")
-        return self
-    
-    def predict_proba(self, X):
-        check_is_fitted(self)
-        X = check_array(X)
-        clusters = self.kmeans.predict(X)
-        proba = np.zeros((X.shape[0], self.n_classes_))
-        global_proba = self.global_rf.predict_proba(X)
-        global_proba_aligned = np.zeros_like(proba)
-        for cls_idx, cls in enumerate(self.classes_):
-            if cls in self.global_rf.classes_:
-                class_idx_in_global = np.where(self.global_rf.classes_ == cls)[0][0]
-                global_proba_aligned[:, cls_idx] = global_proba[:, class_idx_in_global]
-        proba = 0.25 * global_proba_aligned
-        for cluster_id, cluster_model in self.cluster_models.items():
-            cluster_mask = (clusters == cluster_id)
-            if cluster_mask.sum() == 0: continue
-            X_cluster = X[cluster_mask]
-            cluster_proba = cluster_model.predict_proba(X_cluster)
-            cluster_proba_aligned = np.zeros((len(X_cluster), self.n_classes_))
-            for cls_idx, cls in enumerate(self.classes_):
-                if cls in cluster_model.classes_:
-                    class_idx_in_cluster = np.where(cluster_model.classes_ == cls)[0][0]
-                    cluster_proba_aligned[:, cls_idx] = cluster_proba[:, class_idx_in_cluster]
-            proba[cluster_mask] += 0.75 * cluster_proba_aligned
-        proba_sum = proba.sum(axis=1, keepdims=True)
-        proba_sum[proba_sum == 0] = 1
-        return proba / proba_sum
-    
-    def predict(self, X):
-        proba = self.predict_proba(X)
-        return self.classes_[np.argmax(proba, axis=1)]
-
-# Main retraining logic
-print("=" * 80)
-print("MODEL RETRAINING WITH SYNTHETIC DATA")
-print("=" * 80)
+from sklearn.preprocessing import StandardScaler
+import forest_models
+from feature_pipeline import FeaturePipeline
+from forest_models import CascadeRandomForest, HierarchicalRandomForest, register_custom_models, update_model
+from model_store import MODEL_FILES
+from stage_cache import StageCache
+from synthetic_data import FEATURE_SPECS, TARGET_SPEC, SyntheticDataGenerator
 
 # Get paths
 current_dir = os.path.dirname(os.path.abspath(__file__))
 output_dir = os.path.join(current_dir, "output")
+cache_dir = os.path.join(output_dir, ".cache")
+functions_dir = os.path.join(os.path.dirname(current_dir), "azure-functions")
+
+# Bump when generate_synthetic_data changes so cached datasets are invalidated
+DATA_VERSION = 3
+
+# Default --seed for synthetic training data
+TRAINING_SEED = 42
+
+# Daily archive summary column -> model feature
+ARCHIVE_FEATURES = {
+    'temperature_mean': 'Avg Temp',
+    'temperature_max': 'Max Temp',
+    'temperature_min': 'Min Temp',
+    'humidity_mean': 'Avg Humidity',
+    'humidity_max': 'Max Relative Humidity',
+    'humidity_min': 'Min Relative Humidity',
+    'soilMoisture_mean': 'Soil Moisture',
+}
+
+# Model display name (see MODEL_FILES) -> (estimator class, hyperparameters)
+MODEL_SPECS = {
+    "Standard RF": (RandomForestClassifier, {
+        'n_estimators': 100,
+        'max_depth': 15,
+        'random_state': 42
+    }),
+    "Cascade RF": (CascadeRandomForest, {
+        'n_layers': 3,
+        'n_estimators_per_layer': 50,
+        'max_depth': 15,
+        'random_state': 42
+    }),
+    "Hierarchical RF": (HierarchicalRandomForest, {
+        'n_clusters': 5,
+        'n_estimators_global': 80,
+        'n_estimators_local': 60,
+        'max_depth': 15,
+        'random_state': 42
+    })
+}
+
+
+def generate_synthetic_data(feature_columns, encoders, n_samples=1000, seed=TRAINING_SEED, chunk_index=0):
+    """Feature matrix (categorical columns as codes) and crop labels from synthetic_data.FEATURE_SPECS"""
+    return SyntheticDataGenerator(feature_columns, encoders, seed=seed).generate(n_samples, chunk_index)
+
+
+def _archive_module():
+    """telemetry_archive from the Functions app's shared_code (imports pyarrow)"""
+    if functions_dir not in sys.path:
+        sys.path.insert(0, functions_dir)
+    from shared_code import telemetry_archive
+    return telemetry_archive
+
+
+def archive_fingerprint(archive_dir):
+    """(path, size, mtime) of every archive file, so cached datasets follow archive changes"""
+    files = []
+    for root, _, names in os.walk(archive_dir):
+        for name in names:
+            if name.endswith('.parquet') and not name.startswith('.'):
+                stat = os.stat(os.path.join(root, name))
+                files.append((os.path.relpath(os.path.join(root, name), archive_dir), stat.st_size, stat.st_mtime_ns))
+    return sorted(files)
+
+
+def load_archive_data(archive_dir, labels_path, start=None, end=None):
+    """
+    Labelled training frame from the telemetry archive: one row per zone and day with
+    ARCHIVE_FEATURES aggregated from the raw readings, joined with the zone labels.
+    """
+    archive = _archive_module()
+    labels = pd.read_parquet(labels_path) if labels_path.endswith('.parquet') else pd.read_csv(labels_path)
+    zones = labels['zone'].astype(str).unique().tolist()
+    table = archive.query_archive(archive_dir, start, end, zones=zones,
+                                  columns=['zone', 'date', 'temperature', 'humidity', 'soilMoisture'])
+    daily = archive.daily_summary(table).to_pandas().rename(columns=ARCHIVE_FEATURES)
+    print(f"  ✓ {table.num_rows:,} archived readings -> {len(daily)} zone-days")
+    return daily.merge(labels.astype({'zone': str}), on='zone', how='inner')
+
+
+def labelled_arrays(df, config, encoders, scaler=None):
+    """Features (scaled when a scaler is given) and encoded crop labels from a frame with 'Crop Name'"""
+    crop_codes = {str(name): code for code, name in enumerate(encoders['Crop Name'].classes_)}
+    y = df['Crop Name'].astype(str).map(crop_codes)
+    known = y.notna().to_numpy()
+    if not known.all():
+        print(f"  ! Dropping {(~known).sum()} rows with crops unknown to the label encoder")
+    pipeline = FeaturePipeline(config['feature_columns'], encoders, scaler)
+    X = pipeline.transform(df[known].reset_index(drop=True))
+    return X, y[known].to_numpy(dtype=np.int64)
+
+
+def data_stage(cache, config, encoders, n_samples, seed, archive=None):
+    """
+    Stage 1: training data (cached). Returns (key, X, y). archive is (archive_dir,
+    labels_path, start, end) to train on archived telemetry instead of synthetic data.
+    """
+    feature_columns = config['feature_columns']
+    vocabulary = {col: list(map(str, enc.classes_)) for col, enc in encoders.items()}
+    if archive is not None:
+        key = cache.key('data', 'archive', archive, archive_fingerprint(archive[0]), os.path.getmtime(archive[1]),
+                        list(ARCHIVE_FEATURES.items()), feature_columns, vocabulary)
+    else:
+        key = cache.key('data', DATA_VERSION, FEATURE_SPECS, TARGET_SPEC, feature_columns, n_samples, seed,
+                        vocabulary)
+    if cache.has('data', key):
+        X, y = cache.load('data', key)
+        print(f"  ✓ Loaded cached dataset ({len(X)} samples, {X.shape[1]} features)")
+    elif archive is not None:
+        X, y = labelled_arrays(load_archive_data(*archive), config, encoders)
+        cache.save('data', key, (X, y))
+        print(f"  ✓ Built {len(X)} samples from the telemetry archive")
+    else:
+        X, y = generate_synthetic_data(feature_columns, encoders, n_samples, seed)
+        cache.save('data', key, (X, y))
+        print(f"  ✓ Generated {n_samples} samples with {len(feature_columns)} features")
+    print(f"  ✓ {len(np.unique(y))} crop classes")
+    return key, X, y
+
+
+def scaling_stage(cache, data_key, X, y):
+    """Stage 2: fitted scaler and scaled matrix (cached). Returns (key, scaler)"""
+    key = cache.key('scaled', data_key, sklearn.__version__)
+    if cache.has('scaled', key):
+        print("  ✓ Loaded cached scaler")
+        scaler = cache.load('scaled', key)['scaler']
+    else:
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        cache.save('scaled', key, {'scaler': scaler, 'X': X_scaled, 'y': np.asarray(y)})
+        print("  ✓ Features scaled")
+    return key, scaler
+
+
+def source_hash(module):
+    """SHA-256 of a module's source file"""
+    with open(module.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-# Load existing configuration
-print("\n[1/6] Loading existing configuration...")
-try:
-    config = joblib.load(os.path.join(output_dir, "model_config.joblib"))
-    encoders = joblib.load(os.path.join(output_dir, "label_encoders.joblib"))
-    print(f"  ✓ Loaded configuration with {len(config['feature_columns'])} features")
-except Exception as e:
-    print(f"  ✗ Error loading config: {e}")
-    exit(1)
-
-# Generate synthetic training data
-print("\n[2/6] Generating synthetic training data...")
-n_samples = 1000
-feature_columns = config['feature_columns']
-
-synthetic_data = {}
-for col in feature_columns:
-    if col in encoders:
-        # Categorical feature - random classes
-        n_classes = len(encoders[col].classes_)
-        synthetic_data[col] = np.random.randint(0, n_classes, n_samples)
+
+def same_scaler(scaler, path):
+    """True when the scaler saved at path has the same statistics as scaler"""
+    if not os.path.exists(path):
+        return False
+    deployed = joblib.load(path)
+    return all(np.array_equal(getattr(scaler, attr, None), getattr(deployed, attr, None))
+               for attr in ('mean_', 'scale_'))
+
+
+def model_stage_key(cache, scaled_key, name):
+    """Cache key of a fitted model; custom forests also follow the forest_models source"""
+    model_class, params = MODEL_SPECS[name]
+    code = source_hash(forest_models) if model_class.__module__ == forest_models.__name__ else None
+    return cache.key('model', scaled_key, model_class.__name__, params, sklearn.__version__, code)
+
+
+def _fit_model(name, model_class, params, n_jobs, scaled_path, model_path):
+    """Worker: fit one model on the cached scaled data and write it to the stage cache"""
+    scaled = joblib.load(scaled_path, mmap_mode='r')
+    start = time.perf_counter()
+    model = model_class(**params, n_jobs=n_jobs)
+    model.fit(np.asarray(scaled['X']), np.asarray(scaled['y']))
+    tmp_path = model_path + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path)
+    return name, time.perf_counter() - start
+
+
+def fit_stage(cache, scaled_key, model_names, workers=None):
+    """Stage 3: fit every model whose cache entry is missing, in parallel processes"""
+    todo = [name for name in model_names if not cache.has('model', model_stage_key(cache, scaled_key, name))]
+    for name in model_names:
+        if name not in todo:
+            print(f"  ✓ {name}: unchanged, using cached model")
+    if not todo:
+        return
+
+    cores = os.cpu_count() or 1
+    n_parallel = max(1, min(workers or len(todo), len(todo)))
+    n_jobs = max(1, cores // n_parallel)
+    print(f"  Training {len(todo)} model(s) across {n_parallel} process(es), {n_jobs} core(s) each")
+
+    scaled_path = cache.path('scaled', scaled_key)
+    with ProcessPoolExecutor(max_workers=n_parallel) as pool:
+        futures = []
+        for name in todo:
+            model_class, params = MODEL_SPECS[name]
+            model_path = cache.path('model', model_stage_key(cache, scaled_key, name))
+            futures.append(pool.submit(_fit_model, name, model_class, params, n_jobs, scaled_path, model_path))
+        for future in as_completed(futures):
+            name, seconds = future.result()
+            print(f"  ✓ {name} trained in {seconds:.1f}s")
+
+
+def load_new_data(path, config, encoders, scaler):
+    """Scaled features and encoded crop labels from a CSV/Parquet file with a 'Crop Name' column"""
+    df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    return labelled_arrays(df, config, encoders, scaler)
+
+
+def incremental_update(args, config, encoders):
+    """Grow the saved models with new data instead of refitting them"""
+    scaler = joblib.load(os.path.join(output_dir, "scaler.joblib"))
+
+    print("\n[2/3] Preparing new data...")
+    if args.archive:
+        X_new, y_new = labelled_arrays(load_archive_data(*archive_args(args)), config, encoders, scaler)
+    elif args.new_data:
+        X_new, y_new = load_new_data(args.new_data, config, encoders, scaler)
     else:
-        # Numerical feature - random values
-        if 'Temp' in col:
-            synthetic_data[col] = np.random.uniform(15, 40, n_samples)
-        elif 'Humidity' in col or 'Moisture' in col:
-            synthetic_data[col] = np.random.uniform(30, 90, n_samples)
-        elif 'Rainfall' in col:
-            synthetic_data[col] = np.random.uniform(500, 2000, n_samples)
-        elif 'Area' in col:
-            synthetic_data[col] = np.random.uniform(0.5, 5, n_samples)
-        elif 'pH' in col:
-            synthetic_data[col] = np.random.uniform(5.5, 7.5, n_samples)
-        elif 'Production' in col:
-            synthetic_data[col] = np.random.uniform(500, 3000, n_samples)
-        elif col in ['Transplant', 'Growth', 'Harvest']:
-            synthetic_data[col] = np.random.randint(10, 150, n_samples)
-        else:
-            synthetic_data[col] = np.random.uniform(0, 100, n_samples)
-
-X = pd.DataFrame(synthetic_data)
-print(f"  ✓ Generated {n_samples} samples with {len(feature_columns)} features")
-
-# Generate synthetic target (Crop Name)
-if 'Crop Name' in encoders:
-    n_crop_classes = len(encoders['Crop Name'].classes_)
-    y = np.random.randint(0, n_crop_classes, n_samples)
-    print(f"  ✓ Generated {n_crop_classes} crop classes")
-else:
-    y = np.random.randint(0, 5, n_samples)
-    print(f"  ✓ Generated 5 generic classes")
-
-# Scale features
-print("\n[3/6] Scaling features...")
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-print(f"  ✓ Features scaled")
-
-# Save scaler
-joblib.dump(scaler, os.path.join(output_dir, "scaler.joblib"))
-print(f"  ✓ Scaler saved")
-
-# Train models
-print("\n[4/6] Training Standard Random Forest...")
-model_standard = RandomForestClassifier(
-    n_estimators=100,
-    max_depth=15,
-    random_state=42,
-    n_jobs=-1
-)
-model_standard.fit(X_scaled, y)
-print(f"  ✓ Standard RF trained")
-
-print("\n[5/6] Training Cascade Random Forest...")
-model_cascade = CascadeRandomForest(
-    n_layers=3,
-    n_estimators_per_layer=50,
-    max_depth=15,
-    random_state=42
-)
-model_cascade.fit(X_scaled, y)
-print(f"  ✓ Cascade RF trained")
-
-print("\n[6/6] Training Hierarchical Random Forest...")
-model_hierarchical = HierarchicalRandomForest(
-    n_clusters=5,
-    n_estimators_global=80,
-    n_estimators_local=60,
-    max_depth=15,
-    random_state=42
-)
-model_hierarchical.fit(X_scaled, y)
-print(f"  ✓ Hierarchical RF trained")
-
-# Save models
-print("\n[SAVE] Saving models...")
-joblib.dump(model_standard, os.path.join(output_dir, "standard_random_forest_model.joblib"))
-print("  ✓ Standard RF saved")
-
-joblib.dump(model_cascade, os.path.join(output_dir, "cascade_random_forest_model.joblib"))
-print("  ✓ Cascade RF saved")
-
-joblib.dump(model_hierarchical, os.path.join(output_dir, "hierarchical_random_forest_model.joblib"))
-print("  ✓ Hierarchical RF saved")
-
-print("\n" + "=" * 80)
-print("✅ MODEL RETRAINING COMPLETE!")
-print("=" * 80)
-print("\nAll models have been retrained with the current scikit-learn version.")
-print("You can now restart the Streamlit application.")
-print("\nTo restart the dashboard:")
-print("  pkill -f streamlit")
-print("  streamlit run prediction/app/app.py --server.port 8501 --server.headless true &")
+        # Same crop prototypes as the training data, but a sample stream other than chunk 0
+        # (the training set itself)
+        seed = TRAINING_SEED if args.seed is None else args.seed
+        chunk = args.new_data_chunk
+        if chunk is None:
+            chunk = int(np.random.SeedSequence().entropy % 2**31) + 1
+        X_raw, y_new = generate_synthetic_data(config['feature_columns'], encoders, args.n_samples, seed, chunk)
+        X_new = scaler.transform(X_raw)
+        print(f"  ✓ Synthetic data with seed {seed}, chunk {chunk} (--new-data-chunk {chunk} to repeat)")
+    print(f"  ✓ {len(y_new)} new samples (scaled with the existing scaler)")
+
+    print("\n[3/3] Updating models...")
+    register_custom_models()
+    for name in args.models:
+        start = time.perf_counter()
+        model_path = os.path.join(output_dir, MODEL_FILES[name])
+        # Plain load (no mmap): the file is rewritten below
+        model = joblib.load(model_path)
+        update_model(model, X_new, y_new, args.new_trees, args.max_trees)
+        joblib.dump(model, model_path + ".tmp")
+        os.replace(model_path + ".tmp", model_path)
+        print(f"  ✓ {name} updated and saved in {time.perf_counter() - start:.1f}s")
+
+
+def archive_args(args):
+    return (args.archive, args.archive_labels, args.archive_start, args.archive_end) if args.archive else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the crop prediction models")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPECS), default=list(MODEL_SPECS),
+                        help="Models to (re)build")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel model fits (default: one per model)")
+    parser.add_argument("--n-samples", type=int, default=1000, help="Synthetic training samples")
+    parser.add_argument("--seed", type=int, default=None,
+                        help=f"Random seed for data generation (default: {TRAINING_SEED})")
+    parser.add_argument("--force", action="store_true", help="Ignore cached stages")
+    parser.add_argument("--incremental", action="store_true", help="Grow the saved models instead of refitting")
+    parser.add_argument("--new-data", default=None,
+                        help="CSV/Parquet with feature columns and 'Crop Name' (default: synthetic, see --new-data-chunk)")
+    parser.add_argument("--new-data-chunk", type=int, default=None,
+                        help="Synthetic sample stream for --incremental (default: random; 0 is the training set)")
+    parser.add_argument("--new-trees", type=int, default=10, help="Trees added per updated forest")
+    parser.add_argument("--max-trees", type=int, default=None, help="Tree budget per forest (oldest dropped first)")
+    parser.add_argument("--archive", default=None, help="Telemetry archive directory to train on")
+    parser.add_argument("--archive-labels", default=None,
+                        help="CSV/Parquet with 'zone', 'Crop Name' and other per-zone feature columns")
+    parser.add_argument("--archive-start", default=None, help="First archived date/time to use (ISO 8601)")
+    parser.add_argument("--archive-end", default=None, help="Archived data before this date/time (ISO 8601)")
+    args = parser.parse_args()
+    if args.archive and not args.archive_labels:
+        parser.error("--archive requires --archive-labels")
+
+    print("=" * 80)
+    print(f"MODEL RETRAINING WITH {'ARCHIVED TELEMETRY' if args.archive else 'SYNTHETIC DATA'}")
+    print("=" * 80)
+
+    # Load existing configuration
+    print(f"\n[1/{3 if args.incremental else 4}] Loading existing configuration...")
+    try:
+        config = joblib.load(os.path.join(output_dir, "model_config.joblib"))
+        encoders = joblib.load(os.path.join(output_dir, "label_encoders.joblib"))
+        print(f"  ✓ Loaded configuration with {len(config['feature_columns'])} features")
+    except Exception as e:
+        print(f"  ✗ Error loading config: {e}")
+        exit(1)
+
+    if args.incremental:
+        incremental_update(args, config, encoders)
+        print("\n" + "=" * 80)
+        print("✅ INCREMENTAL UPDATE COMPLETE!")
+        print("=" * 80)
+        return
+
+    if args.force and os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+    cache = StageCache(cache_dir)
+
+    print("\n[2/4] Preparing training data...")
+    seed = TRAINING_SEED if args.seed is None else args.seed
+    data_key, X, y = data_stage(cache, config, encoders, args.n_samples, seed, archive_args(args))
+
+    print("\n[3/4] Scaling features...")
+    scaled_key, scaler = scaling_stage(cache, data_key, X, y)
+    scaler_changed = not same_scaler(scaler, os.path.join(output_dir, "scaler.joblib"))
+    if scaler_changed and set(args.models) != set(MODEL_SPECS):
+        # The models left out would be paired with a scaler fit on different data
+        print("  ✗ The training data no longer matches the deployed scaler; "
+              "retrain all models (omit --models) or use the data options of the last full run")
+        exit(1)
+
+    print("\n[4/4] Training models...")
+    fit_stage(cache, scaled_key, args.models, args.workers)
+
+    # Save models
+    print("\n[SAVE] Saving models...")
+    for name in args.models:
+        shutil.copyfile(cache.path('model', model_stage_key(cache, scaled_key, name)),
+                        os.path.join(output_dir, MODEL_FILES[name]))
+        print(f"  ✓ {name} saved")
+    if scaler_changed:
+        joblib.dump(scaler, os.path.join(output_dir, "scaler.joblib"))
+        print("  ✓ Scaler saved")
+
+    print("\n" + "=" * 80)
+    print("✅ MODEL RETRAINING COMPLETE!")
+    print("=" * 80)
+    print("\nAll models have been retrained with the current scikit-learn version.")
+    print("You can now restart the Streamlit application.")
+    print("\nTo restart the dashboard:")
+    print("  pkill -f streamlit")
+    print("  streamlit run prediction/app/app.py --server.port 8501 --server.headless true &")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Content-addressed on-disk cache for training pipeline stages
+A stage output is stored under a key derived from the stage name and everything it
+depends on (parameters and upstream keys), so unchanged stages are never recomputed.
+"""
+import hashlib
+import json
+import os
+
+import joblib
+
+
+def content_hash(*parts):
+    """Stable SHA-256 over JSON-serialisable parts (dict keys sorted)"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """joblib files named <stage>-<key prefix>.joblib inside cache_dir"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, stage, *parts):
+        return content_hash(stage, *parts)
+
+    def path(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}-{key[:16]}.joblib")
+
+    def has(self, stage, key):
+        return os.path.exists(self.path(stage, key))
+
+    def load(self, stage, key, mmap_mode=None):
+        return joblib.load(self.path(stage, key), mmap_mode=mmap_mode)
+
+    def save(self, stage, key, value):
+        """Write atomically so an interrupted run never leaves a truncated entry"""
+        path = self.path(stage, key)
+        tmp_path = path + ".tmp"
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,75 @@
+"""
+Startup timing for the prediction tools
+Records how long each heavy import and artifact load takes so cold starts can be profiled.
+"""
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROCESS_START = time.perf_counter()
+
+
+class StartupTimings:
+    """Thread-safe collection of (category, name) -> seconds"""
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def record(self, category, name, seconds):
+        with self._lock:
+            self._entries.append({
+                'category': category,
+                'name': name,
+                'ms': seconds * 1000,
+                'at_ms': (time.perf_counter() - PROCESS_START) * 1000,
+                'thread': threading.current_thread().name
+            })
+
+    @contextmanager
+    def measure(self, category, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - start)
+
+    def mark(self, name):
+        """Record a milestone (time since process start) the first time it is reached"""
+        with self._lock:
+            if any(e['category'] == 'milestone' and e['name'] == name for e in self._entries):
+                return
+        self.record('milestone', name, time.perf_counter() - PROCESS_START)
+
+    def import_module(self, module_name):
+        """Import a module, recording the time only if it was not already imported"""
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        with self.measure('import', module_name):
+            return importlib.import_module(module_name)
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def report(self):
+        """Plain-text report: imports/artifacts slowest first, milestones in order reached"""
+        lines = []
+        for category in ('import', 'artifact', 'milestone'):
+            rows = [e for e in self.entries() if e['category'] == category]
+            if category == 'milestone':
+                rows.sort(key=lambda e: e['at_ms'])
+            else:
+                rows.sort(key=lambda e: e['ms'], reverse=True)
+            if not rows:
+                continue
+            lines.append(f"[{category}]")
+            for e in rows:
+                lines.append(f"  {e['name']:<45} {e['ms']:>9.1f} ms  (t+{e['at_ms']:.0f} ms, {e['thread']})")
+        return "\n".join(lines)
+
+
+# Process-wide timings shared by every module that loads something heavy
+STARTUP = StartupTimings()
@@ -0,0 +1,251 @@
+"""
+Hyperparameter sweeps for the three forest variants
+Evaluates grid, random or successive-halving searches over the parameters in
+retrain_models.MODEL_SPECS with cached cross-validation splits, runs trials in a process
+pool, prunes weak configurations early, and records accuracy, fit time, predict latency
+and model size per trial so configurations can be picked on the accuracy/latency frontier.
+
+Usage:
+  python prediction/sweep.py --model "Cascade RF" --strategy halving --n-trials 24 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import math
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold
+
+from retrain_models import MODEL_SPECS, cache_dir, data_stage, output_dir, scaling_stage
+from stage_cache import StageCache
+
+# Model display name -> parameter -> candidate values (merged over MODEL_SPECS defaults)
+SEARCH_SPACES = {
+    "Standard RF": {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [8, 12, 15, None],
+        'min_samples_split': [2, 5, 10]
+    },
+    "Cascade RF": {
+        'n_layers': [1, 2, 3],
+        'n_estimators_per_layer': [25, 50, 100],
+        'max_depth': [10, 15],
+        'min_samples_split': [2, 5]
+    },
+    "Hierarchical RF": {
+        'n_clusters': [3, 5, 8],
+        'n_estimators_global': [40, 80],
+        'n_estimators_local': [30, 60],
+        'max_depth': [12, 15]
+    }
+}
+
+# Single-row predict_proba calls timed per trial
+LATENCY_REPEATS = 30
+
+
+def split_stage(cache, scaled_key, y, n_folds, seed):
+    """Cross-validation folds as index arrays, cached next to the scaled data"""
+    key = cache.key('splits', scaled_key, n_folds, seed)
+    if not cache.has('splits', key):
+        # Stratify when every class has enough rows, otherwise fall back to plain shuffling
+        counts = np.bincount(np.asarray(y))
+        if counts[counts > 0].min() >= n_folds:
+            folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed).split(np.zeros(len(y)), y)
+        else:
+            rng = np.random.RandomState(seed)
+            order = rng.permutation(len(y))
+            parts = np.array_split(order, n_folds)
+            folds = ((np.concatenate(parts[:i] + parts[i + 1:]), parts[i]) for i in range(n_folds))
+        rng = np.random.RandomState(seed)
+        # Training indices are pre-shuffled so a prefix is a random subsample (halving rungs)
+        splits = [(rng.permutation(train_idx), test_idx) for train_idx, test_idx in folds]
+        cache.save('splits', key, splits)
+    return cache.path('splits', key)
+
+
+def candidate_params(model_name, strategy, n_trials, seed):
+    """Parameter dicts to evaluate: full grid, or n_trials random grid points"""
+    space = SEARCH_SPACES[model_name]
+    names = list(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    if strategy == 'grid' or n_trials is None or n_trials >= len(grid):
+        return grid
+    rng = np.random.RandomState(seed)
+    return [grid[i] for i in rng.choice(len(grid), n_trials, replace=False)]
+
+
+def evaluate_trial(model_name, params, scaled_path, splits_path, fraction=1.0, prune_below=None):
+    """
+    Cross-validate one configuration. Stops after the first fold if its accuracy is below
+    prune_below. Returns a result row (dict).
+    """
+    model_class, base_params = MODEL_SPECS[model_name]
+    trial_params = {**base_params, **params}
+    scaled = joblib.load(scaled_path, mmap_mode='r')
+    X, y = np.asarray(scaled['X']), np.asarray(scaled['y'])
+    splits = joblib.load(splits_path)
+
+    scores, fit_seconds = [], []
+    model = None
+    pruned = False
+    for fold_idx, (train_idx, test_idx) in enumerate(splits):
+        train_idx = train_idx[:max(1, int(len(train_idx) * fraction))]
+        model = model_class(**trial_params, n_jobs=1)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.fit(X[train_idx], y[train_idx])
+        fit_seconds.append(time.perf_counter() - start)
+        scores.append(float(np.mean(model.predict(X[test_idx]) == y[test_idx])))
+        if fold_idx == 0 and prune_below is not None and scores[0] < prune_below:
+            pruned = True
+            break
+
+    # Latency and size of the last fitted model
+    test_idx = splits[-1][1] if not pruned else splits[0][1]
+    row = X[test_idx[:1]]
+    single = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model.predict_proba(row)
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.predict_proba(X[test_idx])
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'model': model_name,
+        **{f'param_{k}': v for k, v in params.items()},
+        'fraction': fraction,
+        'folds': len(scores),
+        'pruned': pruned,
+        'accuracy': float(np.mean(scores)),
+        'accuracy_std': float(np.std(scores)),
+        'fit_seconds': float(np.mean(fit_seconds)),
+        'latency_ms_p50': float(np.percentile(single, 50) * 1000),
+        'latency_ms_p95': float(np.percentile(single, 95) * 1000),
+        'batch_us_per_row': float(batch_seconds / len(test_idx) * 1e6),
+        'model_bytes': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    }
+
+
+def pareto_front(results, accuracy='accuracy', latency='latency_ms_p50'):
+    """Boolean mask of rows not dominated on (higher accuracy, lower latency)"""
+    order = results.sort_values([latency, accuracy], ascending=[True, False]).index
+    best = -np.inf
+    front = pd.Series(False, index=results.index)
+    for idx in order:
+        if results.at[idx, accuracy] > best:
+            front[idx] = True
+            best = results.at[idx, accuracy]
+    return front
+
+
+def run_sweep(model_name, strategy='random', n_trials=20, n_folds=3, workers=None, seed=42,
+              n_samples=1000, eta=3, min_fraction=0.25, prune_ratio=0.8):
+    """
+    Run a sweep and return the results DataFrame (one row per evaluated trial/rung, with
+    an 'on_frontier' column). Grid/random trials are pruned after one fold when they score
+    below prune_ratio x the best accuracy seen so far; halving keeps the top 1/eta per rung.
+    """
+    config = joblib.load(os.path.join(output_dir, "model_config.joblib"))
+    encoders = joblib.load(os.path.join(output_dir, "label_encoders.joblib"))
+    cache = StageCache(cache_dir)
+    data_key, X, y = data_stage(cache, config, encoders, n_samples, seed)
+    scaled_key, _ = scaling_stage(cache, data_key, X, y)
+    scaled_path = cache.path('scaled', scaled_key)
+    splits_path = split_stage(cache, scaled_key, y, n_folds, seed)
+
+    candidates = candidate_params(model_name, strategy, n_trials, seed)
+    workers = workers or os.cpu_count() or 1
+    rows = []
+    print(f"  {len(candidates)} configuration(s), {n_folds} folds, {workers} worker(s), strategy={strategy}")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if strategy == 'halving':
+            fraction = min_fraction
+            survivors = candidates
+            while True:
+                futures = {pool.submit(evaluate_trial, model_name, params, scaled_path, splits_path, fraction): i
+                           for i, params in enumerate(survivors)}
+                rung = [None] * len(survivors)
+                for future in as_completed(futures):
+                    rung[futures[future]] = future.result()
+                rows.extend(rung)
+                best = max(r['accuracy'] for r in rung)
+                print(f"  ✓ Rung fraction={fraction:.2f}: {len(survivors)} configs, best accuracy {best:.3f}")
+                if fraction >= 1.0 or len(survivors) == 1:
+                    break
+                keep = max(1, math.ceil(len(survivors) / eta))
+                ranked = sorted(range(len(survivors)), key=lambda i: rung[i]['accuracy'], reverse=True)
+                survivors = [survivors[i] for i in ranked[:keep]]
+                fraction = min(1.0, fraction * eta)
+        else:
+            best = None
+            pending = list(candidates)
+            running = {}
+            while pending or running:
+                while pending and len(running) < workers:
+                    params = pending.pop(0)
+                    prune_below = best * prune_ratio if best is not None else None
+                    running[pool.submit(evaluate_trial, model_name, params, scaled_path, splits_path,
+                                        1.0, prune_below)] = params
+                done = next(as_completed(running))
+                running.pop(done)
+                result = done.result()
+                rows.append(result)
+                if not result['pruned']:
+                    best = result['accuracy'] if best is None else max(best, result['accuracy'])
+                print(f"  ✓ Trial {len(rows)}/{len(candidates)}: accuracy {result['accuracy']:.3f}"
+                      f"{' (pruned)' if result['pruned'] else ''}, p50 {result['latency_ms_p50']:.2f} ms")
+
+    results = pd.DataFrame(rows)
+    final = results[(results['fraction'] >= 1.0) & ~results['pruned']]
+    results['on_frontier'] = False
+    if len(final):
+        results.loc[final.index, 'on_frontier'] = pareto_front(final)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for the crop prediction forests")
+    parser.add_argument("--model", choices=list(SEARCH_SPACES), default="Standard RF")
+    parser.add_argument("--strategy", choices=['grid', 'random', 'halving'], default='random')
+    parser.add_argument("--n-trials", type=int, default=20, help="Configurations for random/halving search")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--n-samples", type=int, default=1000, help="Synthetic training samples")
+    parser.add_argument("--eta", type=int, default=3, help="Halving factor")
+    parser.add_argument("--output", default=None, help="CSV/Parquet results file (default: output/sweeps/...)")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"HYPERPARAMETER SWEEP: {args.model}")
+    print("=" * 80)
+    results = run_sweep(args.model, args.strategy, args.n_trials, args.folds, args.workers, args.seed,
+                        args.n_samples, args.eta)
+
+    output = args.output or os.path.join(
+        output_dir, "sweeps", f"{args.model.lower().replace(' ', '_')}_{args.strategy}_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if output.endswith('.parquet'):
+        results.to_parquet(output, index=False)
+    else:
+        results.to_csv(output, index=False)
+
+    frontier = results[results['on_frontier']].sort_values('latency_ms_p50')
+    print("\nAccuracy / latency frontier:")
+    print(frontier.filter(regex='^param_|accuracy$|latency_ms_p50|model_bytes').to_string(index=False))
+    print(f"\n✅ {len(results)} trial results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
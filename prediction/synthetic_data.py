@@ -0,0 +1,313 @@
+"""
+Declarative synthetic data generator for the crop prediction models
+Each column is described by a distribution spec in FEATURE_SPECS. Specs are sampled in
+order, so a column can depend on columns declared before it (temperatures follow the
+season, humidity follows rainfall, soil moisture follows rainfall and temperature as in
+the Node-RED "Soil Fusion (Physics-Based)" node). Crop labels are drawn from per-crop
+climate prototypes, so the data carries learnable signal. The prototypes come from
+PROTOTYPE_SEED, not the sampling seed, so every seed draws from the same labelling and
+data generated with one seed is valid test data for models trained on another.
+
+Rows are produced in vectorized chunks, each seeded from (seed, chunk index), so any
+chunk can be regenerated on its own and output can be streamed to Parquet at any size.
+Every chunk with at least one row per crop includes one anchor row per crop (its
+prototype climate and season), so all label encoder classes are always present.
+
+Usage:
+  python prediction/synthetic_data.py farms.parquet --rows 20000000 --chunk-size 200000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import DERIVED_FEATURES, derive_features
+
+# Soil Fusion constants (simulation/flows.json): soil += rainfall * 2; soil -= temperature * 0.05
+SOIL_BASE = 35.0
+SOIL_RAIN_GAIN = 2.0
+SOIL_EVAPORATION = 0.05
+SOIL_LIMITS = (10.0, 60.0)
+
+# Column -> distribution spec, sampled in this order. Kinds:
+#   categorical  codes of the column's label encoder (optional 'weights' by class name)
+#   uniform      low, high
+#   normal       mean, std (mean may be a dict keyed by the classes of the 'by' column)
+#   gamma        mean, shape (mean may depend on 'by' as above)
+#   offset       value of column 'of' plus uniform(low, high)
+#   linear       intercept + sum(coef * column for 'of') + normal(0, std)
+#   soil_fusion  one Soil Fusion step from a noisy base using 'rainfall'/'temperature' columns
+# Any spec may set clip=(low, high) (None for an open side).
+FEATURE_SPECS = {
+    'Season': {'dist': 'categorical'},
+    'District': {'dist': 'categorical'},
+    'Transplant': {'dist': 'categorical'},
+    'Growth': {'dist': 'categorical'},
+    'Harvest': {'dist': 'categorical'},
+    'Rainfall': {'dist': 'gamma', 'by': 'Season', 'shape': 2.0,
+                 'mean': {'Kharif 1': 8.0, 'Kharif 2': 14.0, 'Rabi': 1.5}, 'clip': (0, 80)},
+    'Avg Temp': {'dist': 'normal', 'by': 'Season', 'std': 3.0,
+                 'mean': {'Kharif 1': 30.0, 'Kharif 2': 29.0, 'Rabi': 21.0}, 'clip': (15, 40)},
+    'Max Temp': {'dist': 'offset', 'of': 'Avg Temp', 'low': 3.0, 'high': 7.0},
+    'Min Temp': {'dist': 'offset', 'of': 'Avg Temp', 'low': -7.0, 'high': -3.0},
+    'Avg Humidity': {'dist': 'linear', 'intercept': 58.0, 'of': {'Rainfall': 1.5}, 'std': 7.0, 'clip': (30, 98)},
+    'Max Relative Humidity': {'dist': 'offset', 'of': 'Avg Humidity', 'low': 5.0, 'high': 15.0, 'clip': (None, 100)},
+    'Min Relative Humidity': {'dist': 'offset', 'of': 'Avg Humidity', 'low': -25.0, 'high': -10.0, 'clip': (5, None)},
+    'Soil Moisture': {'dist': 'soil_fusion', 'rainfall': 'Rainfall', 'temperature': 'Avg Temp', 'std': 5.0},
+    'Area': {'dist': 'uniform', 'low': 0.5, 'high': 5.0},
+    'AP Ratio': {'dist': 'uniform', 'low': 0.1, 'high': 0.5},
+    'Production': {'dist': 'linear', 'intercept': 0.0, 'of': {'Area': 550.0}, 'std': 150.0, 'clip': (50, None)},
+}
+
+# Crop label model: each crop prefers a season and a (temperature, humidity) point;
+# rows score crops by scaled distance plus Gumbel noise and take the best one
+TARGET_SPEC = {
+    'features': {'Avg Temp': 3.0, 'Avg Humidity': 8.0},
+    'match': 'Season',
+    'match_bonus': 1.0,
+    'noise': 1.0,
+}
+
+# Seed of the crop prototypes, i.e. of the features -> crop labelling itself
+PROTOTYPE_SEED = 0x70726f74
+
+# Numeric columns without a spec (same fallback as the old generator)
+DEFAULT_SPEC = {'dist': 'uniform', 'low': 0.0, 'high': 100.0}
+
+
+def _by_values(spec, key, columns, encoders):
+    """Spec parameter as a scalar or, when keyed by class name, a per-row array"""
+    value = spec[key]
+    if not isinstance(value, dict):
+        return value
+    classes = [str(c) for c in encoders[spec['by']].classes_]
+    default = np.mean(list(value.values()))
+    table = np.array([value.get(c, default) for c in classes], dtype=np.float64)
+    return table[columns[spec['by']]]
+
+
+def _sample_categorical(rng, spec, n, columns, encoders, column):
+    classes = [str(c) for c in encoders[column].classes_]
+    weights = spec.get('weights')
+    if weights is None:
+        return rng.integers(0, len(classes), n)
+    p = np.array([weights.get(c, 0.0) for c in classes], dtype=np.float64)
+    return rng.choice(len(classes), n, p=p / p.sum())
+
+
+def _sample_uniform(rng, spec, n, columns, encoders, column):
+    return rng.uniform(spec['low'], spec['high'], n)
+
+
+def _sample_normal(rng, spec, n, columns, encoders, column):
+    return rng.normal(_by_values(spec, 'mean', columns, encoders), spec['std'], n)
+
+
+def _sample_gamma(rng, spec, n, columns, encoders, column):
+    mean = _by_values(spec, 'mean', columns, encoders)
+    return rng.gamma(spec['shape'], np.asarray(mean) / spec['shape'], n)
+
+
+def _sample_offset(rng, spec, n, columns, encoders, column):
+    return columns[spec['of']] + rng.uniform(spec['low'], spec['high'], n)
+
+
+def _sample_linear(rng, spec, n, columns, encoders, column):
+    values = np.full(n, float(spec['intercept']))
+    for source, coef in spec['of'].items():
+        values += coef * columns[source]
+    return values + rng.normal(0.0, spec.get('std', 0.0), n)
+
+
+def _sample_soil_fusion(rng, spec, n, columns, encoders, column):
+    soil = rng.normal(spec.get('base', SOIL_BASE), spec.get('std', 0.0), n)
+    soil += columns[spec['rainfall']] * SOIL_RAIN_GAIN
+    soil -= columns[spec['temperature']] * SOIL_EVAPORATION
+    return np.clip(soil, *SOIL_LIMITS)
+
+
+SAMPLERS = {
+    'categorical': _sample_categorical,
+    'uniform': _sample_uniform,
+    'normal': _sample_normal,
+    'gamma': _sample_gamma,
+    'offset': _sample_offset,
+    'linear': _sample_linear,
+    'soil_fusion': _sample_soil_fusion,
+}
+
+
+def spec_dependencies(spec):
+    """Columns a spec reads"""
+    deps = []
+    if 'by' in spec:
+        deps.append(spec['by'])
+    if spec['dist'] == 'offset':
+        deps.append(spec['of'])
+    elif spec['dist'] == 'linear':
+        deps.extend(spec['of'])
+    elif spec['dist'] == 'soil_fusion':
+        deps.extend([spec['rainfall'], spec['temperature']])
+    return deps
+
+
+class SyntheticDataGenerator:
+    """
+    Seeded generator for model feature columns (plus optional extra spec columns) and
+    encoded crop labels. Categorical columns come out as encoder codes; use decode() to
+    turn a chunk into the raw record format the feature pipeline expects.
+    """
+
+    def __init__(self, feature_columns, encoders, specs=None, target_spec=None, target_column='Crop Name',
+                 extra_columns=(), seed=42, prototype_seed=PROTOTYPE_SEED):
+        self.feature_columns = list(feature_columns)
+        self.encoders = encoders
+        self.specs = dict(FEATURE_SPECS if specs is None else specs)
+        self.target_spec = dict(TARGET_SPEC if target_spec is None else target_spec)
+        self.target_column = target_column
+        self.extra_columns = list(extra_columns)
+        self.seed = seed
+        self.prototype_seed = prototype_seed
+
+        # Columns the model needs but no spec covers get the generic fallback
+        for col in self.feature_columns + self.extra_columns:
+            if col not in self.specs and col not in DERIVED_FEATURES:
+                self.specs[col] = {'dist': 'categorical'} if col in encoders else dict(DEFAULT_SPEC)
+
+        seen = set()
+        for col, spec in self.specs.items():
+            if spec['dist'] not in SAMPLERS:
+                raise ValueError(f"Unknown distribution '{spec['dist']}' for column '{col}'")
+            missing = [dep for dep in spec_dependencies(spec) if dep not in seen]
+            if missing:
+                raise ValueError(f"Column '{col}' depends on {missing}, which must be declared before it")
+            seen.add(col)
+
+        self.n_classes = len(encoders[target_column].classes_) if target_column in encoders else 5
+        self._init_prototypes()
+
+    def _init_prototypes(self):
+        """Per-crop preferred season and climate point, fixed by prototype_seed"""
+        rng = np.random.default_rng(self.prototype_seed)
+        self.prototypes = {}
+        for col in self.target_spec['features']:
+            low, high = self.specs[col].get('clip', (None, None))
+            sample = self._sample_columns(rng, 4096)[col]
+            low = np.percentile(sample, 5) if low is None else low
+            high = np.percentile(sample, 95) if high is None else high
+            self.prototypes[col] = rng.uniform(low, high, self.n_classes)
+        match = self.target_spec.get('match')
+        if match:
+            self.prototypes[match] = rng.integers(0, len(self.encoders[match].classes_), self.n_classes)
+
+    def _sample_columns(self, rng, n, fixed=None):
+        """Spec columns for n rows; fixed maps a column to (row indices, values) set before dependents are sampled"""
+        columns = {}
+        for col, spec in self.specs.items():
+            values = SAMPLERS[spec['dist']](rng, spec, n, columns, self.encoders, col)
+            if fixed and col in fixed:
+                rows, fixed_values = fixed[col]
+                values = np.array(values, dtype=np.result_type(values, fixed_values))
+                values[rows] = fixed_values
+            low, high = spec.get('clip', (None, None))
+            if low is not None or high is not None:
+                values = np.clip(values, low, high)
+            columns[col] = values
+        return columns
+
+    def _sample_target(self, rng, columns, n):
+        spec = self.target_spec
+        scores = np.zeros((n, self.n_classes), dtype=np.float32)
+        for col, width in spec['features'].items():
+            distance = (columns[col].astype(np.float32)[:, None] - self.prototypes[col][None, :].astype(np.float32)) / width
+            scores -= distance * distance
+        match = spec.get('match')
+        if match:
+            scores += spec['match_bonus'] * (columns[match][:, None] == self.prototypes[match][None, :])
+        scores += spec['noise'] * rng.gumbel(size=scores.shape).astype(np.float32)
+        return np.argmax(scores, axis=1)
+
+    def generate(self, n_samples, chunk_index=0):
+        """One chunk: (DataFrame of feature + extra columns, encoded labels)"""
+        rng = np.random.default_rng([self.seed, chunk_index])
+        # One anchor row per crop at random positions, so every class is present
+        anchors = rng.choice(n_samples, self.n_classes, replace=False) if n_samples >= self.n_classes else None
+        fixed = None if anchors is None else {col: (anchors, values) for col, values in self.prototypes.items()}
+        columns = derive_features(self._sample_columns(rng, n_samples, fixed))
+        y = self._sample_target(rng, columns, n_samples)
+        if anchors is not None:
+            y[anchors] = np.arange(self.n_classes)
+        X = pd.DataFrame({col: columns[col] for col in self.feature_columns + self.extra_columns})
+        return X, y
+
+    def iter_chunks(self, n_rows, chunk_size=200_000):
+        """Yield (X, y) chunks covering n_rows"""
+        for chunk_index, start in enumerate(range(0, n_rows, chunk_size)):
+            yield self.generate(min(chunk_size, n_rows - start), chunk_index)
+
+    def decode(self, X, y):
+        """Raw record frame: categorical codes replaced by class names, labels as crop names"""
+        records = X.copy()
+        for col in records.columns:
+            if col in self.encoders:
+                records[col] = np.asarray(self.encoders[col].classes_)[records[col].to_numpy()]
+        if self.target_column in self.encoders:
+            records[self.target_column] = np.asarray(self.encoders[self.target_column].classes_)[y]
+        else:
+            records[self.target_column] = y
+        return records
+
+    def write_parquet(self, path, n_rows, chunk_size=200_000, decode=True, verbose=True):
+        """Stream n_rows to a Parquet file one chunk (row group) at a time"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        start = time.perf_counter()
+        written = 0
+        writer = None
+        try:
+            for X, y in self.iter_chunks(n_rows, chunk_size):
+                frame = self.decode(X, y) if decode else X.assign(**{self.target_column: y})
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+                written += len(frame)
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f"  ✓ {written:,} / {n_rows:,} rows ({written / elapsed:,.0f} rows/s)")
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+
+
+def main():
+    from model_store import DEFAULT_MODEL_DIR, load_artifact
+
+    parser = argparse.ArgumentParser(description="Generate synthetic farm records")
+    parser.add_argument("output", help="Parquet file to write")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Rows per chunk / row group")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR, help="Directory with model_config/label_encoders")
+    parser.add_argument("--extra-columns", nargs="*", default=['Rainfall', 'Soil Moisture'],
+                        help="Spec columns written besides the model features")
+    parser.add_argument("--codes", action="store_true", help="Write categorical codes instead of class names")
+    args = parser.parse_args()
+
+    config = load_artifact(os.path.join(args.model_dir, "model_config.joblib"))
+    encoders = load_artifact(os.path.join(args.model_dir, "label_encoders.joblib"))
+    generator = SyntheticDataGenerator(config['feature_columns'], encoders, extra_columns=args.extra_columns,
+                                       seed=args.seed)
+    print("=" * 80)
+    print(f"SYNTHETIC DATA: {args.rows:,} rows -> {args.output}")
+    print("=" * 80)
+    generator.write_parquet(args.output, args.rows, args.chunk_size, decode=not args.codes)
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,10 @@ from datetime import datetime
 MODEL_PATH = os.getenv("AI_MODEL_PATH", "/home/pi/agriculture-ai/models/random_forest_v1.pkl")
 SCALER_PATH = os.getenv("AI_SCALER_PATH", "/home/pi/agriculture-ai/models/scaler.pkl")
 MODEL_VERSION = "v1.0"
+N_FEATURES = 3  # temperature, humidity, soil moisture
+
+# Model, scaler and buffers are loaded once per process and reused by every predict() call
+_predictor = None
 
 def load_model():
     """Load the trained Random Forest model"""
@@ -28,6 +32,74 @@ def load_scaler():
     except FileNotFoundError:
         return None
 
+# Copy of shared_code/crop_model.py's RowPredictor (minus the per-thread buffers: this script
+# scores one reading per process). predict_crop.py is copied to the Pi on its own (see
+# README.md), so it cannot import the Functions app's shared_code; change both together.
+class RowPredictor:
+    """
+    Single-reading inference with preallocated buffers.
+    The model and scaler are checked against the 3-feature input once, at load, so each
+    reading skips sklearn's validation: it is scaled in place in float64 (the scaler's own
+    arithmetic), copied into a float32 row (the dtype the trees compare in) and a Random
+    Forest is scored tree by tree with check_input=False, exactly as predict_proba would.
+    """
+
+    def __init__(self, model, scaler=None):
+        for name, part in (("model", model), ("scaler", scaler)):
+            n_features = getattr(part, 'n_features_in_', N_FEATURES)
+            if n_features != N_FEATURES:
+                raise ValueError(f"The {name} expects {n_features} features, readings have {N_FEATURES}")
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+
+        # StandardScaler is applied from its statistics; other scalers run as usual
+        self.mean = self.scale = None
+        if scaler is not None and hasattr(scaler, 'with_mean') and hasattr(scaler, 'scale_'):
+            self.mean = scaler.mean_ if scaler.with_mean else None
+            self.scale = scaler.scale_ if scaler.with_std else None
+            scaler = None
+        self.scaler = scaler
+
+        # Random Forest / Extra Trees: score the fitted trees directly
+        from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+        self.trees = None
+        if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and model.n_outputs_ == 1:
+            self.trees = list(model.estimators_)
+
+        self.row = np.zeros((1, N_FEATURES))
+        self.row32 = np.zeros((1, N_FEATURES), dtype=np.float32)
+        self.proba = np.zeros((1, len(self.classes_)))
+
+    def predict_proba(self, temperature, humidity, soil_moisture):
+        """Class probabilities for one reading (a view of the shared buffer)"""
+        row = self.row
+        row[0, 0] = temperature
+        row[0, 1] = humidity
+        row[0, 2] = soil_moisture
+        if self.mean is not None:
+            np.subtract(row, self.mean, out=row)
+        if self.scale is not None:
+            np.divide(row, self.scale, out=row)
+        if self.scaler is not None:
+            row[...] = self.scaler.transform(row)
+        if self.trees is None:
+            return self.model.predict_proba(row)[0]
+        np.copyto(self.row32, row, casting='same_kind')
+        self.proba.fill(0.0)
+        for tree in self.trees:
+            self.proba += tree.predict_proba(self.row32, check_input=False)
+        self.proba /= len(self.trees)
+        return self.proba[0]
+
+def get_predictor():
+    """Model and scaler loaded once per process (None when no model is deployed)"""
+    global _predictor
+    if _predictor is None:
+        model = load_model()
+        if model is not None:
+            _predictor = RowPredictor(model, load_scaler())
+    return _predictor
+
 def simulate_prediction(temperature, humidity, soil_moisture):
     """
     Simulation-based prediction logic.
@@ -73,29 +145,22 @@ def simulate_prediction(temperature, humidity, soil_moisture):
     
     return prediction, confidence, alternatives
 
-def predict_with_model(model, scaler, temperature, humidity, soil_moisture):
+def predict_with_model(predictor, temperature, humidity, soil_moisture):
     """
     Real model inference using trained Random Forest.
     """
-    # Prepare features
-    features = np.array([[temperature, humidity, soil_moisture]])
-    
-    # Apply scaling if scaler is available
-    if scaler is not None:
-        features = scaler.transform(features)
+    # Get confidence scores (scaling happens inside the predictor's buffers)
+    probabilities = predictor.predict_proba(temperature, humidity, soil_moisture)
     
     # Get prediction
-    prediction = model.predict(features)[0]
-    
-    # Get confidence scores
-    probabilities = model.predict_proba(features)[0]
+    prediction = predictor.classes_[np.argmax(probabilities)]
     confidence = np.max(probabilities)
     
     # Get top 3 alternatives
     top_indices = np.argsort(probabilities)[-3:][::-1]
     alternatives = [
         {
-            "crop": model.classes_[i],
+            "crop": predictor.classes_[i],
             "confidence": float(probabilities[i])
         }
         for i in top_indices[1:]  # Skip the top prediction
@@ -110,14 +175,13 @@ def predict(temperature, humidity, soil_moisture):
     """
     start_time = datetime.now()
     
-    # Try loading real model
-    model = load_model()
-    scaler = load_scaler()
+    # Try loading real model (cached after the first call)
+    predictor = get_predictor()
     
-    if model is not None:
+    if predictor is not None:
         # Use real model
         prediction, confidence, alternatives = predict_with_model(
-            model, scaler, temperature, humidity, soil_moisture
+            predictor, temperature, humidity, soil_moisture
         )
         inference_method = "model"
     else:
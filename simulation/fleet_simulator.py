@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Vectorized fleet simulator
+Python port of the Node-RED flow (flows.json: "Parse Weather Data" -> "Soil Fusion
+(Physics-Based)" -> "Format Payload") for N devices at once. Per-device state (soil
+moisture, message sequence, weather) lives in NumPy arrays and every tick advances all
+devices with vectorized updates; payloads use the exact schema of "Format Payload".
+
+Weather is synthesized per device (diurnal temperature cycle, humidity, Markov rain
+spells) instead of calling WeatherAPI.com; --fallback-weather uses the flow's fallback
+values (30 °C, 70 %, no rain) for every device.
+
+Usage:
+  python simulation/fleet_simulator.py --devices 10000 --ticks 12 --output telemetry.jsonl
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Soil Fusion node: soil += rainfall * 2; soil -= temperature * 0.05; clamp to [10, 60]
+SOIL_INITIAL = 35.0
+SOIL_RAIN_GAIN = 2.0
+SOIL_EVAPORATION = 0.05
+SOIL_MIN = 10.0
+SOIL_MAX = 60.0
+
+# "Parse Weather Data" fallback (Dhaka averages)
+FALLBACK_WEATHER = {'temperature': 30.0, 'humidity': 70.0, 'rainfall': 0.0}
+
+# The flow fetches weather (and emits telemetry) every 5 minutes
+DEFAULT_INTERVAL = 300
+
+SCHEMA_VERSION = "1.0"
+DATA_SOURCE = "FleetSimulator"
+
+
+def iso_timestamp(epoch_seconds):
+    """Same format as JavaScript's Date.toISOString() (millisecond precision, Z suffix)"""
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class FleetSimulator:
+    """
+    N simulated devices grouped into zones and farms. step() advances every device by one
+    interval and returns the telemetry columns; payloads() turns them into messages.
+    """
+
+    def __init__(self, n_devices, devices_per_zone=10, zones_per_farm=5, interval=DEFAULT_INTERVAL,
+                 seed=42, start_time=None, fallback_weather=False, device_prefix="sim"):
+        self.n_devices = n_devices
+        self.interval = interval
+        self.fallback_weather = fallback_weather
+        self.rng = np.random.default_rng(seed)
+        self.clock = time.time() if start_time is None else float(start_time)
+
+        index = np.arange(n_devices)
+        zone_index = index // devices_per_zone
+        farm_index = zone_index // zones_per_farm
+        self.device_ids = [f"{device_prefix}_{i:05d}" for i in index]
+        self.zone_ids = [f"zone_{z:04d}" for z in zone_index]
+        self.farm_ids = [f"farm_{f + 1:03d}" for f in farm_index]
+
+        # Per-device state
+        self.soil = np.full(n_devices, SOIL_INITIAL)
+        self.seq = np.zeros(n_devices, dtype=np.int64)
+        self.raining = np.zeros(n_devices, dtype=bool)
+        self.temp_noise = np.zeros(n_devices)
+        # Per-device climate: a zone shares its base climate, devices vary slightly around it
+        n_zones = int(zone_index[-1]) + 1 if n_devices else 0
+        zone_temp = self.rng.normal(28.0, 3.0, n_zones)
+        zone_humidity = self.rng.uniform(60.0, 85.0, n_zones)
+        self.base_temp = zone_temp[zone_index] + self.rng.normal(0.0, 0.3, n_devices)
+        self.base_humidity = zone_humidity[zone_index] + self.rng.normal(0.0, 1.0, n_devices)
+
+    def _weather(self):
+        """Weather for the current clock, one value per device"""
+        n = self.n_devices
+        if self.fallback_weather:
+            return (np.full(n, FALLBACK_WEATHER['temperature']), np.full(n, FALLBACK_WEATHER['humidity']),
+                    np.full(n, FALLBACK_WEATHER['rainfall']))
+
+        # Diurnal cycle peaking mid-afternoon plus AR(1) noise
+        hour = (self.clock % 86400) / 3600.0
+        diurnal = 4.0 * np.sin(2 * np.pi * (hour - 9.0) / 24.0)
+        self.temp_noise = 0.9 * self.temp_noise + self.rng.normal(0.0, 0.4, n)
+        temperature = self.base_temp + diurnal + self.temp_noise
+
+        # Rain spells: start with p=0.02, stop with p=0.2 per tick; amount in mm per tick
+        starts = self.rng.random(n) < 0.02
+        stops = self.rng.random(n) < 0.2
+        self.raining = np.where(self.raining, ~stops, starts)
+        rainfall = np.where(self.raining, self.rng.gamma(0.8, 1.5, n), 0.0)
+
+        humidity = self.base_humidity - 2.0 * (temperature - self.base_temp) + 15.0 * self.raining
+        humidity = np.clip(humidity + self.rng.normal(0.0, 2.0, n), 20.0, 100.0)
+        return np.round(temperature, 1), np.round(humidity), np.round(rainfall, 2)
+
+    def step(self):
+        """Advance all devices by one interval; returns a dict of telemetry columns"""
+        temperature, humidity, rainfall = self._weather()
+
+        # Soil Fusion (Physics-Based)
+        self.soil += rainfall * SOIL_RAIN_GAIN
+        self.soil -= temperature * SOIL_EVAPORATION
+        np.clip(self.soil, SOIL_MIN, SOIL_MAX, out=self.soil)
+
+        self.seq += 1
+        batch = {
+            'timestamp': self.clock,
+            'messageId': self.seq.copy(),
+            'temperature': temperature,
+            'humidity': humidity,
+            'rainfall': rainfall,
+            'soilMoisture': np.round(self.soil, 2)
+        }
+        self.clock += self.interval
+        return batch
+
+    def payloads(self, batch):
+        """Messages in the "Format Payload" schema for one step() result"""
+        timestamp = iso_timestamp(batch['timestamp'])
+        messages = []
+        for i, (msg_id, temp, hum, soil) in enumerate(zip(batch['messageId'].tolist(), batch['temperature'].tolist(),
+                                                          batch['humidity'].astype(np.int64).tolist(),
+                                                          batch['soilMoisture'].tolist())):
+            messages.append({
+                "schemaVersion": SCHEMA_VERSION,
+                "eventType": "telemetry",
+                "dataClass": "telemetry",
+                "messageId": msg_id,
+                "deviceId": self.device_ids[i],
+                "farmId": self.farm_ids[i],
+                "zoneId": self.zone_ids[i],
+                "telemetry": {
+                    "temperature": temp,
+                    "humidity": hum,
+                    "soilMoisture": soil
+                },
+                "actuators": {
+                    "pump": "OFF"
+                },
+                "system": {
+                    "deviceType": "simulator",
+                    "firmware": "v0.1",
+                    "status": "online",
+                    "timeSource": "system",
+                    "dataSource": DATA_SOURCE
+                },
+                "timestamp": timestamp
+            })
+        return messages
+
+    def heartbeats(self):
+        """Messages in the "Format Heartbeat" schema for every device"""
+        timestamp = iso_timestamp(self.clock)
+        return [{"eventType": "heartbeat", "deviceId": device_id, "status": "online", "timestamp": timestamp}
+                for device_id in self.device_ids]
+
+    def run(self, n_ticks):
+        """Yield (batch, payloads) for n_ticks steps"""
+        for _ in range(n_ticks):
+            batch = self.step()
+            yield batch, self.payloads(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of soil-fusion telemetry devices")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=12, help="Telemetry rounds to simulate")
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="Simulated seconds per tick")
+    parser.add_argument("--devices-per-zone", type=int, default=10)
+    parser.add_argument("--zones-per-farm", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fallback-weather", action="store_true", help="Use the flow's fallback weather")
+    parser.add_argument("--realtime", action="store_true", help="Sleep --interval seconds between ticks")
+    parser.add_argument("--output", default=None, help="JSON Lines file for the payloads (default: no output)")
+    args = parser.parse_args()
+
+    simulator = FleetSimulator(args.devices, args.devices_per_zone, args.zones_per_farm, args.interval,
+                               args.seed, fallback_weather=args.fallback_weather)
+    print(f"🌾 Simulating {args.devices:,} devices for {args.ticks} ticks ({args.interval}s each)")
+
+    out = open(args.output, 'w') if args.output else None
+    start = time.perf_counter()
+    messages = 0
+    try:
+        for tick, (batch, payloads) in enumerate(simulator.run(args.ticks), start=1):
+            if out is not None:
+                out.writelines(json.dumps(p, separators=(',', ':')) + "\n" for p in payloads)
+            messages += len(payloads)
+            print(f"[{iso_timestamp(batch['timestamp'])}] tick {tick}: "
+                  f"T̄:{batch['temperature'].mean():.1f}°C H̄:{batch['humidity'].mean():.0f}% "
+                  f"S̄:{batch['soilMoisture'].mean():.1f}% ✅")
+            if args.realtime and tick < args.ticks:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        if out is not None:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{messages:,} messages in {elapsed:.2f}s ({messages / elapsed:,.0f} msg/s)")
+
+
+if __name__ == "__main__":
+    main()